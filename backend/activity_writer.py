@@ -0,0 +1,132 @@
+"""
+Write-behind user activity timestamps
+Records last-login (and similar) timestamps off the request path. Updates
+are coalesced per user over a short window and written as partial patches,
+so a burst of logins by one user costs a single Cosmos write.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from azure.core.exceptions import AzureError
+from azure.cosmos import exceptions
+
+from user_service import patch_user_fields
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_WRITE_BEHIND = os.getenv("ACTIVITY_WRITE_BEHIND", "true").lower() == "true"
+# Coalescing window: pending timestamps are flushed this often
+ACTIVITY_FLUSH_INTERVAL_MS = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", "5000"))
+# Concurrent patch requests per flush
+ACTIVITY_FLUSH_CONCURRENCY = int(os.getenv("ACTIVITY_FLUSH_CONCURRENCY", "16"))
+
+
+class ActivityWriter:
+    """
+    Coalesces activity timestamps per user and patches them in periodically.
+
+    Only the latest value of each field is kept until the next flush. A
+    failed patch is put back unless a newer value arrived meanwhile. These
+    are best-effort timestamps: values still pending at a crash are lost.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"recorded": 0, "coalesced": 0, "patched": 0, "failed": 0}
+
+    def record(self, username: str, field: str, timestamp: str):
+        if field in self._pending.get(username, {}):
+            self._stats["coalesced"] += 1
+        self._merge(username, field, timestamp)
+        self._stats["recorded"] += 1
+
+    def _merge(self, username: str, field: str, timestamp: str):
+        fields = self._pending.setdefault(username, {})
+        fields[field] = max(timestamp, fields.get(field, timestamp))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write whatever is pending"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def get_stats(self) -> dict:
+        return {**self._stats, "pending_users": len(self._pending)}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Activity flush failed, will retry: {e}")
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        users = list(pending.items())
+        done = 0
+
+        try:
+            while done < len(users):
+                chunk = users[done:done + ACTIVITY_FLUSH_CONCURRENCY]
+                await asyncio.gather(*(self._patch(username, fields) for username, fields in chunk))
+                done += len(chunk)
+        finally:
+            # Interrupted (e.g. the flush task cancelled by stop()): put back
+            # what was not written; re-patching a written chunk is harmless
+            for username, fields in users[done:]:
+                for field, timestamp in fields.items():
+                    self._merge(username, field, timestamp)
+
+    async def _patch(self, username: str, fields: Dict[str, str]):
+        try:
+            await patch_user_fields(username, fields)
+            self._stats["patched"] += 1
+        except exceptions.CosmosResourceNotFoundError:
+            # User deleted (or not yet re-keyed) since the event; nothing to update
+            self._stats["failed"] += 1
+        except AzureError as e:
+            # HTTP errors as well as dropped connections and DNS failures
+            logger.warning(f"Failed to record activity for {username}, will retry: {e}")
+            self._stats["failed"] += 1
+            for field, timestamp in fields.items():
+                self._merge(username, field, timestamp)
+
+
+activity_writer = ActivityWriter()
+
+
+async def record_login(username: str):
+    """Record a login time (write-behind unless ACTIVITY_WRITE_BEHIND=false)"""
+    timestamp = datetime.utcnow().isoformat()
+    if ACTIVITY_WRITE_BEHIND:
+        activity_writer.record(username, "last_login", timestamp)
+    else:
+        await patch_user_fields(username, {"last_login": timestamp})
+
+
+def start_activity_writer():
+    if ACTIVITY_WRITE_BEHIND:
+        activity_writer.start()
+
+
+async def stop_activity_writer():
+    if ACTIVITY_WRITE_BEHIND:
+        await activity_writer.stop()
+
+
+def get_activity_writer_stats() -> dict:
+    return activity_writer.get_stats()
@@ -0,0 +1,532 @@
+"""
+Alert storage backends
+alert_service buffers new alerts and hands them to one of these in batches:
+
+    cosmos  - alert items in the partitioned Cosmos container, one logical
+              partition per user, expired by Cosmos through a per-item ttl
+              (default with COSMOS_LAYOUT partitioned or dual)
+    sqlite  - a local SQLite file; for tests and single-node deployments
+    memory  - per-user ring buffers in this process; lost on restart and not
+              shared between workers (default with COSMOS_LAYOUT=legacy)
+
+Every backend returns alerts as dicts (Alert.to_dict()), oldest first.
+Alerts created together for many users (a role broadcast) carry a
+payload_id: the persistent backends store their shared fields once and keep
+only a reference and the read state per recipient. The memory backend keeps
+the Alert objects, which already share those fields.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+# Alerts kept per user (oldest dropped first)
+ALERTS_PER_USER = int(os.getenv("ALERTS_PER_USER", "100"))
+# Memory backend: cap across all users; least recently active users are evicted past it
+ALERT_STORE_MAX_ALERTS = int(os.getenv("ALERT_STORE_MAX_ALERTS", "100000"))
+# Persistent backends: alerts expire this long after they are written
+ALERT_TTL_SECONDS = int(os.getenv("ALERT_TTL_SECONDS", str(30 * 24 * 3600)))
+ALERT_SQLITE_PATH = os.getenv("ALERT_SQLITE_PATH", "alerts.db")
+
+# Usernames or payload ids bound per query (SQLite's default variable limit is 999)
+_SQLITE_VARIABLES_PER_QUERY = 500
+
+
+class AlertBackend:
+    """Interface every alert backend implements"""
+
+    name = "base"
+
+    async def add(self, entries: List[Tuple[str, "Alert"]]) -> Set[str]:
+        """Store (username, alert) pairs. Returns the ids that could not be written."""
+        raise NotImplementedError
+
+    async def recent(self, username: str, limit: int) -> List[Dict]:
+        """A user's newest alerts (at most limit), oldest first"""
+        raise NotImplementedError
+
+    async def count_unread(self, username: str) -> int:
+        """A user's unread alerts, counted by the backend rather than listed"""
+        raise NotImplementedError
+
+    async def mark_read(self, username: str, alert_id: str) -> bool:
+        raise NotImplementedError
+
+    async def mark_all_read(self, username: str) -> int:
+        raise NotImplementedError
+
+    async def clear(self, username: str) -> int:
+        raise NotImplementedError
+
+    async def since(self, timestamp: float, usernames: List[str]) -> List[Tuple[str, Dict]]:
+        """
+        (username, alert) pairs of the given users written at or after a
+        Unix timestamp, for picking up alerts raised on other workers.
+        Process-local backends have nothing to add and return [].
+        """
+        return []
+
+    def stats(self) -> Dict:
+        return {}
+
+    async def close(self):
+        pass
+
+
+# ---- memory ----
+
+class _UserAlerts:
+    """
+    Ring buffer of one user's alerts with an id -> slot index and a running
+    unread count. The slot list grows to ALERTS_PER_USER, then wraps.
+    """
+    __slots__ = ("slots", "head", "index", "unread")
+
+    def __init__(self):
+        self.slots: List["Alert"] = []
+        self.head = 0  # next slot to overwrite once full
+        self.index: Dict[str, int] = {}
+        self.unread = 0
+
+    def push(self, alert: "Alert") -> Optional["Alert"]:
+        """Add an alert; returns the alert it displaced, if any"""
+        displaced = None
+        if len(self.slots) < ALERTS_PER_USER:
+            slot = len(self.slots)
+            self.slots.append(alert)
+        else:
+            slot = self.head
+            displaced = self.slots[slot]
+            del self.index[displaced.id]
+            if not displaced.read:
+                self.unread -= 1
+            self.slots[slot] = alert
+            self.head = (slot + 1) % ALERTS_PER_USER
+
+        self.index[alert.id] = slot
+        if not alert.read:
+            self.unread += 1
+        return displaced
+
+    def oldest_first(self) -> List["Alert"]:
+        return self.slots[self.head:] + self.slots[:self.head]
+
+    def mark_read(self, alert_id: str) -> bool:
+        slot = self.index.get(alert_id)
+        if slot is None:
+            return False
+        alert = self.slots[slot]
+        if not alert.read:
+            alert.read = True
+            self.unread -= 1
+        return True
+
+    def mark_all_read(self) -> int:
+        count = self.unread
+        if count:
+            for alert in self.slots:
+                alert.read = True
+            self.unread = 0
+        return count
+
+
+class AlertStore:
+    """In-process alert storage: per-user ring buffers in LRU order"""
+
+    def __init__(self):
+        self._users: "OrderedDict[str, _UserAlerts]" = OrderedDict()
+        self._total = 0
+        self._evicted_users = 0
+        self._lock = threading.Lock()
+
+    def _touch(self, username: str) -> Optional[_UserAlerts]:
+        alerts = self._users.get(username)
+        if alerts is not None:
+            self._users.move_to_end(username)
+        return alerts
+
+    def add(self, username: str, alert: "Alert"):
+        with self._lock:
+            alerts = self._touch(username)
+            if alerts is None:
+                alerts = self._users[username] = _UserAlerts()
+            if alerts.push(alert) is None:
+                self._total += 1
+
+            # Evict the least recently active users (never the one just written)
+            while self._total > ALERT_STORE_MAX_ALERTS and len(self._users) > 1:
+                _, idle = self._users.popitem(last=False)
+                self._total -= len(idle.slots)
+                self._evicted_users += 1
+
+    def list(self, username: str, limit: int = ALERTS_PER_USER) -> List[Dict]:
+        with self._lock:
+            alerts = self._touch(username)
+            if alerts is None:
+                return []
+            return [a.to_dict() for a in alerts.oldest_first()[-limit:]]
+
+    def count_unread(self, username: str) -> int:
+        with self._lock:
+            alerts = self._users.get(username)
+            return alerts.unread if alerts else 0
+
+    def mark_read(self, username: str, alert_id: str) -> bool:
+        with self._lock:
+            alerts = self._touch(username)
+            return alerts.mark_read(alert_id) if alerts else False
+
+    def mark_all_read(self, username: str) -> int:
+        with self._lock:
+            alerts = self._touch(username)
+            return alerts.mark_all_read() if alerts else 0
+
+    def clear(self, username: str) -> int:
+        with self._lock:
+            alerts = self._users.pop(username, None)
+            if alerts is None:
+                return 0
+            self._total -= len(alerts.slots)
+            return len(alerts.slots)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "alerts": self._total,
+                "max_alerts": ALERT_STORE_MAX_ALERTS,
+                "evicted_users": self._evicted_users
+            }
+
+
+class MemoryAlertBackend(AlertBackend):
+    name = "memory"
+
+    def __init__(self):
+        self.store = AlertStore()
+
+    async def add(self, entries):
+        for username, alert in entries:
+            self.store.add(username, alert)
+        return set()
+
+    async def recent(self, username, limit):
+        return self.store.list(username, limit)
+
+    async def count_unread(self, username):
+        return self.store.count_unread(username)
+
+    async def mark_read(self, username, alert_id):
+        return self.store.mark_read(username, alert_id)
+
+    async def mark_all_read(self, username):
+        return self.store.mark_all_read(username)
+
+    async def clear(self, username):
+        return self.store.clear(username)
+
+    def stats(self):
+        return self.store.stats()
+
+
+# ---- sqlite ----
+
+class SqliteAlertBackend(AlertBackend):
+    """
+    Alerts in a local SQLite database (WAL mode, so several worker processes
+    on one node can share the file). Queries run on a worker thread; expired
+    rows are skipped on read and purged on write.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str = ALERT_SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                read INTEGER NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS alerts_by_user ON alerts (username, id);
+            CREATE INDEX IF NOT EXISTS alerts_by_expiry ON alerts (expires_at);
+            CREATE TABLE IF NOT EXISTS alert_payloads (
+                id TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS alert_payloads_by_expiry ON alert_payloads (expires_at);
+        """)
+
+    def _execute(self, sql: str, parameters=()) -> int:
+        """Run one statement; returns the number of rows it changed"""
+        with self._lock:
+            return self._conn.execute(sql, parameters).rowcount
+
+    async def _run(self, function, *args):
+        return await asyncio.to_thread(function, *args)
+
+    def _add(self, entries):
+        now = time.time()
+        expires_at = now + ALERT_TTL_SECONDS
+        rows = []
+        payloads = {}
+        for username, alert in entries:
+            if alert.payload_id is None:
+                body = alert.to_dict()
+            else:
+                body = {"id": alert.id, "payload_id": alert.payload_id}
+                if alert.payload_id not in payloads:
+                    payloads[alert.payload_id] = (alert.payload_id, expires_at, json.dumps(alert.payload()))
+            rows.append((alert.id, username, int(alert.read), expires_at, json.dumps(body)))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO alert_payloads (id, expires_at, body) VALUES (?, ?, ?)",
+                    list(payloads.values())
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO alerts (id, username, read, expires_at, body) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("DELETE FROM alerts WHERE expires_at < ?", (now,))
+                self._conn.execute("DELETE FROM alert_payloads WHERE expires_at < ?", (now,))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+        return set()
+
+    def _select_in(self, sql: str, values: List[str], parameters=()) -> list:
+        """Run a query whose "IN ({})" is filled with values, in chunks (caller holds the lock)"""
+        rows = []
+        for start in range(0, len(values), _SQLITE_VARIABLES_PER_QUERY):
+            chunk = values[start:start + _SQLITE_VARIABLES_PER_QUERY]
+            rows.extend(self._conn.execute(
+                sql.format(", ".join("?" * len(chunk))), (*parameters, *chunk)
+            ).fetchall())
+        return rows
+
+    def _resolve(self, rows) -> List[Tuple[str, Dict]]:
+        """(username, body, read) rows to (username, alert), filling in shared payloads"""
+        entries = [(username, json.loads(body), bool(read)) for username, body, read in rows]
+        payload_ids = sorted({body["payload_id"] for _, body, _ in entries if "payload_id" in body})
+        payloads = {}
+        if payload_ids:
+            payloads = {
+                payload_id: json.loads(body)
+                for payload_id, body in self._select_in(
+                    "SELECT id, body FROM alert_payloads WHERE id IN ({})", payload_ids
+                )
+            }
+
+        alerts = []
+        for username, body, read in entries:
+            if "payload_id" in body:
+                payload = payloads.get(body["payload_id"])
+                if payload is None:
+                    continue  # expired with its payload
+                body = {**payload, "id": body["id"]}
+            body["read"] = read
+            alerts.append((username, body))
+        return alerts
+
+    def _recent(self, username, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT username, body, read FROM alerts WHERE username = ? AND expires_at > ? ORDER BY id DESC LIMIT ?",
+                (username, time.time(), limit)
+            ).fetchall()
+            return [alert for _, alert in self._resolve(reversed(rows))]
+
+    def _since(self, timestamp, usernames):
+        # expires_at is the write time plus the (fixed) TTL
+        with self._lock:
+            rows = self._select_in(
+                "SELECT username, body, read FROM alerts WHERE expires_at >= ? AND username IN ({})",
+                usernames,
+                (timestamp + ALERT_TTL_SECONDS,)
+            )
+            entries = self._resolve(rows)
+        return sorted(entries, key=lambda entry: entry[1]["id"])
+
+    async def add(self, entries):
+        return await self._run(self._add, entries)
+
+    async def recent(self, username, limit):
+        return await self._run(self._recent, username, limit)
+
+    def _count_unread(self, username):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM alerts WHERE username = ? AND read = 0 AND expires_at > ?",
+                (username, time.time())
+            ).fetchone()[0]
+
+    async def count_unread(self, username):
+        return await self._run(self._count_unread, username)
+
+    async def mark_read(self, username, alert_id):
+        changed = await self._run(
+            self._execute,
+            "UPDATE alerts SET read = 1 WHERE username = ? AND id = ? AND expires_at > ?",
+            (username, alert_id, time.time())
+        )
+        return changed > 0
+
+    async def mark_all_read(self, username):
+        return await self._run(
+            self._execute,
+            "UPDATE alerts SET read = 1 WHERE username = ? AND read = 0 AND expires_at > ?",
+            (username, time.time())
+        )
+
+    async def since(self, timestamp, usernames):
+        return await self._run(self._since, timestamp, usernames)
+
+    async def clear(self, username):
+        return await self._run(
+            self._execute,
+            "DELETE FROM alerts WHERE username = ? AND expires_at > ?",
+            (username, time.time())
+        )
+
+    def stats(self):
+        return {"path": self.path, "ttl_seconds": ALERT_TTL_SECONDS}
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ---- cosmos ----
+
+class CosmosAlertBackend(AlertBackend):
+    """
+    Alerts as Cosmos items of type "alert", partitioned per user and
+    carrying a ttl so Cosmos deletes them itself (the container needs TTL
+    enabled, e.g. default TTL -1). Writes go through transactional batches.
+    A broadcast's shared fields are one "alert_payload" item; each
+    recipient's alert item only references it and holds the read state.
+    """
+    name = "cosmos"
+
+    # Item fields that are storage details rather than part of the alert
+    _STORAGE_FIELDS = ("type", "username", "ttl", "written_at", "pk", "_rid", "_self", "_etag", "_attachments", "_ts")
+
+    def __init__(self):
+        # Imported here so the other backends work without Cosmos settings
+        import cosmos_service
+        # The legacy container is partitioned by item type: every user's
+        # alerts would share the one "alert" logical partition
+        if cosmos_service.COSMOS_LAYOUT == "legacy":
+            raise RuntimeError(
+                "ALERT_BACKEND=cosmos needs COSMOS_LAYOUT=partitioned (or dual while migrating)"
+            )
+        self._cosmos = cosmos_service
+
+    def _to_item(self, username: str, alert: "Alert") -> dict:
+        if alert.payload_id is None:
+            item = alert.to_dict()
+            # "type" is the Cosmos item type; the alert's own type moves aside
+            item["alert_type"] = item.pop("type")
+        else:
+            item = {"id": alert.id, "payload_id": alert.payload_id, "read": alert.read}
+        item.update({
+            "type": "alert",
+            "username": username,
+            "ttl": ALERT_TTL_SECONDS,
+            # Stream catch-up matches on this; _ts changes when the alert is read
+            "written_at": time.time()
+        })
+        return item
+
+    def _to_payload_item(self, alert: "Alert") -> dict:
+        item = alert.payload()
+        item["alert_type"] = item.pop("type")
+        item.update({"id": alert.payload_id, "type": "alert_payload", "ttl": ALERT_TTL_SECONDS})
+        return item
+
+    def _from_item(self, item: dict) -> Dict:
+        alert = {key: value for key, value in item.items() if key not in self._STORAGE_FIELDS}
+        alert["type"] = alert.pop("alert_type")
+        return alert
+
+    async def _from_items(self, items: List[dict]) -> List[Tuple[str, Dict]]:
+        """Alert items to (username, alert), filling in shared payloads"""
+        payload_ids = sorted({item["payload_id"] for item in items if "payload_id" in item})
+        payloads = await self._cosmos.get_alert_payload_items(payload_ids) if payload_ids else {}
+
+        entries = []
+        for item in items:
+            if "payload_id" in item:
+                payload = payloads.get(item["payload_id"])
+                if payload is None:
+                    continue  # expired with its payload
+                item = {**payload, "id": item["id"], "read": item["read"], "username": item["username"]}
+            entries.append((item["username"], self._from_item(item)))
+        return entries
+
+    async def add(self, entries):
+        payloads = {}
+        for _, alert in entries:
+            if alert.payload_id is not None and alert.payload_id not in payloads:
+                payloads[alert.payload_id] = self._to_payload_item(alert)
+        items = [self._to_item(username, alert) for username, alert in entries]
+
+        # Payloads first: a recipient's item is only written once the
+        # payload it references is stored, and is retried with it otherwise
+        failed_payloads = {}
+        if payloads:
+            failed_payloads = await self._cosmos.write_alert_items(list(payloads.values()))
+        blocked = {item["id"] for item in items if item.get("payload_id") in failed_payloads}
+        failures = await self._cosmos.write_alert_items(
+            [item for item in items if item["id"] not in blocked]
+        )
+        return blocked | set(failures)
+
+    async def recent(self, username, limit):
+        items = await self._cosmos.get_alert_items(username, limit)
+        return [alert for _, alert in await self._from_items(list(reversed(items)))]
+
+    async def count_unread(self, username):
+        return await self._cosmos.count_unread_alert_items(username)
+
+    async def mark_read(self, username, alert_id):
+        return await self._cosmos.mark_alert_items_read(username, [alert_id]) > 0
+
+    async def mark_all_read(self, username):
+        ids = await self._cosmos.get_alert_ids(username, unread_only=True)
+        return await self._cosmos.mark_alert_items_read(username, ids)
+
+    async def clear(self, username):
+        ids = await self._cosmos.get_alert_ids(username)
+        return await self._cosmos.delete_alert_items(username, ids)
+
+    async def since(self, timestamp, usernames):
+        items = await self._cosmos.get_alert_items_since(timestamp, usernames)
+        return await self._from_items(items)
+
+    def stats(self):
+        return {"ttl_seconds": ALERT_TTL_SECONDS}
+
+
+def create_backend(name: str) -> AlertBackend:
+    if name == "cosmos":
+        return CosmosAlertBackend()
+    if name == "sqlite":
+        return SqliteAlertBackend()
+    if name == "memory":
+        return MemoryAlertBackend()
+    raise RuntimeError(f"Invalid ALERT_BACKEND: {name}")
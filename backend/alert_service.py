@@ -1,15 +1,51 @@
 """
 Alert Service for Real-time Tampering Notifications
 Supports multiple notification channels: Email, In-App, SMS (optional)
+In-app alerts are stored through a pluggable backend (alert_backends.py):
+written in batches behind a small buffer, read through a short-lived cache.
 """
-from typing import List, Dict, Optional
+import asyncio
+import logging
+from typing import Callable, List, Dict, Optional, Tuple
+from collections import OrderedDict, deque
 from datetime import datetime
 from enum import Enum
 import os
+import secrets
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from alert_backends import ALERTS_PER_USER, AlertBackend, create_backend
+from rbac import UserRole
+
+logger = logging.getLogger(__name__)
+
+# cosmos, sqlite or memory; see alert_backends.py. The cosmos backend needs
+# the partitioned storage layout, so the default follows COSMOS_LAYOUT.
+ALERT_BACKEND = os.getenv(
+    "ALERT_BACKEND",
+    "memory" if os.getenv("COSMOS_LAYOUT", "legacy").lower() == "legacy" else "cosmos"
+).lower()
+# New alerts are buffered and written to the backend this often
+ALERT_FLUSH_INTERVAL_MS = int(os.getenv("ALERT_FLUSH_INTERVAL_MS", "200"))
+# Max buffered alerts while the backend is unavailable; oldest dropped past it
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "10000"))
+# Per-user read cache. Alerts written or changed on this worker show up at
+# once; those from other workers within ALERT_CACHE_TTL_SECONDS.
+ALERT_CACHE_SIZE = int(os.getenv("ALERT_CACHE_SIZE", "10000"))
+ALERT_CACHE_TTL_SECONDS = float(os.getenv("ALERT_CACHE_TTL_SECONDS", "5"))
+# Role broadcasts (admins, auditors) waiting to be fanned out; new ones are
+# dropped past this
+ALERT_FANOUT_QUEUE_SIZE = int(os.getenv("ALERT_FANOUT_QUEUE_SIZE", "1000"))
+
+# Recent operations kept for latency percentiles
+_LATENCY_WINDOW = 1000
+# How long shutdown waits for queued broadcasts to be fanned out
+_FANOUT_DRAIN_TIMEOUT_SECONDS = 5
+
 class AlertSeverity(str, Enum):
     INFO = "info"
     WARNING = "warning"
@@ -22,7 +58,32 @@ class AlertType(str, Enum):
     UNAUTHORIZED_ACCESS = "unauthorized_access"
     ACCOUNT_DEACTIVATED = "account_deactivated"
 
+# Alert ids: fixed-width nanosecond stamp (strictly increasing within the
+# process) plus a per-process random node id, so they sort by creation time
+# and never collide, even across workers.
+_NODE_ID = secrets.token_hex(4)
+_last_id_ns = 0
+_id_lock = threading.Lock()
+
+def _new_alert_id(prefix: str = "alert") -> str:
+    global _last_id_ns
+    with _id_lock:
+        _last_id_ns = max(time.time_ns(), _last_id_ns + 1)
+        stamp = _last_id_ns
+    return f"{prefix}_{stamp:020d}_{_NODE_ID}"
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
 class Alert:
+    # payload_id is set on alerts created by create_alerts(): persistent
+    # backends store the fields they share once under that id, and per
+    # recipient only the id, the payload_id and the read state
+    __slots__ = ("id", "alert_type", "severity", "title", "message", "metadata", "timestamp", "read", "payload_id")
+
     def __init__(
         self,
         alert_type: AlertType,
@@ -31,7 +92,7 @@ class Alert:
         message: str,
         metadata: Dict = None
     ):
-        self.id = f"alert_{datetime.utcnow().timestamp()}"
+        self.id = _new_alert_id()
         self.alert_type = alert_type
         self.severity = severity
         self.title = title
@@ -39,7 +100,14 @@ class Alert:
         self.metadata = metadata or {}
         self.timestamp = datetime.utcnow().isoformat()
         self.read = False
-    
+        self.payload_id = None
+
+    def payload(self) -> Dict:
+        """The fields recipients of one broadcast share: all but id and read"""
+        alert = self.to_dict()
+        del alert["id"], alert["read"]
+        return alert
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -52,8 +120,332 @@ class Alert:
             "read": self.read
         }
 
-# In-memory alert storage (in production, use Redis or database)
-_alerts_store: Dict[str, List[Alert]] = {}
+class AlertWriter:
+    """
+    Buffers new alerts and writes them to the backend in batches.
+
+    create_alert() only appends to the buffer, so raising an alert never
+    waits on storage. A background task flushes every ALERT_FLUSH_INTERVAL_MS;
+    alerts that fail to write go back in the buffer for the next flush.
+    Buffered and in-flight alerts are visible to readers on this worker.
+    """
+
+    def __init__(self, backend: AlertBackend):
+        self.backend = backend
+        # (username, alert, time.monotonic() when queued)
+        self._pending: List[Tuple[str, Alert, float]] = []
+        self._in_flight: List[Tuple[str, Alert, float]] = []
+        self._store_seconds = deque(maxlen=_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"queued": 0, "flushed": 0, "batches": 0, "retries": 0, "dropped": 0}
+
+    def add(self, username: str, alert: Alert):
+        with self._lock:
+            self._pending.append((username, alert, time.monotonic()))
+            self._stats["queued"] += 1
+            overflow = len(self._pending) - ALERT_QUEUE_SIZE
+            if overflow > 0:
+                del self._pending[:overflow]
+                self._stats["dropped"] += overflow
+
+    def pending_for(self, username: str) -> List[Alert]:
+        with self._lock:
+            return [alert for user, alert, _ in self._in_flight + self._pending if user == username]
+
+    def start(self):
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write whatever is buffered"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # Shutdown goes on (the Cosmos client still has to be closed)
+            with self._lock:
+                lost = len(self._pending)
+            logger.error(f"Final alert flush failed, {lost} alerts not stored: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ALERT_FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Alert flush failed, will retry: {e}")
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        # One flush at a time, so a caller that flushes before changing an
+        # alert also waits for a batch another flush already has in flight
+        async with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+            if not batch:
+                return
+
+            failed = set()
+            try:
+                failed = await self.backend.add([(user, alert) for user, alert, _ in batch])
+            except Exception:
+                failed = {alert.id for _, alert, _ in batch}
+                raise
+            finally:
+                stored_at = time.monotonic()
+                with self._lock:
+                    retry = [entry for entry in batch if entry[1].id in failed]
+                    self._pending = retry + self._pending
+                    self._in_flight = []
+                    self._store_seconds.extend(
+                        stored_at - queued_at for _, alert, queued_at in batch if alert.id not in failed
+                    )
+                    self._stats["flushed"] += len(batch) - len(retry)
+                    self._stats["batches"] += 1
+                    self._stats["retries"] += len(retry)
+
+    def has_pending(self, username: str) -> bool:
+        with self._lock:
+            return any(user == username for user, _, _ in self._in_flight + self._pending)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "pending": len(self._pending) + len(self._in_flight),
+                # Time from create_alert() until the alert is in the backend
+                "store_ms_p50": round(_percentile(self._store_seconds, 0.5) * 1000, 1),
+                "store_ms_p95": round(_percentile(self._store_seconds, 0.95) * 1000, 1)
+            }
+
+
+class _CachedAlerts:
+    __slots__ = ("alerts", "unread", "expires_at")
+
+    def __init__(self, alerts: Optional[List[Dict]], unread: Optional[int]):
+        self.alerts = alerts
+        self.unread = unread
+        self.expires_at = time.monotonic() + ALERT_CACHE_TTL_SECONDS
+
+
+class AlertCache:
+    """
+    Recent alerts (oldest first) and the unread count per user, LRU with a
+    short TTL. Either may be cached without the other: /me only needs the
+    count, which the backend counts without listing.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, _CachedAlerts]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _fresh(self, username: str) -> Optional[_CachedAlerts]:
+        entry = self._entries.get(username)
+        if entry is None or entry.expires_at < time.monotonic():
+            return None
+        return entry
+
+    def _store(self, username: str, entry: _CachedAlerts):
+        self._entries[username] = entry
+        self._entries.move_to_end(username)
+        while len(self._entries) > ALERT_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    def get(self, username: str) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._fresh(username)
+            if entry is None or entry.alerts is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(username)
+            self._stats["hits"] += 1
+            return list(entry.alerts)
+
+    def get_unread(self, username: str) -> Optional[int]:
+        with self._lock:
+            entry = self._fresh(username)
+            if entry is None or entry.unread is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(username)
+            self._stats["hits"] += 1
+            return entry.unread
+
+    def put(self, username: str, alerts: List[Dict], unread: Optional[int] = None):
+        with self._lock:
+            self._store(username, _CachedAlerts(alerts[-ALERTS_PER_USER:], unread))
+
+    def put_unread(self, username: str, unread: int):
+        with self._lock:
+            entry = self._fresh(username)
+            if entry is None:
+                self._store(username, _CachedAlerts(None, unread))
+            else:
+                entry.unread = unread
+
+    def append(self, username: str, alert: Dict):
+        """Add a new alert to a cached entry (no-op when the user is not cached)"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return
+            if entry.alerts is not None:
+                entry.alerts = (entry.alerts + [alert])[-ALERTS_PER_USER:]
+            if entry.unread is not None and not alert["read"]:
+                entry.unread += 1
+
+    def mark_read(self, username: str, alert_id: str = None):
+        """Mark one (or, without an id, every) cached alert read"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return
+            if alert_id is None:
+                entry.unread = 0
+            elif entry.unread is not None:
+                # Only a cached list tells whether the alert was unread
+                cached = next((a for a in entry.alerts or () if a["id"] == alert_id), None)
+                if cached is None:
+                    entry.unread = None
+                elif not cached["read"]:
+                    entry.unread = max(0, entry.unread - 1)
+            if entry.alerts is not None:
+                entry.alerts = [
+                    {**alert, "read": True} if alert_id in (None, alert["id"]) else alert
+                    for alert in entry.alerts
+                ]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+class _Broadcast:
+    __slots__ = ("roles", "exclude", "alert_type", "severity", "title", "message", "metadata", "queued_at")
+
+    def __init__(self, roles, exclude, alert_type, severity, title, message, metadata):
+        self.roles = tuple(roles)
+        self.exclude = frozenset(exclude)
+        self.alert_type = alert_type
+        self.severity = severity
+        self.title = title
+        self.message = message
+        self.metadata = metadata
+        self.queued_at = time.monotonic()
+
+
+class AlertDispatcher:
+    """
+    Fans role broadcasts out to every active member of the roles, off the
+    request path. broadcast() only enqueues (from any thread); a background
+    task resolves the recipients through the role index and creates all
+    their alerts in one pass from a single shared payload.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatch_seconds = deque(maxlen=_LATENCY_WINDOW)
+        self._stats = {"broadcasts": 0, "recipients": 0, "dropped": 0, "failed": 0}
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=ALERT_FANOUT_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Fan out what is queued (briefly) and stop the dispatch task"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), _FANOUT_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} alert broadcasts not delivered at shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def broadcast(self, broadcast: _Broadcast):
+        if self._loop is None:
+            logger.warning(f"Alert dispatcher not running; broadcast to {broadcast.roles} dropped")
+            self._stats["dropped"] += 1
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, broadcast)
+
+    def _enqueue(self, broadcast: _Broadcast):
+        try:
+            self._queue.put_nowait(broadcast)
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            logger.warning(f"Alert fan-out queue full; broadcast to {broadcast.roles} dropped")
+
+    async def _run(self):
+        while True:
+            broadcast = await self._queue.get()
+            try:
+                await self._deliver(broadcast)
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.warning(f"Alert broadcast to {broadcast.roles} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, broadcast: _Broadcast):
+        # Imported here so alert_service works without Cosmos settings
+        from user_service import confirm_role_members, get_role_members
+
+        recipients = set()
+        for role in broadcast.roles:
+            recipients |= await get_role_members(role)
+        # The index may lag role changes made on other workers; security
+        # alerts only go to users still active in one of the roles
+        recipients = await confirm_role_members(recipients - broadcast.exclude, list(broadcast.roles))
+
+        create_alerts(
+            sorted(recipients), broadcast.alert_type, broadcast.severity,
+            broadcast.title, broadcast.message, broadcast.metadata
+        )
+        self._dispatch_seconds.append(time.monotonic() - broadcast.queued_at)
+        self._stats["broadcasts"] += 1
+        self._stats["recipients"] += len(recipients)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            # Time from broadcast until every recipient's alert is created
+            # (and pushed to their open streams)
+            "dispatch_ms_p50": round(_percentile(self._dispatch_seconds, 0.5) * 1000, 1),
+            "dispatch_ms_p95": round(_percentile(self._dispatch_seconds, 0.95) * 1000, 1)
+        }
+
+
+_alert_writer = AlertWriter(create_backend(ALERT_BACKEND))
+_alert_cache = AlertCache()
+_alert_dispatcher = AlertDispatcher()
+# Called with (username, alert dict) for every alert created on this worker
+_alert_listeners: List[Callable[[str, Dict], None]] = []
+
+def add_alert_listener(listener: Callable[[str, Dict], None]):
+    """Register a callback for new alerts (must be quick and never raise)"""
+    _alert_listeners.append(listener)
 
 def create_alert(
     username: str,
@@ -63,54 +455,118 @@ def create_alert(
     message: str,
     metadata: Dict = None
 ) -> Alert:
-    """Create a new alert for a user"""
+    """Create a new alert for a user (stored write-behind)"""
     alert = Alert(alert_type, severity, title, message, metadata)
-    
-    if username not in _alerts_store:
-        _alerts_store[username] = []
-    
-    _alerts_store[username].append(alert)
-    
-    # Keep only last 100 alerts per user
-    if len(_alerts_store[username]) > 100:
-        _alerts_store[username] = _alerts_store[username][-100:]
-    
+    _deliver(username, alert)
     return alert
 
-def get_user_alerts(username: str, unread_only: bool = False) -> List[Dict]:
-    """Get all alerts for a user"""
-    alerts = _alerts_store.get(username, [])
-    
-    if unread_only:
-        alerts = [a for a in alerts if not a.read]
-    
-    return [a.to_dict() for a in alerts]
+def create_alerts(
+    usernames: List[str],
+    alert_type: AlertType,
+    severity: AlertSeverity,
+    title: str,
+    message: str,
+    metadata: Dict = None
+) -> int:
+    """
+    Create the same alert for many users. The recipients' alerts share one
+    payload (title, message, metadata, timestamp), stored once under a
+    payload id; only the id and read state are per user.
+    """
+    metadata = metadata or {}
+    timestamp = datetime.utcnow().isoformat()
+    payload_id = _new_alert_id("payload")
+    for username in usernames:
+        alert = Alert(alert_type, severity, title, message, metadata)
+        alert.timestamp = timestamp
+        alert.payload_id = payload_id
+        _deliver(username, alert)
+    return len(usernames)
+
+def _deliver(username: str, alert: Alert):
+    _alert_writer.add(username, alert)
+    payload = alert.to_dict()
+    _alert_cache.append(username, payload)
+    for listener in _alert_listeners:
+        listener(username, payload)
+
+async def get_user_alerts(username: str, unread_only: bool = False) -> List[Dict]:
+    """Get a user's most recent alerts (oldest first)"""
+    alerts = _alert_cache.get(username)
+    if alerts is None:
+        alerts = await _alert_writer.backend.recent(username, ALERTS_PER_USER)
+        known = {alert["id"] for alert in alerts}
+        alerts += [a.to_dict() for a in _alert_writer.pending_for(username) if a.id not in known]
+        alerts.sort(key=lambda alert: alert["id"])
+        _alert_cache.put(username, alerts)
+    return [alert for alert in alerts if not (unread_only and alert["read"])]
+
+async def count_unread_alerts(username: str) -> int:
+    """Number of unread alerts for a user, counted by the backend and cached"""
+    unread = _alert_cache.get_unread(username)
+    if unread is None:
+        # Buffered alerts count too; they are written at most one flush interval early
+        await _flush_pending(username)
+        unread = await _alert_writer.backend.count_unread(username)
+        _alert_cache.put_unread(username, unread)
+    return unread
+
+async def get_alerts_since(timestamp: float, usernames: List[str]) -> List[Tuple[str, Dict]]:
+    """(username, alert) pairs of the given users stored at or after a Unix timestamp"""
+    if not usernames:
+        return []
+    return await _alert_writer.backend.since(timestamp, usernames)
 
-def mark_alert_read(username: str, alert_id: str) -> bool:
+async def _flush_pending(username: str):
+    # Changes go straight to the backend, so the user's new alerts must be there first
+    if _alert_writer.has_pending(username):
+        await _alert_writer.flush()
+
+async def mark_alert_read(username: str, alert_id: str) -> bool:
     """Mark an alert as read"""
-    alerts = _alerts_store.get(username, [])
-    for alert in alerts:
-        if alert.id == alert_id:
-            alert.read = True
-            return True
-    return False
-
-def mark_all_alerts_read(username: str) -> int:
+    await _flush_pending(username)
+    found = await _alert_writer.backend.mark_read(username, alert_id)
+    if found:
+        _alert_cache.mark_read(username, alert_id)
+    return found
+
+async def mark_all_alerts_read(username: str) -> int:
     """Mark all alerts as read for a user"""
-    alerts = _alerts_store.get(username, [])
-    count = 0
-    for alert in alerts:
-        if not alert.read:
-            alert.read = True
-            count += 1
+    await _flush_pending(username)
+    count = await _alert_writer.backend.mark_all_read(username)
+    _alert_cache.mark_read(username)
     return count
 
-def clear_alerts(username: str) -> int:
+async def clear_alerts(username: str) -> int:
     """Clear all alerts for a user"""
-    count = len(_alerts_store.get(username, []))
-    _alerts_store[username] = []
+    await _flush_pending(username)
+    count = await _alert_writer.backend.clear(username)
+    _alert_cache.put(username, [], unread=0)
     return count
 
+def start_alert_service():
+    _alert_writer.start()
+    _alert_dispatcher.start()
+
+async def stop_alert_service():
+    """Flush and close the alert backend; logs rather than raises, so the rest of shutdown runs"""
+    await _alert_dispatcher.stop()
+    await _alert_writer.stop()
+    try:
+        await _alert_writer.backend.close()
+    except Exception as e:
+        logger.error(f"Failed to close alert backend: {e}")
+
+def get_alert_store_stats() -> Dict:
+    """Alert backend, write buffer, read cache and fan-out statistics"""
+    return {
+        "backend": _alert_writer.backend.name,
+        **_alert_writer.backend.stats(),
+        "writer": _alert_writer.get_stats(),
+        "fanout": _alert_dispatcher.get_stats(),
+        "cache": _alert_cache.get_stats()
+    }
+
 # Alert creators for specific events
 def alert_document_tampered(
     username: str,
@@ -170,6 +626,24 @@ def alert_document_registered(
         }
     )
 
+def alert_batch_registered(
+    username: str,
+    registered: int,
+    failed: int
+):
+    """Alert when a bulk registration completes"""
+    return create_alert(
+        username=username,
+        alert_type=AlertType.DOCUMENT_REGISTERED,
+        severity=AlertSeverity.WARNING if failed else AlertSeverity.INFO,
+        title="✅ Batch Registration Complete",
+        message=f"{registered} documents registered and signed, {failed} failed.",
+        metadata={
+            "registered": registered,
+            "failed": failed
+        }
+    )
+
 def alert_unauthorized_access(
     username: str,
     attempted_action: str,
@@ -189,31 +663,64 @@ def alert_unauthorized_access(
         }
     )
 
+def alert_security_document_tampered(
+    owner: str,
+    filename: str,
+    stored_hash: str,
+    uploaded_hash: str
+):
+    """Alert admins and auditors to tampering (the owner is alerted separately)"""
+    broadcast_alert_to_roles(
+        [UserRole.ADMIN.value, UserRole.AUDITOR.value],
+        alert_type=AlertType.DOCUMENT_TAMPERED,
+        severity=AlertSeverity.CRITICAL,
+        title="⚠️ Document Tampering Detected!",
+        message=f"The document '{filename}' (owner: {owner}) has been tampered with. Hash mismatch detected.",
+        metadata={
+            "filename": filename,
+            "owner": owner,
+            "stored_hash": stored_hash[:16] + "...",
+            "uploaded_hash": uploaded_hash[:16] + "...",
+            "action_required": "Review the audit log for this document"
+        },
+        exclude=[owner]
+    )
+
+def broadcast_alert_to_roles(
+    roles: List[str],
+    alert_type: AlertType,
+    severity: AlertSeverity,
+    title: str,
+    message: str,
+    metadata: Dict = None,
+    exclude: List[str] = ()
+):
+    """Queue an alert for every active user with any of the roles, except exclude"""
+    _alert_dispatcher.broadcast(
+        _Broadcast(roles, exclude, alert_type, severity, title, message, metadata)
+    )
+
 def broadcast_alert_to_admins(
     alert_type: AlertType,
     severity: AlertSeverity,
     title: str,
     message: str,
-    metadata: Dict = None
+    metadata: Dict = None,
+    exclude: List[str] = ()
 ):
     """Send alert to all admin users"""
-    # In production, query database for all admins
-    # For now, this is a placeholder
-    admin_usernames = []  # Get from database
-    
-    for admin in admin_usernames:
-        create_alert(admin, alert_type, severity, title, message, metadata)
+    broadcast_alert_to_roles([UserRole.ADMIN.value], alert_type, severity, title, message, metadata, exclude)
 
 def broadcast_alert_to_auditors(
     alert_type: AlertType,
     severity: AlertSeverity,
     title: str,
     message: str,
-    metadata: Dict = None
+    metadata: Dict = None,
+    exclude: List[str] = ()
 ):
     """Send alert to all auditor users"""
-    # Similar to broadcast_alert_to_admins
-    pass
+    broadcast_alert_to_roles([UserRole.AUDITOR.value], alert_type, severity, title, message, metadata, exclude)
 
 # Email notification function (placeholder for Azure Communication Services)
 def send_email_notification(
@@ -0,0 +1,239 @@
+"""
+Server-sent alert stream
+Pushes new alerts to connected clients (GET /alerts/stream) instead of
+having them poll GET /alerts. Each worker holds an in-process hub of
+subscriptions per user: alerts created on this worker are published to it
+directly, and alerts written by other workers are picked up by a single
+periodic backend query shared by every subscriber.
+
+Delivery is at least once; clients de-duplicate on the event id (the alert id).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Set
+
+from alert_service import add_alert_listener, get_alerts_since, get_user_alerts
+
+logger = logging.getLogger(__name__)
+
+# Comment line sent on idle connections so proxies keep them open
+ALERT_STREAM_HEARTBEAT_SECONDS = int(os.getenv("ALERT_STREAM_HEARTBEAT_SECONDS", "15"))
+# Events queued per connection; a client that falls this far behind is
+# disconnected and catches up through Last-Event-ID when it reconnects
+ALERT_STREAM_BUFFER = int(os.getenv("ALERT_STREAM_BUFFER", "100"))
+ALERT_STREAM_MAX_CONNECTIONS = int(os.getenv("ALERT_STREAM_MAX_CONNECTIONS", "10000"))
+# How often alerts from other workers are fetched (0 disables: single worker)
+ALERT_STREAM_POLL_SECONDS = float(os.getenv("ALERT_STREAM_POLL_SECONDS", "5"))
+# Client reconnect delay advertised in the stream
+ALERT_STREAM_RETRY_MS = int(os.getenv("ALERT_STREAM_RETRY_MS", "3000"))
+
+# Re-read this much before the last poll: covers write lag and clock skew
+# between workers (alerts are matched on the time they were written)
+_POLL_OVERLAP_SECONDS = 3
+# Recently published ids kept per subscribed user, to drop repeats
+_DELIVERED_IDS = 256
+
+
+class AlertStreamFull(RuntimeError):
+    """This worker holds ALERT_STREAM_MAX_CONNECTIONS streams already"""
+
+
+def format_event(alert: Dict) -> str:
+    return f"id: {alert['id']}\nevent: alert\ndata: {json.dumps(alert)}\n\n"
+
+
+class Subscription:
+    __slots__ = ("username", "queue", "overflowed")
+
+    def __init__(self, username: str):
+        self.username = username
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=ALERT_STREAM_BUFFER)
+        self.overflowed = False
+
+    def offer(self, event: str) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+
+class AlertHub:
+    """
+    Subscriptions per user on this worker. An idle subscription is one
+    suspended coroutine and an empty queue; nothing runs per connection
+    until an alert arrives or the heartbeat is due. Only touched from the
+    event loop (publish() hops onto it when called from another thread).
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._delivered: Dict[str, "OrderedDict[str, None]"] = {}
+        self._connections = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"published": 0, "events_sent": 0, "caught_up": 0, "overflows": 0, "rejected": 0}
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        add_alert_listener(self.publish)
+        if ALERT_STREAM_POLL_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def check_capacity(self):
+        if self._connections >= ALERT_STREAM_MAX_CONNECTIONS:
+            self._stats["rejected"] += 1
+            raise AlertStreamFull("Too many alert streams open, retry shortly")
+
+    def subscribe(self, username: str) -> Subscription:
+        self.check_capacity()
+        subscription = Subscription(username)
+        self._subscribers.setdefault(username, set()).add(subscription)
+        self._delivered.setdefault(username, OrderedDict())
+        self._connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.username)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        self._connections -= 1
+        if not subscriptions:
+            del self._subscribers[subscription.username]
+            del self._delivered[subscription.username]
+
+    def publish(self, username: str, alert: Dict):
+        """Alert listener: may be called from any thread"""
+        if self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            self._publish(username, alert)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, username, alert)
+
+    def _publish(self, username: str, alert: Dict) -> bool:
+        subscriptions = self._subscribers.get(username)
+        if not subscriptions:
+            return False
+
+        delivered = self._delivered[username]
+        if alert["id"] in delivered:
+            return False
+        delivered[alert["id"]] = None
+        if len(delivered) > _DELIVERED_IDS:
+            delivered.popitem(last=False)
+
+        # Serialized once, however many tabs the user has open
+        event = format_event(alert)
+        self._stats["published"] += 1
+        for subscription in subscriptions:
+            if not subscription.offer(event):
+                self._stats["overflows"] += 1
+        return True
+
+    async def _run(self):
+        since = time.time()
+        while True:
+            await asyncio.sleep(ALERT_STREAM_POLL_SECONDS)
+            started = time.time()
+            if not self._subscribers:
+                since = started
+                continue
+
+            try:
+                entries = await get_alerts_since(since - _POLL_OVERLAP_SECONDS, list(self._subscribers))
+            except Exception as e:
+                logger.warning(f"Alert stream catch-up failed: {e}")
+                continue
+            since = started
+
+            for username, alert in entries:
+                if self._publish(username, alert):
+                    self._stats["caught_up"] += 1
+
+    def record_sent(self):
+        self._stats["events_sent"] += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            **self._stats,
+            "connections": self._connections,
+            "users": len(self._subscribers)
+        }
+
+
+alert_hub = AlertHub()
+
+
+async def stream_alerts(username: str, last_event_id: str = None) -> AsyncIterator[str]:
+    """
+    Event stream for one user: alerts missed since last_event_id first, then
+    new alerts as they are published, with heartbeats between. If the
+    connection's buffer overflows, the stream ends once what is buffered has
+    been sent, and the client reconnects to catch up.
+
+    The subscription is taken when the stream starts, so a response that is
+    never sent (client gone, send failure) holds no slot in the hub.
+    """
+    try:
+        subscription = alert_hub.subscribe(username)
+    except AlertStreamFull:
+        # Filled up since the endpoint checked; the client retries
+        yield f"retry: {ALERT_STREAM_RETRY_MS}\n\n"
+        return
+
+    try:
+        yield f"retry: {ALERT_STREAM_RETRY_MS}\n\n"
+
+        if last_event_id:
+            for alert in await get_user_alerts(subscription.username):
+                if alert["id"] > last_event_id:
+                    alert_hub.record_sent()
+                    yield format_event(alert)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), ALERT_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            alert_hub.record_sent()
+            yield event
+            # Alerts dropped on overflow come back through Last-Event-ID
+            if subscription.overflowed and subscription.queue.empty():
+                break
+    finally:
+        alert_hub.unsubscribe(subscription)
+
+
+def start_alert_stream():
+    alert_hub.start()
+
+
+async def stop_alert_stream():
+    await alert_hub.stop()
+
+
+def get_alert_stream_stats() -> Dict:
+    return alert_hub.get_stats()
@@ -0,0 +1,362 @@
+"""
+Write-behind audit logging
+Queues audit events in-process and flushes them to Cosmos DB in batches,
+off the request path. Every event is first appended to a local spill file,
+so queued events survive a crash and are replayed on the next start.
+Events Cosmos keeps rejecting are moved to a dead-letter file instead of
+blocking the queue.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cosmos_service import (
+    build_audit_item, write_audit_items,
+    log_audit_event as _write_audit_event, log_audit_events_batch as _write_audit_events
+)
+
+logger = logging.getLogger(__name__)
+
+AUDIT_WRITE_BEHIND = os.getenv("AUDIT_WRITE_BEHIND", "true").lower() == "true"
+# Max queued events; producers wait (backpressure) when it is full
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+# Flush when this many events are queued (Cosmos batch limit is 100)...
+AUDIT_FLUSH_BATCH = min(int(os.getenv("AUDIT_FLUSH_BATCH", "100")), 100)
+# ...or when the oldest queued event has waited this long
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "500"))
+AUDIT_SPILL_DIR = os.getenv("AUDIT_SPILL_DIR", "audit_spill")
+AUDIT_SPILL_SEGMENT_BYTES = int(os.getenv("AUDIT_SPILL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+AUDIT_SPILL_FSYNC = os.getenv("AUDIT_SPILL_FSYNC", "false").lower() == "true"
+# How long shutdown waits for the queue to drain; the rest stays spilled
+AUDIT_DRAIN_TIMEOUT_SECONDS = int(os.getenv("AUDIT_DRAIN_TIMEOUT_SECONDS", "30"))
+# Write attempts per batch before it is split, and per event before the
+# event is dead-lettered
+AUDIT_FLUSH_ATTEMPTS = int(os.getenv("AUDIT_FLUSH_ATTEMPTS", "5"))
+# Events that could not be written, one {"item", "error"} object per line
+# (not replayed automatically; move lines into a spill segment to retry)
+AUDIT_DEAD_LETTER_FILE = os.getenv(
+    "AUDIT_DEAD_LETTER_FILE", os.path.join(AUDIT_SPILL_DIR, "dead-letter.jsonl")
+)
+
+# Backoff between retries while Cosmos is unavailable
+_RETRY_DELAYS = [0.5, 1, 2, 5, 10]
+
+
+class _Segment:
+    """One spill file, locked by the worker that owns it"""
+
+    def __init__(self, path: str, handle):
+        self.path = path
+        self.handle = handle
+        self.pending = 0
+        self.sealed = False
+
+
+class AuditWriter:
+    """
+    Batches audit events into Cosmos writes.
+
+    Events are spilled to segment files, queued, and flushed by a background
+    task when AUDIT_FLUSH_BATCH events are waiting or AUDIT_FLUSH_INTERVAL_MS
+    has passed. A segment is deleted once all its events are in Cosmos (or
+    dead-lettered). Writes are idempotent upserts, so replaying a segment
+    is safe.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self._current: Optional[_Segment] = None
+        self._segments: Dict[str, _Segment] = {}
+        self._sequence = 0
+        self._spill_lock: Optional[asyncio.Lock] = None
+        self._spill_waiting: List[Tuple[List[dict], asyncio.Future]] = []
+        self._stats = {
+            "queued": 0, "flushed": 0, "batches": 0, "retries": 0,
+            "replayed": 0, "split": 0, "dead_lettered": 0
+        }
+
+    async def start(self):
+        """Start the flush task and replay orphaned spill files in the background"""
+        os.makedirs(AUDIT_SPILL_DIR, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._spill_lock = asyncio.Lock()
+        self._open_segment()
+        self._task = asyncio.create_task(self._run())
+
+        # Replaying can wait on a full queue; startup must not
+        paths = sorted(glob.glob(os.path.join(AUDIT_SPILL_DIR, "audit-*.jsonl")))
+        orphans = [path for path in paths if path not in self._segments]
+        if orphans:
+            self._replay_task = asyncio.create_task(self._replay_all(orphans))
+
+    async def stop(self):
+        """Drain the queue into Cosmos and stop the flush task"""
+        if self._task is None:
+            return
+
+        # Segments not fully read stay on disk and are replayed next start
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+
+        try:
+            await asyncio.wait_for(self._queue.join(), AUDIT_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"{self._queue.qsize()} audit events not flushed at shutdown; "
+                f"they stay in {AUDIT_SPILL_DIR} and are replayed on next start"
+            )
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        self._current.sealed = True
+        for segment in list(self._segments.values()):
+            self._release_if_done(segment)
+            # Unlock anything left so the next start can replay it
+            segment.handle.close()
+
+    async def log(self, filename: str, action: str, result: str):
+        """Record an audit event; waits only if the queue is full"""
+        await self.log_items([build_audit_item(filename, action, result)])
+
+    async def log_items(self, items: List[dict]):
+        segment = await self._spill(items)
+        for item in items:
+            await self._queue.put((item, segment))
+            self._stats["queued"] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "spill_segments": len(self._segments)
+        }
+
+    # ---- spill files ----
+
+    def _open_segment(self):
+        self._sequence += 1
+        path = os.path.join(
+            AUDIT_SPILL_DIR,
+            f"audit-{time.time_ns():020d}-{os.getpid()}-{self._sequence:06d}.jsonl"
+        )
+        handle = open(path, "a", encoding="utf-8")
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._current = _Segment(path, handle)
+        self._segments[path] = self._current
+
+    async def _spill(self, items: List[dict]) -> _Segment:
+        """
+        Append events to the current segment. The write (and fsync) runs in
+        a thread; callers that arrive while one is in progress are written
+        together by the next one, so there is one write per group of
+        requests rather than per event.
+        """
+        request = (items, asyncio.get_running_loop().create_future())
+        self._spill_waiting.append(request)
+
+        async with self._spill_lock:
+            if not request[1].done():
+                group, self._spill_waiting = self._spill_waiting, []
+                segment = self._current
+                try:
+                    await asyncio.to_thread(
+                        _append_lines, segment.handle, [json.dumps(item) for batch, _ in group for item in batch]
+                    )
+                except BaseException as e:
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Audit spill interrupted"))
+                    raise
+
+                segment.pending += sum(len(batch) for batch, _ in group)
+                for _, future in group:
+                    future.set_result(segment)
+
+                if segment.handle.tell() >= AUDIT_SPILL_SEGMENT_BYTES:
+                    segment.sealed = True
+                    self._open_segment()
+
+        return await request[1]
+
+    async def _replay_all(self, paths: List[str]):
+        for path in paths:
+            await self._replay(path)
+
+    async def _replay(self, path: str):
+        try:
+            handle = open(path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return
+
+        try:
+            # Skip files still owned by a live worker
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return
+
+        segment = _Segment(path, handle)
+        self._segments[path] = segment
+        lines = await asyncio.to_thread(handle.readlines)
+
+        for line in lines:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final line from a crash mid-write
+                continue
+            segment.pending += 1
+            self._stats["replayed"] += 1
+            await self._queue.put((item, segment))
+
+        # Sealed only once fully queued, so an early flush can't delete it
+        segment.sealed = True
+        logger.info(f"Replaying {len(lines)} spilled audit events from {path}")
+        self._release_if_done(segment)
+
+    def _release_if_done(self, segment: _Segment):
+        if segment.sealed and segment.pending == 0:
+            segment.handle.close()
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+            self._segments.pop(segment.path, None)
+
+    # ---- flushing ----
+
+    async def _run(self):
+        interval = AUDIT_FLUSH_INTERVAL_MS / 1000
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + interval
+
+            while len(batch) < AUDIT_FLUSH_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[dict, _Segment]]):
+        error = None
+        for attempt in range(AUDIT_FLUSH_ATTEMPTS):
+            if attempt:
+                # Keep the batch (it is also on disk) and retry with backoff
+                delay = _RETRY_DELAYS[min(attempt - 1, len(_RETRY_DELAYS) - 1)]
+                logger.warning(f"Audit flush of {len(batch)} events failed, retrying in {delay}s: {error}")
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+
+            try:
+                failures = await write_audit_items([item for item, _ in batch])
+            except Exception as e:
+                error, failures = e, None
+                continue
+
+            self._complete([entry for entry in batch if entry[0]["id"] not in failures])
+            batch = [entry for entry in batch if entry[0]["id"] in failures]
+            if not batch:
+                return
+            error = next(iter(failures.values()))
+
+        if failures is None and len(batch) > 1:
+            # The whole write kept failing: halve the batch to isolate the
+            # events responsible instead of dead-lettering all of them
+            self._stats["split"] += 1
+            middle = len(batch) // 2
+            await self._flush(batch[:middle])
+            await self._flush(batch[middle:])
+            return
+
+        await self._dead_letter(batch, str(error))
+
+    async def _dead_letter(self, batch: List[Tuple[dict, _Segment]], error: str):
+        logger.error(f"Moving {len(batch)} audit events to {AUDIT_DEAD_LETTER_FILE}: {error}")
+        lines = [json.dumps({"item": item, "error": error}) for item, _ in batch]
+        await asyncio.to_thread(_append_dead_letters, lines)
+        self._stats["dead_lettered"] += len(batch)
+        self._complete(batch, written=False)
+
+    def _complete(self, entries: List[Tuple[dict, _Segment]], written: bool = True):
+        if not entries:
+            return
+        if written:
+            self._stats["flushed"] += len(entries)
+            self._stats["batches"] += 1
+
+        for _, segment in entries:
+            segment.pending -= 1
+            self._queue.task_done()
+        for segment in {segment for _, segment in entries}:
+            self._release_if_done(segment)
+
+
+def _append_lines(handle, lines: List[str]):
+    handle.write("".join(line + "\n" for line in lines))
+    handle.flush()
+    if AUDIT_SPILL_FSYNC:
+        os.fsync(handle.fileno())
+
+
+def _append_dead_letters(lines: List[str]):
+    # Always synced: these events exist nowhere else once their segment goes
+    with open(AUDIT_DEAD_LETTER_FILE, "a", encoding="utf-8") as handle:
+        handle.write("".join(line + "\n" for line in lines))
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+audit_writer = AuditWriter()
+
+
+async def log_audit_event(filename: str, action: str, result: str):
+    """Record an audit event (write-behind unless AUDIT_WRITE_BEHIND=false)"""
+    if AUDIT_WRITE_BEHIND:
+        await audit_writer.log(filename, action, result)
+    else:
+        await _write_audit_event(filename, action, result)
+
+
+async def log_audit_events_batch(events: list):
+    """Record many (filename, action, result) audit events"""
+    if AUDIT_WRITE_BEHIND:
+        await audit_writer.log_items([build_audit_item(*event) for event in events])
+    else:
+        await _write_audit_events(events)
+
+
+async def start_audit_writer():
+    if AUDIT_WRITE_BEHIND:
+        await audit_writer.start()
+
+
+async def stop_audit_writer():
+    if AUDIT_WRITE_BEHIND:
+        await audit_writer.stop()
+
+
+def get_audit_writer_stats() -> dict:
+    return audit_writer.get_stats()
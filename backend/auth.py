@@ -1,5 +1,7 @@
+import asyncio
+import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -9,18 +11,56 @@ SECRET_KEY = "CHANGE_ME_LATER"  # will move to Azure Key Vault later
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+# Alert stream sessions: EventSource cannot send an Authorization header, and
+# a token in the URL would end up in access logs, so the stream authenticates
+# with a narrowly scoped token in an HttpOnly cookie instead
+ALERT_STREAM_SCOPE = "alert_stream"
+ALERT_STREAM_COOKIE = "docvault_alert_stream"
+ALERT_STREAM_SESSION_SECONDS = int(os.getenv("ALERT_STREAM_SESSION_SECONDS", "900"))
+# Browsers treat http://localhost as secure, so this only needs turning off
+# for plain-http deployments on other hosts
+ALERT_STREAM_COOKIE_SECURE = os.getenv("ALERT_STREAM_COOKIE_SECURE", "true").lower() == "true"
+
+# Hash cost. Hashes made with other rounds are flagged for rehashing
+# (see verify_and_update_password), so changing this upgrades users on login.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "535000"))
+
+pwd_context = CryptContext(
+    schemes=["sha256_crypt"],
+    deprecated="auto",
+    sha256_crypt__default_rounds=PASSWORD_HASH_ROUNDS,
+    sha256_crypt__min_rounds=PASSWORD_HASH_ROUNDS,
+    sha256_crypt__max_rounds=PASSWORD_HASH_ROUNDS
+)
+
+
+# 🔹 Password hashing (CPU-bound: call through password_service from async code)
+def _ensure_off_event_loop():
+    # A hash takes hundreds of milliseconds; on the event loop it would stall
+    # every request. Pool workers (threads or processes) have no running loop.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError("Password hashing called on the event loop; use password_service instead")
 
 
-# 🔹 Password hashing
 def hash_password(password: str) -> str:
+    _ensure_off_event_loop()
     return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    _ensure_off_event_loop()
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash if the stored one uses outdated settings"""
+    _ensure_off_event_loop()
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 # 🔹 JWT creation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -30,3 +70,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def create_stream_token(username: str) -> str:
+    """
+    Token for the alert stream cookie. It carries no role, so
+    get_current_user rejects it anywhere else.
+    """
+    expire = datetime.utcnow() + timedelta(seconds=ALERT_STREAM_SESSION_SECONDS)
+    return jwt.encode(
+        {"sub": username, "scope": ALERT_STREAM_SCOPE, "exp": expire},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
@@ -0,0 +1,155 @@
+"""
+Bulk document processing for /register/batch and /verify/batch
+Hashes (and for registration uploads and signs) many files in parallel on a
+bounded worker pool
+"""
+import os
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Callable, Iterable, Iterator, List, Tuple
+
+from hash_service import generate_sha256_stream, CHUNK_SIZE
+from ingest_service import ingest_document
+from signature_service import sign_document, verify_signature
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+# Files read but not yet processed; bounds memory/temp-disk use for tar input
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "32"))
+# Tar members up to this size are buffered in memory, larger ones spill to disk
+TAR_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch-ingest")
+
+
+def iter_tar_members(fileobj: IO[bytes]) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    Yield (name, file) for each regular file in a tar stream.
+
+    The archive is read sequentially (``r|*``, any compression) and each
+    member is copied into its own spooled temp file so it can be processed
+    after the stream has moved on.
+    """
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+
+            source = archive.extractfile(member)
+            spool = tempfile.SpooledTemporaryFile(max_size=TAR_SPOOL_MAX_SIZE)
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                spool.write(chunk)
+            spool.seek(0)
+
+            yield member.name, spool
+
+
+def _ingest_one(filename: str, fileobj: IO[bytes], username: str) -> dict:
+    try:
+        ingest = ingest_document(fileobj, filename)
+        signature_data = sign_document(ingest["sha256"], username)
+
+        return {
+            "filename": filename,
+            "status": "UPLOADED",
+            "sha256": ingest["sha256"],
+            "content_address": ingest["content_address"],
+            "deduplicated": ingest["deduplicated"],
+            "signature_data": signature_data
+        }
+    except Exception as e:
+        return {"filename": filename, "status": "FAILED", "error": str(e)}
+    finally:
+        fileobj.close()
+
+
+def _hash_one(filename: str, fileobj: IO[bytes]) -> dict:
+    try:
+        return {"filename": filename, "status": "HASHED", "sha256": generate_sha256_stream(fileobj)}
+    except Exception as e:
+        return {"filename": filename, "status": "FAILED", "error": str(e)}
+    finally:
+        fileobj.close()
+
+
+class BatchInputError(Exception):
+    """
+    The input stream broke part way (e.g. a corrupt tar archive). ``results``
+    holds the results for the files read before the error, in input order.
+    """
+
+    def __init__(self, message: str, results: List[dict]):
+        super().__init__(message)
+        self.results = results
+
+
+def _map_files(files: Iterable[Tuple[str, IO[bytes]]], worker: Callable, *args) -> List[dict]:
+    slots = threading.BoundedSemaphore(BATCH_MAX_IN_FLIGHT)
+    entries = []  # a Future per submitted file, or a result dict for a rejected one
+    seen = set()
+    input_error = None
+
+    iterator = iter(files)
+    while True:
+        try:
+            filename, fileobj = next(iterator)
+        except StopIteration:
+            break
+        except Exception as e:
+            # Stop reading, but let the files already submitted finish: their
+            # uploads are under way and their results must be reported
+            input_error = e
+            break
+
+        if filename in seen:
+            fileobj.close()
+            entries.append({"filename": filename, "status": "FAILED", "error": "Duplicate filename in batch"})
+            continue
+        seen.add(filename)
+
+        slots.acquire()
+        future = _pool.submit(worker, filename, fileobj, *args)
+        future.add_done_callback(lambda _: slots.release())
+        entries.append(future)
+
+    results = [entry if isinstance(entry, dict) else entry.result() for entry in entries]
+    if input_error is not None:
+        raise BatchInputError(str(input_error), results) from input_error
+    return results
+
+
+def ingest_files(files: Iterable[Tuple[str, IO[bytes]]], username: str) -> List[dict]:
+    """
+    Hash, upload and sign files in parallel.
+
+    Blocking; call from a worker thread. ``files`` may be a lazy iterator
+    (e.g. iter_tar_members): at most BATCH_MAX_IN_FLIGHT files are pulled
+    ahead of the workers.
+
+    Returns:
+        One result per file, in input order, with status UPLOADED or FAILED
+        (a repeated filename fails without being processed)
+
+    Raises:
+        BatchInputError: the input broke part way; carries the results so far
+    """
+    return _map_files(files, _ingest_one, username)
+
+
+def hash_files(files: Iterable[Tuple[str, IO[bytes]]]) -> List[dict]:
+    """
+    Hash files in parallel (blocking, same input rules as ingest_files).
+
+    Returns:
+        One result per file, in input order, with status HASHED or FAILED
+
+    Raises:
+        BatchInputError: the input broke part way; carries the results so far
+    """
+    return _map_files(files, _hash_one)
+
+
+def verify_signatures(checks: List[Tuple[str, dict]]) -> List[bool]:
+    """Run verify_signature for (stored_hash, signature_data) pairs in parallel (blocking)"""
+    return list(_pool.map(lambda check: verify_signature(*check), checks))
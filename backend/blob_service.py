@@ -1,35 +1,242 @@
 import os
-from azure.storage.blob import BlobServiceClient
+import time
+import uuid
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Optional
+
+from azure.storage.blob import BlobServiceClient, BlobBlock
 from azure.core.exceptions import AzureError
 
 CONTAINER_NAME = "documents"
 
+# Content-addressed mode: blobs are named after their SHA-256, so identical
+# content is stored (and uploaded) only once.
+CONTENT_ADDRESSED = os.getenv("BLOB_CONTENT_ADDRESSED", "false").lower() == "true"
+
+# Block upload tuning. Blobs smaller than one block go up in a single call;
+# larger ones are staged as blocks with up to BLOB_MAX_CONCURRENCY in flight,
+# so peak memory per upload is roughly block size * concurrency.
+BLOCK_SIZE = int(os.getenv("BLOB_BLOCK_SIZE", str(8 * 1024 * 1024)))
+MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+UPLOAD_WORKERS = int(os.getenv("BLOB_UPLOAD_WORKERS", "16"))
+
+_client: Optional[BlobServiceClient] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+# Process-wide upload counters for get_upload_stats()
+_totals = {"uploads": 0, "bytes": 0, "blocks": 0, "seconds": 0.0}
+
+
+class UploadStats:
+    """Progress and throughput of a single blob upload"""
+
+    def __init__(self, blob_name: str, total_bytes: int = None):
+        self.blob_name = blob_name
+        self.total_bytes = total_bytes
+        self.bytes_uploaded = 0
+        self.blocks = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at or time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput_mbps(self) -> float:
+        elapsed = self.elapsed
+        if not elapsed:
+            return 0.0
+        return self.bytes_uploaded / elapsed / (1024 * 1024)
+
+    def to_dict(self):
+        return {
+            "blob_name": self.blob_name,
+            "bytes_uploaded": self.bytes_uploaded,
+            "total_bytes": self.total_bytes,
+            "blocks": self.blocks,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "throughput_mbps": round(self.throughput_mbps, 2)
+        }
+
+
+def get_blob_service_client() -> BlobServiceClient:
+    """
+    Return the process-wide BlobServiceClient, creating it on first use.
+    The client (and its connection pool) is reused by every upload.
+    """
+    global _client
+
+    if _client is None:
+        with _lock:
+            if _client is None:
+                connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+
+                if not connection_string:
+                    raise RuntimeError("Azure storage connection string not set")
+
+                _client = BlobServiceClient.from_connection_string(
+                    connection_string
+                )
+
+    return _client
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=UPLOAD_WORKERS,
+                    thread_name_prefix="blob-upload"
+                )
+
+    return _executor
+
+
+def content_address(sha256: str) -> str:
+    """Blob name for content with the given SHA-256 hash"""
+    return f"sha256/{sha256}"
 
-def upload_file_to_blob(local_file_path: str, blob_name: str) -> None:
+
+def blob_exists(blob_name: str) -> bool:
+    """Check whether a blob is already stored"""
+    try:
+        return get_blob_service_client().get_blob_client(
+            container=CONTAINER_NAME,
+            blob=blob_name
+        ).exists()
+    except AzureError as e:
+        raise RuntimeError(f"Azure Blob lookup failed: {str(e)}")
+
+
+def get_upload_stats() -> dict:
+    """Aggregate upload counters since process start"""
+    seconds = _totals["seconds"]
+    return {
+        "uploads": _totals["uploads"],
+        "bytes_uploaded": _totals["bytes"],
+        "blocks_staged": _totals["blocks"],
+        "avg_throughput_mbps": round(
+            _totals["bytes"] / seconds / (1024 * 1024), 2
+        ) if seconds else 0.0
+    }
+
+
+def _record(stats: UploadStats):
+    stats.finished_at = time.monotonic()
+    with _lock:
+        _totals["uploads"] += 1
+        _totals["bytes"] += stats.bytes_uploaded
+        _totals["blocks"] += stats.blocks
+        _totals["seconds"] += stats.elapsed
+
+
+def upload_file_to_blob(local_file_path: str, blob_name: str) -> UploadStats:
     """
     Upload a file to Azure Blob Storage.
 
     :param local_file_path: Path to local file
     :param blob_name: Name of blob in container
     """
-    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    with open(local_file_path, "rb") as data:
+        return upload_stream_to_blob(
+            data,
+            blob_name,
+            total_bytes=os.path.getsize(local_file_path)
+        )
+
+
+def upload_stream_to_blob(
+    stream,
+    blob_name: str,
+    block_size: int = None,
+    max_concurrency: int = None,
+    progress_callback: Callable[[int, Optional[int]], None] = None,
+    total_bytes: int = None
+) -> UploadStats:
+    """
+    Upload a readable binary stream to Azure Blob Storage.
+
+    The stream is read once, sequentially, one block at a time, so a
+    wrapping reader (e.g. ``hash_service.HashingReader``) sees every byte
+    in order. Blocks are staged in parallel and committed at the end.
+
+    :param stream: Readable binary file-like object
+    :param blob_name: Name of blob in container
+    :param block_size: Bytes per staged block (default BLOB_BLOCK_SIZE)
+    :param max_concurrency: Blocks in flight at once (default BLOB_MAX_CONCURRENCY)
+    :param progress_callback: Called as ``(bytes_uploaded, total_bytes)`` after
+        each block completes; may run on an upload worker thread
+    :param total_bytes: Expected size, if known (only used for progress)
+    :return: UploadStats for this upload
+    """
+    block_size = block_size or BLOCK_SIZE
+    max_concurrency = max(1, max_concurrency or MAX_CONCURRENCY)
+    stats = UploadStats(blob_name, total_bytes)
+    progress_lock = threading.Lock()
 
-    if not connection_string:
-        raise RuntimeError("Azure storage connection string not set")
+    def report(size: int):
+        with progress_lock:
+            stats.bytes_uploaded += size
+            stats.blocks += 1
+            uploaded = stats.bytes_uploaded
+        if progress_callback:
+            progress_callback(uploaded, total_bytes)
 
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
+        blob_client = get_blob_service_client().get_blob_client(
+            container=CONTAINER_NAME,
+            blob=blob_name
         )
 
-        container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+        first = stream.read(block_size)
+
+        # Small blob: one request, no block bookkeeping
+        if len(first) < block_size:
+            blob_client.upload_blob(first, overwrite=True)
+            report(len(first))
+            _record(stats)
+            return stats
+
+        # Block ids must be equal length within a blob; the per-upload prefix
+        # keeps concurrent uploads of the same name from clobbering blocks.
+        upload_id = uuid.uuid4().hex[:16]
+        executor = _get_executor()
+        block_ids = []
+        in_flight = set()
+
+        def stage(block_id: str, data: bytes):
+            blob_client.stage_block(block_id=block_id, data=data, length=len(data))
+            report(len(data))
+
+        data = first
+        while data:
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+
+            block_id = base64.b64encode(
+                f"{upload_id}{len(block_ids):08d}".encode()
+            ).decode()
+            block_ids.append(block_id)
+            in_flight.add(executor.submit(stage, block_id, data))
+
+            data = stream.read(block_size)
+
+        for future in wait(in_flight).done:
+            future.result()
 
-        with open(local_file_path, "rb") as data:
-            container_client.upload_blob(
-                name=blob_name,
-                data=data,
-                overwrite=True
-            )
+        blob_client.commit_block_list([BlobBlock(block_id=b) for b in block_ids])
+        _record(stats)
+        return stats
 
     except AzureError as e:
         raise RuntimeError(f"Azure Blob upload failed: {str(e)}")
@@ -1,10 +1,19 @@
+import asyncio
 import os
 import uuid
-from datetime import datetime
-from azure.cosmos import CosmosClient, exceptions
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from azure.cosmos.aio import CosmosClient
 from dotenv import load_dotenv
+from search_index import filename_grams, query_grams, relevance_tiers
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Load env variables
 COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
 COSMOS_KEY = os.getenv("COSMOS_KEY")
@@ -15,12 +24,478 @@ if not all([COSMOS_ENDPOINT, COSMOS_KEY, DATABASE_NAME, CONTAINER_NAME]):
     raise RuntimeError("Cosmos DB environment variables not set")
 
 
+# Storage layout:
+#   legacy      - COSMOS_CONTAINER, partition key path /type: one logical
+#                 partition per item type
+#   partitioned - COSMOS_PARTITIONED_CONTAINER, partition key path /pk:
+#                 documents (and their search items) by a hash bucket of the
+#                 filename, hash index items by a bucket of the content hash,
+#                 audit events by UTC day, alerts by recipient, shared
+#                 alert payloads by a bucket of their id
+#   dual        - while migrate_layout.py runs: writes go to the partitioned
+#                 container, reads fall back to the legacy one
+COSMOS_LAYOUT = os.getenv("COSMOS_LAYOUT", "legacy").lower()
+PARTITIONED_CONTAINER_NAME = os.getenv("COSMOS_PARTITIONED_CONTAINER")
+# Must not change once the partitioned container holds data
+DOCUMENT_BUCKETS = int(os.getenv("COSMOS_DOCUMENT_BUCKETS", "64"))
+
+if COSMOS_LAYOUT not in ("legacy", "dual", "partitioned"):
+    raise RuntimeError(f"Invalid COSMOS_LAYOUT: {COSMOS_LAYOUT}")
+if COSMOS_LAYOUT != "legacy" and not PARTITIONED_CONTAINER_NAME:
+    raise RuntimeError("COSMOS_PARTITIONED_CONTAINER not set")
+
+
+# Async client: every call below is awaited so Cosmos round trips never
+# block the event loop serving other requests.
 client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY)
 database = client.get_database_client(DATABASE_NAME)
 container = database.get_container_client(CONTAINER_NAME)
 
 
-def store_document(filename: str, sha256: str, signature_data: dict = None, uploaded_by: str = None):
+def _bucket(key: str) -> str:
+    digest = hashlib.sha256(key.encode()).digest()
+    return f"{int.from_bytes(digest[:4], 'big') % DOCUMENT_BUCKETS:03d}"
+
+
+class Layout:
+    """How items are partitioned in one container"""
+
+    def __init__(self, target, partitioned: bool):
+        self.container = target
+        self.partitioned = partitioned
+
+    def partition_key(self, kind: str, key: str = None) -> str:
+        """
+        Partition key value for an item.
+
+        Args:
+            kind: Item type
+            key: Filename (document, search), content hash (hash_index),
+                ISO timestamp (audit), username (alert) or payload id
+                (alert_payload); ignored for other types
+        """
+        if not self.partitioned:
+            return kind
+        if kind in ("document", "search"):
+            return f"doc:{_bucket(key)}"
+        if kind == "hash_index":
+            return f"hash:{_bucket(key)}"
+        if kind == "audit":
+            return f"audit:{key[:10]}"
+        if kind == "alert":
+            return f"alert:{key}"
+        if kind == "alert_payload":
+            return f"payload:{_bucket(key)}"
+        return kind
+
+    def item_partition_key(self, item: dict) -> str:
+        key = {
+            "document": item.get("filename"),
+            "search": item.get("filename"),
+            "hash_index": item.get("sha256"),
+            "audit": item.get("timestamp"),
+            "alert": item.get("username"),
+            "alert_payload": item.get("id")
+        }.get(item["type"])
+        return self.partition_key(item["type"], key)
+
+    def prepare(self, item: dict) -> dict:
+        """Add the partition key field to an item about to be written here"""
+        if self.partitioned:
+            item["pk"] = self.item_partition_key(item)
+        return item
+
+    def scope(self, kind: str) -> dict:
+        """query_items arguments for a query over one item type"""
+        # Partitioned: fan out; every query filters on c.type itself
+        return {} if self.partitioned else {"partition_key": kind}
+
+
+legacy_layout = Layout(container, partitioned=False)
+
+if COSMOS_LAYOUT == "legacy":
+    _layouts = [legacy_layout]
+else:
+    partitioned_layout = Layout(
+        database.get_container_client(PARTITIONED_CONTAINER_NAME),
+        partitioned=True
+    )
+    _layouts = [partitioned_layout]
+    if COSMOS_LAYOUT == "dual":
+        _layouts.append(legacy_layout)
+
+# All writes go to the primary layout; reads try each layout in order
+_primary = _layouts[0]
+
+
+async def close_client():
+    """Close the shared Cosmos client (called on application shutdown)"""
+    await client.close()
+
+
+async def _query(query: str, parameters: list = None, target=None, **kwargs) -> list:
+    target = target or container
+    return [
+        item async for item in target.query_items(
+            query=query,
+            parameters=parameters,
+            **kwargs
+        )
+    ]
+
+
+async def _read_item(kind: str, item_id: str, key: str = None, layouts: list = None):
+    """Point read, trying each layout in turn. Returns None if not found."""
+    for layout in _layouts if layouts is None else layouts:
+        try:
+            return await layout.container.read_item(
+                item=item_id,
+                partition_key=layout.partition_key(kind, key)
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            continue
+    return None
+
+
+async def _query_all(kind: str, query: str, parameters: list = None, key=None) -> list:
+    """
+    Run a query over one item type in every layout. Where an item is in
+    both (dual mode), the primary layout's copy wins.
+    """
+    key = key or (lambda item: item["id"])
+    found = {}
+    for layout in reversed(_layouts):
+        for item in await _query(query, parameters, target=layout.container, **layout.scope(kind)):
+            found[key(item)] = item
+    return list(found.values())
+
+
+async def _iter_query(layout: Layout, kind: str, query: str, parameters: list = None, page_size: int = None):
+    pages = layout.container.query_items(
+        query=query,
+        parameters=parameters,
+        max_item_count=page_size,
+        **layout.scope(kind)
+    ).by_page()
+
+    async for page in pages:
+        async for item in page:
+            yield item
+
+
+async def _merge_sorted(streams: list, key):
+    """Merge async iterators that are each already sorted by key"""
+    heads = {}
+    for index, stream in enumerate(streams):
+        item = await anext(stream, None)
+        if item is not None:
+            heads[index] = item
+
+    while heads:
+        index = min(heads, key=lambda i: key(heads[i]))
+        yield heads.pop(index)
+        item = await anext(streams[index], None)
+        if item is not None:
+            heads[index] = item
+
+
+async def query_page(
+    query: str,
+    parameters: list = None,
+    page_size: int = None,
+    continuation_token: str = None,
+    target=None,
+    **kwargs
+) -> dict:
+    """
+    Run a query and return a single page of results.
+
+    Returns:
+        {"items": [...], "continuation_token": str or None when no more pages}
+    """
+    target = target or container
+    pages = target.query_items(
+        query=query,
+        parameters=parameters,
+        max_item_count=page_size,
+        **kwargs
+    ).by_page(continuation_token)
+
+    try:
+        page = await pages.__anext__()
+    except StopAsyncIteration:
+        return {"items": [], "continuation_token": None}
+
+    return {
+        "items": [item async for item in page],
+        "continuation_token": pages.continuation_token
+    }
+
+
+async def _query_page_all(
+    kind: str,
+    query: str,
+    parameters: list = None,
+    page_size: int = None,
+    continuation_token: str = None,
+    order_by: str = None,
+    descending: bool = False
+) -> dict:
+    """
+    query_page over every layout. ``query`` has no ORDER BY clause; results
+    are ordered by the ``order_by`` expression when given.
+
+    In dual mode the layouts' results are merged in that order, and an item
+    that is in both is returned once, from the primary layout. The
+    continuation token then records, per layout, the Cosmos token of the
+    page being read and how many of its items were already returned.
+    """
+    ordering = f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}" if order_by else ""
+    if len(_layouts) == 1:
+        return await query_page(
+            query + ordering, parameters, page_size, continuation_token,
+            target=_primary.container, **_primary.scope(kind)
+        )
+
+    states = [[None, 0]] * len(_layouts)
+    if continuation_token:
+        try:
+            states = json.loads(continuation_token)
+            valid = len(states) == len(_layouts) and all(
+                state is None or (len(state) == 2 and isinstance(state[1], int)) for state in states
+            )
+        except (ValueError, TypeError):
+            valid = False
+        if not valid:
+            raise ValueError("Invalid continuation token")
+
+    # The merge key and id travel with each item in an extra column
+    # (SELECT * can't be combined with other columns, so it is wrapped)
+    merge_column = f'{{"id": c.id, "key": {order_by or "c.id"}}} AS _merge'
+    if query.startswith("SELECT * "):
+        merged_query = query.replace("SELECT * ", f"SELECT c AS _item, {merge_column} ", 1)
+    else:
+        merged_query = query.replace("SELECT ", f"SELECT {merge_column}, ", 1)
+    merged_query += ordering
+    cursors = [
+        _LayoutCursor(layout, kind, merged_query, parameters, page_size, state)
+        for layout, state in zip(_layouts, states)
+    ]
+
+    items = []
+    while page_size is None or len(items) < page_size:
+        best = None
+        for cursor in cursors:
+            head = await cursor.head()
+            if head is None:
+                continue
+            key = _order_key(head["_merge"]["key"])
+            # Ties go to the earlier (primary) layout
+            if best is None or (key > best_key if descending else key < best_key):
+                best, best_key = cursor, key
+        if best is None:
+            break
+
+        item = best.advance()
+        if item["_merge"]["id"] in best.shadowed:
+            continue
+        del item["_merge"]
+        items.append(item.pop("_item", item))
+
+    states = [cursor.state() for cursor in cursors]
+    return {
+        "items": items,
+        "continuation_token": json.dumps(states) if any(states) else None
+    }
+
+
+def _order_key(value) -> tuple:
+    """Python sort key matching Cosmos ordering across value types"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, json.dumps(value, sort_keys=True))
+
+
+class _LayoutCursor:
+    """A position in one layout's ordered query results (for _query_page_all)"""
+
+    def __init__(self, layout: Layout, kind: str, query: str, parameters: list, page_size: int, state: list):
+        self.layout = layout
+        self.kind = kind
+        self.query = query
+        self.parameters = parameters
+        self.page_size = page_size
+        self.done = state is None
+        self.token, self.skip = state or (None, 0)
+        self.items = None
+        self.next_token = None
+        self.position = 0
+        # Ids on the current page that the primary layout also holds
+        self.shadowed = set()
+
+    async def head(self):
+        while not self.done:
+            if self.items is None:
+                page = await query_page(
+                    self.query, self.parameters, self.page_size, self.token,
+                    target=self.layout.container, **self.layout.scope(self.kind)
+                )
+                self.items, self.next_token = page["items"], page["continuation_token"]
+                # Pages from one token may come back shorter than last time,
+                # so the items already returned are skipped across pages
+                self.position = min(self.skip, len(self.items))
+                self.skip -= self.position
+                self.shadowed = await self._find_shadowed()
+
+            if self.position < len(self.items):
+                return self.items[self.position]
+            if not self.next_token:
+                self.done = True
+            else:
+                self.token, self.items = self.next_token, None
+        return None
+
+    def advance(self) -> dict:
+        item = self.items[self.position]
+        self.position += 1
+        return item
+
+    def state(self):
+        """[page token, items already returned from it], or None when exhausted"""
+        if self.done:
+            return None
+        if self.items is None:
+            return [self.token, self.skip]
+        if self.position >= len(self.items):
+            return [self.next_token, 0] if self.next_token else None
+        return [self.token, self.position]
+
+    async def _find_shadowed(self) -> set:
+        if self.layout is _primary or not self.items:
+            return set()
+        ids = [item["_merge"]["id"] for item in self.items]
+        return set(await _query(
+            "SELECT VALUE c.id FROM c WHERE c.type = @kind AND ARRAY_CONTAINS(@ids, c.id)",
+            [{"name": "@kind", "value": self.kind}, {"name": "@ids", "value": ids}],
+            target=_primary.container,
+            **_primary.scope(self.kind)
+        ))
+
+
+def select_fields(fields: list, allowed: dict, default: list) -> str:
+    """
+    SELECT list for a ``fields=`` projection.
+
+    Args:
+        fields: Requested field names (None or empty for ``default``)
+        allowed: Field name -> SQL expression; anything else is rejected
+
+    Raises:
+        ValueError: If a requested field is not in ``allowed``
+    """
+    fields = list(dict.fromkeys(fields or default))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Valid fields: {sorted(allowed)}")
+    return ", ".join(f"{allowed[field]} AS {field}" for field in fields)
+
+
+def sort_order(sort: str, order: str, allowed: dict) -> tuple:
+    """
+    (ORDER BY expression, descending) for a whitelisted sort field.
+
+    Raises:
+        ValueError: If the sort field or direction is not valid
+    """
+    if sort not in allowed:
+        raise ValueError(f"Invalid sort: {sort}. Valid sorts: {sorted(allowed)}")
+    if order.lower() not in ("asc", "desc"):
+        raise ValueError(f"Invalid order: {order}. Use asc or desc")
+    return allowed[sort], order.lower() == "desc"
+
+
+def order_clause(sort: str, order: str, allowed: dict) -> str:
+    """
+    ORDER BY clause for a whitelisted sort field.
+
+    Raises:
+        ValueError: If the sort field or direction is not valid
+    """
+    expression, descending = sort_order(sort, order, allowed)
+    return f"ORDER BY {expression} {'DESC' if descending else 'ASC'}"
+
+
+# Cosmos transactional batches are limited to 100 operations
+BATCH_LIMIT = 100
+# Ids per multi-document metadata query (keeps the query text small)
+METADATA_READ_CHUNK = 500
+# Optimistic-concurrency retries when two writers update one hash index item
+HASH_INDEX_RETRIES = 5
+# Hash index items updated at once after a batch registration
+HASH_INDEX_CONCURRENCY = 10
+# Users (alert partitions) per alert stream catch-up query
+ALERT_POLL_CHUNK = 100
+# Audit log page sizes
+AUDIT_PAGE_SIZE = 100
+AUDIT_PAGE_SIZE_MAX = 1000
+# Items per Cosmos page when streaming an export
+AUDIT_EXPORT_PAGE_SIZE = 1000
+# Pre-aggregated statistics document served by /admin/stats
+STATS_ID = "stats:global"
+RECENT_ACTIVITY_SIZE = 10
+STATS_RETRIES = 5
+# Alerts expire through ttl, which no counter sees: the alert count is
+# recounted when stats are read and the last count is older than this
+ALERT_RECOUNT_SECONDS = 600
+# Document and user listing page sizes
+LIST_PAGE_SIZE = 50
+LIST_PAGE_SIZE_MAX = 500
+
+# Fields a document listing may project (fields=), and the default set.
+# "signature" is the full signature record; listings normally only need
+# "signed"/"signer"/"algorithm".
+DOCUMENT_FIELDS = {
+    "id": "c.id",
+    "filename": "c.filename",
+    "sha256": "c.sha256",
+    "uploaded_by": "c.uploaded_by",
+    "uploaded_at": "c.uploaded_at",
+    "content_address": "c.content_address",
+    "signed": "IS_DEFINED(c.signature)",
+    "signer": "c.signature.signer",
+    "algorithm": "c.signature.algorithm",
+    "signature": "c.signature"
+}
+DOCUMENT_DEFAULT_FIELDS = ["id", "filename", "sha256", "uploaded_by", "uploaded_at", "signed", "signer", "algorithm"]
+DOCUMENT_SORTS = {"uploaded_at": "c.uploaded_at", "filename": "c.filename"}
+
+# The same fields as served from search index items
+SEARCH_FIELDS = {
+    "id": "c.doc_id",
+    "filename": "c.filename",
+    "sha256": "c.sha256",
+    "uploaded_by": "c.uploaded_by",
+    "uploaded_at": "c.uploaded_at",
+    "signed": "IS_DEFINED(c.signature)",
+    "signer": "c.signature.signer",
+    "algorithm": "c.signature.algorithm"
+}
+SEARCH_SORTS = {"uploaded_at": "c.uploaded_at", "filename": "c.name_lower"}
+
+
+def _document_item(
+    filename: str,
+    sha256: str,
+    signature_data: dict = None,
+    uploaded_by: str = None,
+    content_address: str = None
+) -> dict:
     item = {
         "id": f"doc:{filename}",
         "type": "document",
@@ -34,136 +509,875 @@ def store_document(filename: str, sha256: str, signature_data: dict = None, uplo
     if signature_data:
         item["signature"] = signature_data
 
+    # Blob name when the content is stored content-addressed
+    if content_address:
+        item["content_address"] = content_address
+
+    return item
+
+
+def build_audit_item(filename: str, action: str, result: str) -> dict:
+    """Build an audit log item (with a unique id, so writes are idempotent)"""
+    return {
+        "id": f"audit:{uuid.uuid4()}",
+        "type": "audit",
+        "filename": filename,
+        "action": action,
+        "result": result,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+async def _write_batch(items: list) -> dict:
+    """
+    Upsert items in transactional batches, one set of batches per partition.
+    A failed batch is retried item by item so one bad item only fails itself.
+
+    Returns:
+        Mapping of item id -> error message for items that could not be written
+    """
+    target = _primary.container
+    partitions = {}
+    for item in items:
+        _primary.prepare(item)
+        partitions.setdefault(_primary.item_partition_key(item), []).append(item)
+
+    failures = {}
+
+    for partition_key, partition_items in partitions.items():
+        for start in range(0, len(partition_items), BATCH_LIMIT):
+            chunk = partition_items[start:start + BATCH_LIMIT]
+            try:
+                await target.execute_item_batch(
+                    batch_operations=[("upsert", (item,)) for item in chunk],
+                    partition_key=partition_key
+                )
+            except (exceptions.CosmosBatchOperationError, exceptions.CosmosHttpResponseError):
+                for item in chunk:
+                    try:
+                        await target.upsert_item(item)
+                    except exceptions.CosmosHttpResponseError as e:
+                        failures[item["id"]] = str(e)
+
+    return failures
+
+
+async def store_document(
+    filename: str,
+    sha256: str,
+    signature_data: dict = None,
+    uploaded_by: str = None,
+    content_address: str = None
+):
+    item = _document_item(filename, sha256, signature_data, uploaded_by, content_address)
+    previous = await get_document_metadata(filename)
+
     try:
-        container.upsert_item(item)
+        await _primary.container.upsert_item(_primary.prepare(item))
     except exceptions.CosmosHttpResponseError as e:
         raise RuntimeError(f"Failed to store document: {str(e)}")
 
+    # The document is stored at this point: index updates are best-effort
+    await _update_hash_indexes(_hash_index_changes([(previous, item)]))
+    await _upsert_search_entry(item)
+    if not previous:
+        await increment_stat("document")
 
-def get_stored_hash(filename: str) -> str | None:
-    try:
-        item = container.read_item(
-            item=f"doc:{filename}",
-            partition_key="document"
-        )
-        return item.get("sha256")
-    except exceptions.CosmosResourceNotFoundError:
-        return None
 
+def _hash_index_changes(writes: list) -> dict:
+    """
+    Hash index updates for (previous, item) document writes, grouped by hash
+    so each index item is updated once.
 
-def get_document_metadata(filename: str) -> dict | None:
-    """Get full document metadata including signature"""
-    try:
-        item = container.read_item(
-            item=f"doc:{filename}",
-            partition_key="document"
+    Returns:
+        Mapping of sha256 -> {filename: index entry, or None to remove}
+    """
+    changes = {}
+    for previous, item in writes:
+        if previous and previous["sha256"] != item["sha256"]:
+            changes.setdefault(previous["sha256"], {})[item["filename"]] = None
+        changes.setdefault(item["sha256"], {})[item["filename"]] = _hash_index_entry(item)
+    return changes
+
+
+async def _update_hash_indexes(changes: dict):
+    """
+    Apply grouped hash index changes, a bounded number of hashes at a time.
+    Failures are logged rather than raised: the documents are already stored,
+    and rebuild_document_indexes() repairs the index.
+    """
+    hashes = list(changes.items())
+    for start in range(0, len(hashes), HASH_INDEX_CONCURRENCY):
+        chunk = hashes[start:start + HASH_INDEX_CONCURRENCY]
+        results = await asyncio.gather(
+            *(_update_hash_index(sha256, documents) for sha256, documents in chunk),
+            return_exceptions=True
         )
-        return item
-    except exceptions.CosmosResourceNotFoundError:
-        return None
+        for (sha256, documents), result in zip(chunk, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    f"Failed to update hash index {sha256} for {sorted(documents)}, "
+                    f"run rebuild_document_indexes() to repair: {result}"
+                )
 
 
-def log_audit_event(filename: str, action: str, result: str):
-    item = {
-        "id": f"audit:{uuid.uuid4()}",
-        "type": "audit",
-        "filename": filename,
-        "action": action,
-        "result": result,
-        "timestamp": datetime.utcnow().isoformat()
+def _hash_index_entry(item: dict) -> dict:
+    return {
+        key: value for key, value in item.items()
+        if key not in ("id", "type", "pk") and not key.startswith("_")
+    }
+
+
+async def _update_hash_index(sha256: str, changes: dict):
+    """
+    Add or remove documents in the index item for a hash.
+    Uses ETag checks so concurrent registrations of one hash don't lose writes.
+
+    Args:
+        sha256: Content hash
+        changes: Mapping of filename -> index entry, or None to remove
+    """
+    index_id = f"hash:{sha256}"
+    target = _primary.container
+    partition_key = _primary.partition_key("hash_index", sha256)
+
+    def apply(documents: dict):
+        for filename, entry in changes.items():
+            if entry is None:
+                documents.pop(filename, None)
+            else:
+                documents[filename] = entry
+
+    for _ in range(HASH_INDEX_RETRIES):
+        index = await _read_item("hash_index", index_id, sha256, layouts=[_primary])
+
+        if index is None:
+            # Dual mode: start from the legacy copy, which the new item shadows
+            legacy = await _read_item("hash_index", index_id, sha256, layouts=_layouts[1:])
+            documents = dict(legacy.get("documents", {})) if legacy else {}
+            apply(documents)
+            if not documents and not legacy:
+                return
+            try:
+                await target.create_item(_primary.prepare({
+                    "id": index_id,
+                    "type": "hash_index",
+                    "sha256": sha256,
+                    "documents": documents
+                }))
+                return
+            except exceptions.CosmosResourceExistsError:
+                continue
+
+        documents = index.setdefault("documents", {})
+        apply(documents)
+
+        try:
+            if documents or len(_layouts) > 1:
+                await target.replace_item(
+                    item=index_id,
+                    body=index,
+                    etag=index["_etag"],
+                    match_condition=MatchConditions.IfNotModified
+                )
+            else:
+                await target.delete_item(
+                    item=index_id,
+                    partition_key=partition_key,
+                    etag=index["_etag"],
+                    match_condition=MatchConditions.IfNotModified
+                )
+            return
+        except exceptions.CosmosAccessConditionFailedError:
+            continue
+
+    raise RuntimeError(f"Failed to update hash index for {sha256}: too many concurrent writers")
+
+
+async def find_documents_by_hash(sha256: str) -> list:
+    """
+    Get every registered document with the given content hash
+    (single point read of the hash index item).
+    """
+    index = await _read_item("hash_index", f"hash:{sha256}", sha256)
+    if index is None:
+        return []
+    return list(index.get("documents", {}).values())
+
+
+async def rebuild_document_indexes():
+    """
+    Index documents registered before the hash and search indexes existed.
+    One-off backfill: ``python -c "import asyncio, cosmos_service; asyncio.run(cosmos_service.rebuild_document_indexes())"``
+    """
+    for layout in _layouts:
+        async for item in _iter_query(layout, "document", "SELECT * FROM c WHERE c.type = 'document'"):
+            await _update_hash_index(item["sha256"], {item["filename"]: _hash_index_entry(item)})
+            await _upsert_search_entry(item)
+
+
+def _search_entry(item: dict) -> dict:
+    """Compact search-index item for a document (no signature payload)"""
+    entry = {
+        "id": f"search:{item['filename']}",
+        "type": "search",
+        "doc_id": item["id"],
+        "filename": item["filename"],
+        "name_lower": item["filename"].lower(),
+        "grams": filename_grams(item["filename"]),
+        "sha256": item["sha256"],
+        "uploaded_by": item.get("uploaded_by"),
+        "uploaded_at": item.get("uploaded_at")
     }
+    signature_data = item.get("signature")
+    if signature_data:
+        entry["signature"] = {
+            "signer": signature_data.get("signer"),
+            "algorithm": signature_data.get("algorithm")
+        }
+    return entry
+
 
+async def _upsert_search_entry(item: dict):
     try:
-        container.create_item(item)
+        await _primary.container.upsert_item(_primary.prepare(_search_entry(item)))
     except exceptions.CosmosHttpResponseError as e:
-        raise RuntimeError(f"Failed to log audit event: {str(e)}")
+        logger.warning(f"Failed to index {item['filename']} for search: {e}")
 
 
-def get_audit_logs():
-    query = "SELECT * FROM c WHERE c.type = 'audit' ORDER BY c.timestamp DESC"
-    return list(container.query_items(
-        query=query,
-        enable_cross_partition_query=True
+async def store_documents_batch(documents: list) -> dict:
+    """
+    Store many documents with batched writes.
+
+    Args:
+        documents: Dicts with the store_document arguments
+            (filename, sha256, signature_data, uploaded_by, content_address)
+
+    Returns:
+        Mapping of filename -> error message for documents that failed
+    """
+    items = [_document_item(**doc) for doc in documents]
+    previous = await get_documents_metadata([item["filename"] for item in items])
+    failures = await _write_batch(items)
+
+    stored = [item for item in items if item["id"] not in failures]
+    await _update_hash_indexes(_hash_index_changes(
+        [(previous.get(item["filename"]), item) for item in stored]
     ))
+    await increment_stat("document", sum(1 for item in stored if item["filename"] not in previous))
+
+    search_failures = await _write_batch([_search_entry(item) for item in stored])
+    if search_failures:
+        logger.warning(f"Failed to index {len(search_failures)} documents for search")
+
+    return {item["filename"]: failures[item["id"]] for item in items if item["id"] in failures}
+
 
+async def get_stored_hash(filename: str) -> str | None:
+    item = await get_document_metadata(filename)
+    return item.get("sha256") if item else None
+
+
+async def get_document_metadata(filename: str) -> dict | None:
+    """Get full document metadata including signature"""
+    return await _read_item("document", f"doc:{filename}", filename)
+
+
+async def get_documents_metadata(filenames: list) -> dict:
+    """
+    Get metadata for many documents with one query per chunk of ids
+    (in the legacy layout single-partition, so effectively a multi-item read).
+
+    Returns:
+        Mapping of filename -> document item, for registered documents only
+    """
+    ids = list({f"doc:{filename}" for filename in filenames})
+    found = {}
+
+    for start in range(0, len(ids), METADATA_READ_CHUNK):
+        items = await _query_all(
+            "document",
+            "SELECT * FROM c WHERE c.type = 'document' AND ARRAY_CONTAINS(@ids, c.id)",
+            [{"name": "@ids", "value": ids[start:start + METADATA_READ_CHUNK]}]
+        )
+        for item in items:
+            found[item["filename"]] = item
+
+    return found
+
+
+async def log_audit_event(filename: str, action: str, result: str):
+    item = build_audit_item(filename, action, result)
 
-def get_system_stats():
-    """Get system statistics for admin dashboard"""
     try:
-        # Count documents
-        doc_query = "SELECT VALUE COUNT(1) FROM c WHERE c.type = 'document'"
-        total_documents = list(container.query_items(
-            query=doc_query,
-            enable_cross_partition_query=True
-        ))[0]
-        
-        # Count users
-        user_query = "SELECT VALUE COUNT(1) FROM c WHERE c.type = 'user'"
-        total_users = list(container.query_items(
-            query=user_query,
-            enable_cross_partition_query=True
-        ))[0]
-        
-        # Count alerts
-        alert_query = "SELECT VALUE COUNT(1) FROM c WHERE c.type = 'alert'"
-        total_alerts = list(container.query_items(
-            query=alert_query,
-            enable_cross_partition_query=True
-        ))[0]
-        
-        # Count audits
-        audit_query = "SELECT VALUE COUNT(1) FROM c WHERE c.type = 'audit'"
-        total_audits = list(container.query_items(
-            query=audit_query,
-            enable_cross_partition_query=True
+        await _primary.container.create_item(_primary.prepare(item))
+    except exceptions.CosmosHttpResponseError as e:
+        raise RuntimeError(f"Failed to log audit event: {str(e)}")
+
+    await _record_audit_stats([item])
+
+
+async def log_audit_events_batch(events: list):
+    """
+    Log many audit events with batched writes.
+
+    Args:
+        events: (filename, action, result) tuples
+    """
+    failures = await write_audit_items([build_audit_item(*event) for event in events])
+    if failures:
+        raise RuntimeError(f"Failed to log {len(failures)} audit events")
+
+
+async def write_audit_items(items: list) -> dict:
+    """
+    Upsert prebuilt audit items with batched writes.
+    Returns id -> error for items not written (each already retried on its own).
+    """
+    failures = await _write_batch(items)
+
+    written = [item for item in items if item["id"] not in failures]
+    if written:
+        await _record_audit_stats(written)
+
+    return failures
+
+
+async def iter_audit_logs(
+    start: datetime = None,
+    end: datetime = None,
+    action: str = None,
+    result: str = None,
+    filename: str = None,
+    search: str = None
+):
+    """
+    Stream matching audit logs, oldest first, one Cosmos page at a time.
+    Only the current page is held in memory, whatever the total size.
+    """
+    where, parameters = _audit_filter(start, end, action, result, filename, search)
+    query = f"SELECT * FROM c WHERE {where} ORDER BY c.timestamp ASC"
+
+    streams = [
+        _iter_query(layout, "audit", query, parameters, AUDIT_EXPORT_PAGE_SIZE)
+        for layout in _layouts
+    ]
+    async for item in _merge_sorted(streams, key=lambda item: item["timestamp"]):
+        yield item
+
+
+def _audit_filter(
+    start: datetime = None,
+    end: datetime = None,
+    action: str = None,
+    result: str = None,
+    filename: str = None,
+    search: str = None
+):
+    """WHERE clause and parameters for audit queries"""
+    conditions = ["c.type = 'audit'"]
+    parameters = []
+
+    # Timestamps are stored as ISO strings, so string comparison orders them
+    if start:
+        conditions.append("c.timestamp >= @start")
+        parameters.append({"name": "@start", "value": start.isoformat()})
+    if end:
+        conditions.append("c.timestamp < @end")
+        parameters.append({"name": "@end", "value": end.isoformat()})
+    if action:
+        conditions.append("c.action = @action")
+        parameters.append({"name": "@action", "value": action})
+    if result:
+        conditions.append("c.result = @result")
+        parameters.append({"name": "@result", "value": result})
+    if filename:
+        conditions.append("c.filename = @filename")
+        parameters.append({"name": "@filename", "value": filename})
+    if search:
+        # Case-insensitive substring of the filename
+        conditions.append("CONTAINS(c.filename, @search, true)")
+        parameters.append({"name": "@search", "value": search})
+
+    return " AND ".join(conditions), parameters
+
+
+async def get_audit_logs(
+    page_size: int = AUDIT_PAGE_SIZE,
+    continuation_token: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    action: str = None,
+    result: str = None,
+    filename: str = None,
+    search: str = None
+) -> dict:
+    """
+    Get one page of audit logs, newest first.
+
+    Filters and the page size are part of the Cosmos query, so only the
+    requested page is read. In dual mode the new layout's logs are paged
+    first, then the legacy container's.
+
+    Returns:
+        {"items": [...], "continuation_token": str or None when no more pages}
+    """
+    page_size = max(1, min(page_size, AUDIT_PAGE_SIZE_MAX))
+    where, parameters = _audit_filter(start, end, action, result, filename, search)
+
+    return await _query_page_all(
+        "audit",
+        f"SELECT * FROM c WHERE {where}",
+        parameters,
+        page_size=page_size,
+        continuation_token=continuation_token,
+        order_by="c.timestamp",
+        descending=True
+    )
+
+
+async def write_alert_items(items: list) -> dict:
+    """
+    Upsert alert (or alert payload) items with batched writes (one
+    partition per recipient in the partitioned layout). Returns
+    id -> error for items not written.
+    """
+    # Not counted here: expiry (ttl) would never be counted down. The alert
+    # count in the stats is a periodic recount instead (see get_system_stats)
+    return await _write_batch(items)
+
+
+async def get_alert_items(username: str, limit: int) -> list:
+    """A user's newest alert items, newest first (single-partition query)"""
+    found = {}
+    for layout in reversed(_layouts):
+        for item in await _query(
+            "SELECT TOP @limit * FROM c WHERE c.type = 'alert' AND c.username = @username ORDER BY c.id DESC",
+            [{"name": "@limit", "value": limit}, {"name": "@username", "value": username}],
+            target=layout.container,
+            partition_key=layout.partition_key("alert", username)
+        ):
+            found[item["id"]] = item
+    return sorted(found.values(), key=lambda item: item["id"], reverse=True)[:limit]
+
+
+async def count_unread_alert_items(username: str) -> int:
+    """A user's unread alerts (single-partition count)"""
+    total = 0
+    for layout in _layouts:
+        total += (await _query(
+            "SELECT VALUE COUNT(1) FROM c WHERE c.type = 'alert' AND c.username = @username AND c.read = false",
+            [{"name": "@username", "value": username}],
+            target=layout.container,
+            partition_key=layout.partition_key("alert", username)
         ))[0]
-        
-        # Get recent activity (last 10 audit logs)
-        recent_query = "SELECT TOP 10 c.filename, c.action, c.result, c.timestamp FROM c WHERE c.type = 'audit' ORDER BY c.timestamp DESC"
-        recent_activity = list(container.query_items(
-            query=recent_query,
-            enable_cross_partition_query=True
+    return total
+
+
+async def get_alert_payload_items(payload_ids: list) -> dict:
+    """Shared broadcast payload items by id (written to the primary layout only)"""
+    found = {}
+    for start in range(0, len(payload_ids), METADATA_READ_CHUNK):
+        for item in await _query(
+            "SELECT * FROM c WHERE c.type = 'alert_payload' AND ARRAY_CONTAINS(@ids, c.id)",
+            [{"name": "@ids", "value": payload_ids[start:start + METADATA_READ_CHUNK]}],
+            target=_primary.container
+        ):
+            found[item["id"]] = item
+    return found
+
+
+async def get_alert_ids(username: str, unread_only: bool = False) -> list:
+    query = "SELECT VALUE c.id FROM c WHERE c.type = 'alert' AND c.username = @username"
+    if unread_only:
+        query += " AND c.read = false"
+
+    ids = set()
+    for layout in _layouts:
+        ids.update(await _query(
+            query,
+            [{"name": "@username", "value": username}],
+            target=layout.container,
+            partition_key=layout.partition_key("alert", username)
+        ))
+    return sorted(ids)
+
+
+async def get_alert_items_since(written_at: float, usernames: list) -> list:
+    """
+    Alert items of the given users written at or after a Unix timestamp.
+    Matches on written_at rather than _ts, which Cosmos bumps on every
+    change (marking an alert read would otherwise deliver it again), and
+    only searches the users' partitions. Alerts are only written to the
+    partitioned layout, so the legacy container is never read.
+    """
+    items = []
+    for start in range(0, len(usernames), ALERT_POLL_CHUNK):
+        partition_keys = [
+            _primary.partition_key("alert", username)
+            for username in usernames[start:start + ALERT_POLL_CHUNK]
+        ]
+        items.extend(await _query(
+            "SELECT * FROM c WHERE ARRAY_CONTAINS(@pks, c.pk) "
+            "AND c.type = 'alert' AND c.written_at >= @since",
+            [
+                {"name": "@pks", "value": partition_keys},
+                {"name": "@since", "value": written_at}
+            ],
+            target=_primary.container
         ))
-        
+    return items
+
+
+async def _apply_alert_operation(username: str, alert_id: str, patch_operations: list = None) -> bool:
+    """Patch (or, without operations, delete) one alert in whichever layout holds it"""
+    for layout in _layouts:
+        partition_key = layout.partition_key("alert", username)
+        try:
+            if patch_operations is None:
+                await layout.container.delete_item(item=alert_id, partition_key=partition_key)
+            else:
+                await layout.container.patch_item(
+                    item=alert_id,
+                    partition_key=partition_key,
+                    patch_operations=patch_operations
+                )
+            return True
+        except exceptions.CosmosResourceNotFoundError:
+            continue
+    return False
+
+
+async def _apply_alert_operations(username: str, alert_ids: list, patch_operations: list = None) -> int:
+    """
+    Patch or delete a user's alerts in transactional batches. A failed batch
+    (an alert that expired meanwhile, or one still in the legacy container)
+    is retried item by item. Returns the number of alerts affected.
+    """
+    partition_key = _primary.partition_key("alert", username)
+    applied = 0
+
+    for start in range(0, len(alert_ids), BATCH_LIMIT):
+        chunk = alert_ids[start:start + BATCH_LIMIT]
+        if patch_operations is None:
+            operations = [("delete", (alert_id,)) for alert_id in chunk]
+        else:
+            operations = [("patch", (alert_id, patch_operations)) for alert_id in chunk]
+        try:
+            await _primary.container.execute_item_batch(
+                batch_operations=operations,
+                partition_key=partition_key
+            )
+            applied += len(chunk)
+        except (exceptions.CosmosBatchOperationError, exceptions.CosmosHttpResponseError):
+            for alert_id in chunk:
+                if await _apply_alert_operation(username, alert_id, patch_operations):
+                    applied += 1
+
+    return applied
+
+
+async def mark_alert_items_read(username: str, alert_ids: list) -> int:
+    return await _apply_alert_operations(
+        username, alert_ids, [{"op": "set", "path": "/read", "value": True}]
+    )
+
+
+async def delete_alert_items(username: str, alert_ids: list) -> int:
+    deleted = await _apply_alert_operations(username, alert_ids)
+    return deleted
+
+
+async def _count(query: str, target=None) -> int:
+    target = target or container
+    return [item async for item in target.query_items(query=query)][0]
+
+
+async def _count_all(kind: str) -> int:
+    total = 0
+    for layout in _layouts:
+        total += await _count(f"SELECT VALUE COUNT(1) FROM c WHERE c.type = '{kind}'", layout.container)
+    return total
+
+
+async def rebuild_system_stats() -> dict:
+    """
+    Recount everything from scratch and rewrite the stats document.
+    Use to initialise the counters or to reconcile drift.
+    """
+    try:
+        users_container = database.get_container_client("users")
+
+        stats = {
+            "id": STATS_ID,
+            "type": "stats",
+            "counts": {
+                "document": await _count_all("document"),
+                "user": await _count("SELECT VALUE COUNT(1) FROM c", users_container),
+                "alert": await _count_all("alert"),
+                "audit": await _count_all("audit")
+            },
+            "recent_activity": sorted(
+                await _query_all(
+                    "audit",
+                    f"SELECT TOP {RECENT_ACTIVITY_SIZE} c.id, c.filename, c.action, c.result, c.timestamp "
+                    "FROM c WHERE c.type = 'audit' ORDER BY c.timestamp DESC"
+                ),
+                key=lambda entry: entry["timestamp"],
+                reverse=True
+            )[:RECENT_ACTIVITY_SIZE],
+            "rebuilt_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat(),
+            "alerts_counted_at": datetime.utcnow().isoformat()
+        }
+        for entry in stats["recent_activity"]:
+            entry.pop("id")
+        await _primary.container.upsert_item(_primary.prepare(stats))
+        return stats
+    except Exception as e:
+        raise RuntimeError(f"Failed to rebuild system stats: {str(e)}")
+
+
+async def _recount_alerts_if_due(stats: dict):
+    """Refresh the live alert count in the stats document every ALERT_RECOUNT_SECONDS"""
+    counted_at = stats.get("alerts_counted_at")
+    if counted_at and datetime.utcnow() - datetime.fromisoformat(counted_at) < timedelta(seconds=ALERT_RECOUNT_SECONDS):
+        return
+
+    try:
+        count = await _count_all("alert")
+        now = datetime.utcnow().isoformat()
+        await _primary.container.patch_item(
+            item=STATS_ID,
+            partition_key=_primary.partition_key("stats"),
+            patch_operations=[
+                {"op": "set", "path": "/counts/alert", "value": count},
+                {"op": "set", "path": "/alerts_counted_at", "value": now}
+            ]
+        )
+        stats.setdefault("counts", {})["alert"] = count
+        stats["alerts_counted_at"] = now
+    except Exception as e:
+        logger.warning(f"Failed to recount alerts: {e}")
+
+
+async def increment_stat(counter: str, amount: int = 1):
+    """
+    Atomically add to one of the pre-aggregated counts (document, user,
+    audit). Failures are logged, never raised: stats must not break
+    the write they describe, and a rebuild corrects any drift.
+    """
+    if not amount:
+        return
+
+    try:
+        await _primary.container.patch_item(
+            item=STATS_ID,
+            partition_key=_primary.partition_key("stats"),
+            patch_operations=[
+                {"op": "incr", "path": f"/counts/{counter}", "value": amount},
+                {"op": "set", "path": "/updated_at", "value": datetime.utcnow().isoformat()}
+            ]
+        )
+    except exceptions.CosmosResourceNotFoundError:
+        # First write ever (or stats doc deleted): build it, which counts this item too
+        try:
+            await rebuild_system_stats()
+        except RuntimeError as e:
+            logger.warning(str(e))
+    except exceptions.CosmosHttpResponseError as e:
+        logger.warning(f"Failed to update {counter} stat: {e}")
+
+
+async def _record_audit_stats(items: list):
+    """Count new audit items and push them onto the recent-activity ring"""
+    recent = [
+        {key: item.get(key) for key in ("filename", "action", "result", "timestamp")}
+        for item in items
+    ]
+
+    for _ in range(STATS_RETRIES):
+        try:
+            stats = await _primary.container.read_item(
+                item=STATS_ID,
+                partition_key=_primary.partition_key("stats")
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            try:
+                await rebuild_system_stats()
+            except RuntimeError as e:
+                logger.warning(str(e))
+            return
+
+        stats["counts"]["audit"] = stats["counts"].get("audit", 0) + len(items)
+        stats["recent_activity"] = sorted(
+            recent + stats.get("recent_activity", []),
+            key=lambda entry: entry.get("timestamp") or "",
+            reverse=True
+        )[:RECENT_ACTIVITY_SIZE]
+        stats["updated_at"] = datetime.utcnow().isoformat()
+
+        try:
+            await _primary.container.replace_item(
+                item=STATS_ID,
+                body=stats,
+                etag=stats["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return
+        except exceptions.CosmosAccessConditionFailedError:
+            continue
+        except exceptions.CosmosHttpResponseError as e:
+            logger.warning(f"Failed to update audit stats: {e}")
+            return
+
+    logger.warning("Failed to update audit stats: too many concurrent writers")
+
+
+async def get_system_stats():
+    """Get system statistics for admin dashboard (single point read)"""
+    try:
+        stats = await _read_item("stats", STATS_ID, layouts=[_primary])
+        if stats is None:
+            stats = await rebuild_system_stats()
+        else:
+            await _recount_alerts_if_due(stats)
+
+        counts = stats.get("counts", {})
         return {
-            "total_documents": total_documents,
-            "total_users": total_users,
-            "total_alerts": total_alerts,
-            "total_audits": total_audits,
-            "recent_activity": recent_activity
+            "total_documents": counts.get("document", 0),
+            "total_users": counts.get("user", 0),
+            "total_alerts": counts.get("alert", 0),
+            "total_audits": counts.get("audit", 0),
+            "recent_activity": stats.get("recent_activity", []),
+            "stats_updated_at": stats.get("updated_at"),
+            "stats_rebuilt_at": stats.get("rebuilt_at")
         }
     except Exception as e:
         raise RuntimeError(f"Failed to get system stats: {str(e)}")
 
 
-def search_documents_by_name(query: str):
-    """Search documents by filename"""
+async def search_documents_by_name(
+    query: str,
+    page_size: int = LIST_PAGE_SIZE,
+    continuation_token: str = None,
+    sort: str = "relevance",
+    order: str = "desc",
+    fields: list = None
+) -> dict:
+    """
+    Search documents by filename (case-insensitive substring).
+
+    Candidates come from the n-gram search index with indexed ARRAY_CONTAINS
+    lookups, so cost tracks the number of matches rather than the corpus.
+
+    With sort="relevance" matches are ranked exact name > name prefix >
+    word prefix > substring, then newest first. Each tier is its own Cosmos
+    query, paged in turn, so every match is reachable; the continuation
+    token is the tier index and that query's token. Other sorts (see
+    SEARCH_SORTS) page through every match in one query.
+
+    Returns:
+        {"items": [...], "continuation_token": str or None when no more pages}
+    """
+    page_size = max(1, min(page_size, LIST_PAGE_SIZE_MAX))
+    needle = query.strip().lower()
+
+    conditions = ["c.type = 'search'"]
+    parameters = []
+    if needle:
+        for i, gram in enumerate(query_grams(needle)):
+            conditions.append(f"ARRAY_CONTAINS(c.grams, @g{i})")
+            parameters.append({"name": f"@g{i}", "value": gram})
+        conditions.append("CONTAINS(c.name_lower, @q)")
+        parameters.append({"name": "@q", "value": needle})
+    where = " AND ".join(conditions)
+    projection = select_fields(fields, SEARCH_FIELDS, DOCUMENT_DEFAULT_FIELDS)
+
     try:
-        sql = f"SELECT * FROM c WHERE c.type = 'document' AND CONTAINS(c.filename, @query) ORDER BY c.uploaded_at DESC"
-        return list(container.query_items(
-            query=sql,
-            parameters=[{"name": "@query", "value": query}],
-            enable_cross_partition_query=True
-        ))
+        if sort != "relevance":
+            order_by, descending = sort_order(sort, order, SEARCH_SORTS)
+            return await _query_page_all(
+                "search",
+                f"SELECT {projection} FROM c WHERE {where}",
+                parameters,
+                page_size=page_size,
+                continuation_token=continuation_token,
+                order_by=order_by,
+                descending=descending
+            )
+
+        tiers, tier_parameters = relevance_tiers("c.name_lower", needle) if needle else (["true"], [])
+        tier, token = 0, None
+        if continuation_token:
+            prefix, _, rest = continuation_token.partition(":")
+            if not prefix.isdigit() or int(prefix) >= len(tiers):
+                raise ValueError("Invalid continuation token")
+            tier, token = int(prefix), rest or None
+
+        # Fill the page from successive tiers
+        items = []
+        while tier < len(tiers) and len(items) < page_size:
+            page = await _query_page_all(
+                "search",
+                f"SELECT {projection} FROM c WHERE {where} AND {tiers[tier]}",
+                parameters + tier_parameters,
+                page_size=page_size - len(items),
+                continuation_token=token,
+                order_by="c.uploaded_at",
+                descending=True
+            )
+            items.extend(page["items"])
+            token = page["continuation_token"]
+            if not token:
+                tier += 1
+
+        return {
+            "items": items,
+            "continuation_token": f"{tier}:{token or ''}" if tier < len(tiers) else None
+        }
+    except ValueError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed to search documents: {str(e)}")
 
 
-def get_all_documents(uploaded_by: str = None):
-    """Get all documents, optionally filtered by uploader"""
+async def get_all_documents(
+    uploaded_by: str = None,
+    page_size: int = LIST_PAGE_SIZE,
+    continuation_token: str = None,
+    sort: str = "uploaded_at",
+    order: str = "desc",
+    fields: list = None
+) -> dict:
+    """
+    Get one page of documents, optionally filtered by uploader.
+
+    Only the projected ``fields`` (DOCUMENT_FIELDS, default
+    DOCUMENT_DEFAULT_FIELDS) are read.
+
+    Returns:
+        {"items": [...], "continuation_token": str or None when no more pages}
+    """
+    page_size = max(1, min(page_size, LIST_PAGE_SIZE_MAX))
+    projection = select_fields(fields, DOCUMENT_FIELDS, DOCUMENT_DEFAULT_FIELDS)
+    order_by, descending = sort_order(sort, order, DOCUMENT_SORTS)
+
+    where = "c.type = 'document'"
+    parameters = []
+    if uploaded_by:
+        where += " AND c.uploaded_by = @uploader"
+        parameters.append({"name": "@uploader", "value": uploaded_by})
+
     try:
-        if uploaded_by:
-            sql = "SELECT * FROM c WHERE c.type = 'document' AND c.uploaded_by = @uploader ORDER BY c.uploaded_at DESC"
-            return list(container.query_items(
-                query=sql,
-                parameters=[{"name": "@uploader", "value": uploaded_by}],
-                enable_cross_partition_query=True
-            ))
-        else:
-            sql = "SELECT * FROM c WHERE c.type = 'document' ORDER BY c.uploaded_at DESC"
-            return list(container.query_items(
-                query=sql,
-                enable_cross_partition_query=True
-            ))
+        return await _query_page_all(
+            "document",
+            f"SELECT {projection} FROM c WHERE {where}",
+            parameters,
+            page_size=page_size,
+            continuation_token=continuation_token,
+            order_by=order_by,
+            descending=descending
+        )
     except Exception as e:
         raise RuntimeError(f"Failed to get documents: {str(e)}")
@@ -1,31 +1,176 @@
-from fastapi import Depends, HTTPException, status
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Cookie, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
-from auth import SECRET_KEY, ALGORITHM
+from auth import SECRET_KEY, ALGORITHM, ALERT_STREAM_COOKIE, ALERT_STREAM_SCOPE
+from rbac import PERMISSION_BITS, role_mask
+from user_service import get_user_by_username
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+# Verified tokens, keyed by SHA-256 of the token. An entry is used until the
+# token's exp, but for at most PRINCIPAL_CACHE_MAX_AGE_SECONDS so role changes
+# made on another worker are picked up.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_MAX_AGE_SECONDS = int(os.getenv("PRINCIPAL_CACHE_MAX_AGE_SECONDS", "300"))
 
+_principals: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+_digests_by_username: Dict[str, Set[bytes]] = {}
+_principal_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+_principal_lock = threading.Lock()
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _get_cached_principal(digest: bytes) -> Optional[dict]:
+    with _principal_lock:
+        entry = _principals.get(digest)
+        if entry is None or entry[1] < time.time():
+            _principal_stats["misses"] += 1
+            return None
+        _principals.move_to_end(digest)
+        _principal_stats["hits"] += 1
+        return entry[0]
+
+
+def _cache_principal(digest: bytes, principal: dict, expires_at: float):
+    with _principal_lock:
+        _principals[digest] = (principal, expires_at)
+        _principals.move_to_end(digest)
+        _digests_by_username.setdefault(principal["username"], set()).add(digest)
+
+        while len(_principals) > PRINCIPAL_CACHE_SIZE:
+            old_digest, (old_principal, _) = _principals.popitem(last=False)
+            _forget_digest(old_principal["username"], old_digest)
+            _principal_stats["evictions"] += 1
+
+
+def _forget_digest(username: str, digest: bytes):
+    digests = _digests_by_username.get(username)
+    if digests is not None:
+        digests.discard(digest)
+        if not digests:
+            del _digests_by_username[username]
+
+
+def invalidate_principals(username: str) -> int:
+    """
+    Drop cached principals for a user (called after a role change or
+    deactivation). Returns the number of entries removed.
+    """
+    with _principal_lock:
+        digests = _digests_by_username.pop(username, set())
+        for digest in digests:
+            _principals.pop(digest, None)
+        _principal_stats["invalidations"] += len(digests)
+        return len(digests)
+
+
+def get_principal_cache_stats() -> dict:
+    """Hit/miss counters and size of the principal cache"""
+    with _principal_lock:
+        return {**_principal_stats, "size": len(_principals)}
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Authenticated principal for the request: username, current role and its
+    permission bitmask. A cached token costs one hash and one dict lookup;
+    otherwise the JWT is verified and the role read from the user record, so
+    role changes and deactivation take effect without a new login.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    principal = _get_cached_principal(digest)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
+    except JWTError:
+        raise _credentials_exception()
+
+    username: str = payload.get("sub")
+    if username is None or payload.get("role") is None:
+        raise _credentials_exception()
 
-        if username is None or role is None:
-            raise credentials_exception
+    user = await get_user_by_username(username)
+    if not user or not user.get("is_active", True):
+        raise _credentials_exception()
 
-        return {
-            "username": username,
-            "role": role
-        }
+    principal = {
+        "username": username,
+        "role": user["role"],
+        "permissions_mask": role_mask(user["role"])
+    }
+    expires_at = time.time() + PRINCIPAL_CACHE_MAX_AGE_SECONDS
+    if payload.get("exp") is not None:
+        expires_at = min(expires_at, float(payload["exp"]))
+    _cache_principal(digest, principal, expires_at)
+    return principal
 
+
+async def get_stream_user(
+    stream_token: Optional[str] = Cookie(None, alias=ALERT_STREAM_COOKIE),
+    header_token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> dict:
+    """
+    get_current_user for the alert stream. Browsers' EventSource cannot set
+    headers, so it sends the stream session cookie set by
+    POST /alerts/stream-session instead. Tokens are never accepted in the URL.
+    """
+    if header_token:
+        return await get_current_user(header_token)
+    if not stream_token:
+        raise _credentials_exception()
+
+    try:
+        payload = jwt.decode(stream_token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+
+    username = payload.get("sub")
+    if username is None or payload.get("scope") != ALERT_STREAM_SCOPE:
+        raise _credentials_exception()
+
+    user = await get_user_by_username(username)
+    if not user or not user.get("is_active", True):
+        raise _credentials_exception()
+
+    return {
+        "username": username,
+        "role": user["role"],
+        "permissions_mask": role_mask(user["role"])
+    }
+
+
+def requires_permission(permission: str, detail: str = None):
+    """
+    Dependency factory: the current principal, or 403 (with ``detail``) unless
+    it has ``permission``. Usage: ``current_user=Depends(requires_permission(PERM_X))``
+    """
+    bit = PERMISSION_BITS[permission]
+    detail = detail or f"Permission denied: {permission} required"
+
+    async def dependency(current_user: dict = Depends(get_current_user)) -> dict:
+        if not current_user["permissions_mask"] & bit:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail
+            )
+        return current_user
+
+    return dependency
@@ -1,24 +1,48 @@
 import hashlib
 import os
 
+# Read size used when hashing uploads; large enough to keep per-chunk
+# overhead low on multi-hundred-MB documents.
+CHUNK_SIZE = 1024 * 1024
 
-def generate_sha256(file_path: str) -> str:
+
+class HashingReader:
     """
-    Generate SHA-256 hash for a given file.
+    File-like wrapper that updates a SHA-256 digest as data is read through it.
 
-    :param file_path: Path to the file
-    :return: SHA-256 hash as hex string
+    Lets a single pass over an upload both feed another consumer (e.g. the
+    blob uploader) and produce the document hash.
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
 
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._hash = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        if data:
+            self._hash.update(data)
+            self.bytes_read += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def generate_sha256_stream(fileobj, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Generate SHA-256 hash for an open binary file object.
+
+    :param fileobj: Readable binary file object (e.g. an upload's spooled file)
+    :param chunk_size: Number of bytes to read per chunk
+    :return: SHA-256 hash as hex string
+    """
     sha256_hash = hashlib.sha256()
 
     try:
-        with open(file_path, "rb") as file:
-            # Read file in chunks to handle large files
-            for chunk in iter(lambda: file.read(4096), b""):
-                sha256_hash.update(chunk)
+        for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+            sha256_hash.update(chunk)
 
         return sha256_hash.hexdigest()
 
@@ -26,6 +50,21 @@ def generate_sha256(file_path: str) -> str:
         raise RuntimeError(f"Error while hashing file: {str(e)}")
 
 
+def generate_sha256(file_path: str) -> str:
+    """
+    Generate SHA-256 hash for a given file.
+
+    :param file_path: Path to the file
+    :return: SHA-256 hash as hex string
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    with open(file_path, "rb") as file:
+        # Read file in chunks to handle large files
+        return generate_sha256_stream(file)
+
+
 if __name__ == "__main__":
     # Simple manual test
     test_file = "test_document.txt"
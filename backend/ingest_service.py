@@ -0,0 +1,56 @@
+"""
+Document ingest: hash an upload and store it in Blob Storage
+Shared by /register and /register/batch
+"""
+from typing import IO
+
+from blob_service import CONTENT_ADDRESSED, blob_exists, content_address, upload_stream_to_blob
+from hash_service import HashingReader, generate_sha256_stream
+
+
+def ingest_document(fileobj: IO[bytes], filename: str) -> dict:
+    """
+    Hash a document and upload it to Blob Storage.
+
+    By default the blob is named after the file and the hash is computed on
+    the same pass that streams it to storage. In content-addressed mode the
+    (seekable) upload is hashed first so the blob can be named after its
+    SHA-256, and the upload is skipped when that blob already exists.
+
+    Returns:
+        Dictionary with sha256, blob_name, content_address (or None),
+        deduplicated flag and upload stats (or None when skipped)
+    """
+    if CONTENT_ADDRESSED and fileobj.seekable():
+        sha256 = generate_sha256_stream(fileobj)
+        blob_name = content_address(sha256)
+
+        if blob_exists(blob_name):
+            return {
+                "sha256": sha256,
+                "blob_name": blob_name,
+                "content_address": blob_name,
+                "deduplicated": True,
+                "upload_stats": None
+            }
+
+        fileobj.seek(0)
+        stats = upload_stream_to_blob(fileobj, blob_name=blob_name)
+        return {
+            "sha256": sha256,
+            "blob_name": blob_name,
+            "content_address": blob_name,
+            "deduplicated": False,
+            "upload_stats": stats
+        }
+
+    # Single pass: hash each chunk on its way to Blob Storage
+    reader = HashingReader(fileobj)
+    stats = upload_stream_to_blob(reader, blob_name=filename)
+    return {
+        "sha256": reader.hexdigest(),
+        "blob_name": filename,
+        "content_address": None,
+        "deduplicated": False,
+        "upload_stats": stats
+    }
@@ -1,22 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse, JSONResponse
+from typing import List, Optional
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
 import os
-import shutil
 from dotenv import load_dotenv
-from blob_service import upload_file_to_blob
+from blob_service import get_upload_stats
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from user_service import (
     get_user_by_username, create_user, get_all_users, update_user_role, 
-    deactivate_user, update_last_login, change_user_password,
-    initiate_password_reset, complete_password_reset
+    deactivate_user, change_user_password,
+    initiate_password_reset, complete_password_reset, get_user_cache_stats,
+    update_password_hash, get_role_index_stats
+)
+from auth import (
+    create_access_token, create_stream_token, ALERT_STREAM_COOKIE,
+    ALERT_STREAM_SESSION_SECONDS, ALERT_STREAM_COOKIE_SECURE
+)
+from password_service import (
+    verify_password, PasswordHashBusy, PASSWORD_HASH_RETRY_AFTER_SECONDS,
+    shutdown_password_pool, get_password_hash_stats
+)
+from dependencies import (
+    get_current_user, get_stream_user, requires_permission, invalidate_principals,
+    get_principal_cache_stats
 )
-from auth import verify_password, create_access_token
-from dependencies import get_current_user
 from rbac import (
     UserRole, has_permission, get_role_permissions, get_role_description,
-    PERM_REGISTER_DOCUMENTS, PERM_VIEW_AUDIT_LOGS, PERM_CREATE_USERS,
+    PERM_REGISTER_DOCUMENTS, PERM_VIEW_AUDIT_LOGS, PERM_EXPORT_AUDIT_LOGS, PERM_CREATE_USERS,
     PERM_VIEW_ALL_DOCUMENTS, check_document_ownership
 )
 from opencensus.ext.azure.log_exporter import AzureLogHandler
@@ -26,13 +44,31 @@ import os
 
 load_dotenv()
 
-from hash_service import generate_sha256
-from cosmos_service import store_document, get_stored_hash, log_audit_event, get_audit_logs, get_document_metadata
-from signature_service import sign_document, verify_signature, get_signature_info
+from hash_service import generate_sha256_stream
+from ingest_service import ingest_document
+from cosmos_service import (
+    store_document, get_stored_hash, get_audit_logs, get_document_metadata,
+    get_documents_metadata, store_documents_batch, find_documents_by_hash,
+    iter_audit_logs, close_client, AUDIT_PAGE_SIZE, LIST_PAGE_SIZE
+)
+from audit_writer import (
+    log_audit_event, log_audit_events_batch, start_audit_writer, stop_audit_writer,
+    get_audit_writer_stats
+)
+from activity_writer import (
+    record_login, start_activity_writer, stop_activity_writer, get_activity_writer_stats
+)
+from batch_service import ingest_files, hash_files, verify_signatures, iter_tar_members, BatchInputError
+from alert_stream import (
+    AlertStreamFull, alert_hub, stream_alerts, start_alert_stream, stop_alert_stream,
+    get_alert_stream_stats, ALERT_STREAM_RETRY_MS
+)
+from signature_service import sign_document, verify_signature, get_signature_info, get_signature_cache_stats
 from alert_service import (
     get_user_alerts, mark_alert_read, mark_all_alerts_read, clear_alerts,
+    count_unread_alerts, get_alert_store_stats, start_alert_service, stop_alert_service,
     alert_document_tampered, alert_signature_invalid, alert_document_registered,
-    alert_unauthorized_access
+    alert_batch_registered, alert_unauthorized_access, alert_security_document_tampered
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -50,6 +86,13 @@ logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+# Authorization dependencies (cached principal + permission bit test)
+require_admin = requires_permission(PERM_CREATE_USERS, "Admin access required")
+require_registrar = requires_permission(
+    PERM_REGISTER_DOCUMENTS,
+    "You do not have permission to register documents. Required role: Document Owner or Admin"
+)
+
 
 app = FastAPI(title="DocVault - Document Verification System")
 app.add_middleware(
@@ -63,13 +106,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = "uploads"
-
 
 @app.on_event("startup")
-def startup_event():
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
+async def startup_event():
+    await start_audit_writer()
+    start_activity_writer()
+    start_alert_service()
+    start_alert_stream()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Drain queued audit events before the Cosmos client goes away
+    await stop_audit_writer()
+    await stop_activity_writer()
+    await stop_alert_stream()
+    await stop_alert_service()
+    await close_client()
+    shutdown_password_pool()
+
+
+@app.exception_handler(PasswordHashBusy)
+async def password_hash_busy_handler(request, exc: PasswordHashBusy):
+    # Shed load fast instead of queueing behind a login burst
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+    )
 
 class PasswordResetRequest(BaseModel):
     username: str
@@ -82,7 +146,7 @@ class PasswordResetConfirm(BaseModel):
 @app.post("/auth/forgot-password")
 async def forgot_password(request: PasswordResetRequest):
     try:
-        token = initiate_password_reset(request.username)
+        token = await initiate_password_reset(request.username)
         logger.info(f"RESET TOKEN FOR {request.username}: {token}")
         return {
             "message": "Password reset initiated. Check logs for token.",
@@ -94,7 +158,7 @@ async def forgot_password(request: PasswordResetRequest):
 @app.post("/auth/reset-password")
 async def reset_password_endpoint(request: PasswordResetConfirm):
     try:
-        complete_password_reset(request.username, request.token, request.new_password)
+        await complete_password_reset(request.username, request.token, request.new_password)
         return {"message": "Password reset successfully"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -103,52 +167,41 @@ async def reset_password_endpoint(request: PasswordResetConfirm):
 @app.post("/register")
 async def register_document(
     file: UploadFile = File(...),
-    current_user=Depends(get_current_user)
+    current_user=Depends(require_registrar)
 ):
-    # Check permission
-    if not has_permission(current_user, PERM_REGISTER_DOCUMENTS):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have permission to register documents. Required role: Document Owner or Admin"
-        )
-    
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-
     try:
-        # Save temporarily to local disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Hash the upload and store it in Azure Blob Storage (single pass,
+        # no local copy). The blob and Key Vault SDKs are synchronous, so
+        # they run off the event loop.
+        ingest = await run_in_threadpool(ingest_document, file.file, file.filename)
+        file_hash = ingest["sha256"]
 
-        # Generate hash locally
-        file_hash = generate_sha256(file_path)
-        
         # Sign the document hash with user's identity
-        signature_data = sign_document(file_hash, current_user["username"])
-
-        # Upload to Azure Blob Storage
-        upload_file_to_blob(
-            local_file_path=file_path,
-            blob_name=file.filename
+        signature_data = await run_in_threadpool(
+            sign_document, file_hash, current_user["username"]
         )
 
         # Store metadata with signature
-        store_document(
+        await store_document(
             file.filename, 
             file_hash, 
             signature_data=signature_data,
-            uploaded_by=current_user["username"]
+            uploaded_by=current_user["username"],
+            content_address=ingest["content_address"]
         )
-        log_audit_event(file.filename, "REGISTER", "SUCCESS")
+        await log_audit_event(file.filename, "REGISTER", "SUCCESS")
 
         logger.info(
             "Document registered",
             extra={
                 "event": "register",
                 "username": current_user["username"],
-                "document_name": file.filename
+                "document_name": file.filename,
+                "deduplicated": ingest["deduplicated"],
+                "upload": ingest["upload_stats"].to_dict() if ingest["upload_stats"] else None
             }
         )
         
@@ -163,121 +216,409 @@ async def register_document(
             "filename": file.filename,
             "sha256": file_hash,
             "storage": "AZURE_BLOB",
+            "blob_name": ingest["blob_name"],
+            "deduplicated": ingest["deduplicated"],
             "status": "REGISTERED",
             "signed_by": current_user["username"],
             "signature_info": get_signature_info(signature_data)
         }
 
     except Exception as e:
-        log_audit_event(file.filename, "REGISTER", "FAILED")
+        await log_audit_event(file.filename, "REGISTER", "FAILED")
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
         file.file.close()
 
 
+@app.post("/register/batch")
+async def register_documents_batch(
+    files: List[UploadFile] = File(None),
+    archive: UploadFile = File(None),
+    current_user=Depends(require_registrar)
+):
+    """
+    Register many documents in one request.
+
+    Send either several ``files`` parts or one tar ``archive`` (optionally
+    compressed); prefer the archive for very large sets, since multipart
+    parsing caps the number of parts. Files are hashed, uploaded and signed
+    in parallel, then stored and audited with batched Cosmos writes. Returns
+    a per-file manifest; one failed file does not fail the others. Repeated
+    filenames fail. If the archive breaks part way, the files read before
+    that are still registered and ``archive_error`` says why the rest are
+    missing.
+    """
+    if archive is not None:
+        sources = iter_tar_members(archive.file)
+    elif files:
+        sources = [(f.filename, f.file) for f in files if f.filename]
+    else:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    username = current_user["username"]
+    archive_error = None
+
+    try:
+        results = await run_in_threadpool(ingest_files, sources, username)
+    except BatchInputError as e:
+        # Files read before the archive broke were uploaded: register and report them
+        if not e.results:
+            raise HTTPException(status_code=400, detail=f"Invalid tar archive: {e}")
+        results, archive_error = e.results, f"Invalid tar archive: {e}"
+    finally:
+        if archive is not None:
+            archive.file.close()
+
+    uploaded = [r for r in results if r["status"] == "UPLOADED"]
+
+    try:
+        store_failures = await store_documents_batch([
+            {
+                "filename": r["filename"],
+                "sha256": r["sha256"],
+                "signature_data": r["signature_data"],
+                "uploaded_by": username,
+                "content_address": r["content_address"]
+            }
+            for r in uploaded
+        ])
+    except Exception as e:
+        store_failures = {r["filename"]: str(e) for r in uploaded}
+
+    manifest = []
+    for r in results:
+        entry = {"filename": r["filename"]}
+        if r["status"] == "FAILED":
+            entry.update(status="FAILED", error=r["error"])
+        elif r["filename"] in store_failures:
+            entry.update(status="FAILED", sha256=r["sha256"], error=store_failures[r["filename"]])
+        else:
+            entry.update(
+                status="REGISTERED",
+                sha256=r["sha256"],
+                deduplicated=r["deduplicated"],
+                signature_info=get_signature_info(r["signature_data"])
+            )
+        manifest.append(entry)
+
+    registered = sum(1 for entry in manifest if entry["status"] == "REGISTERED")
+    failed = len(manifest) - registered
+
+    try:
+        await log_audit_events_batch([
+            (entry["filename"], "REGISTER", "SUCCESS" if entry["status"] == "REGISTERED" else "FAILED")
+            for entry in manifest
+        ])
+    except Exception as e:
+        logger.warning(f"Batch audit logging incomplete: {e}")
+
+    logger.info(
+        "Document batch registered",
+        extra={
+            "event": "register_batch",
+            "username": username,
+            "registered": registered,
+            "failed": failed
+        }
+    )
+
+    alert_batch_registered(username=username, registered=registered, failed=failed)
+
+    response = {
+        "total": len(manifest),
+        "registered": registered,
+        "failed": failed,
+        "documents": manifest
+    }
+    if archive_error:
+        response["archive_error"] = archive_error
+    return response
+
+
+def _evaluate_verification(
+    filename: str,
+    uploaded_hash: str,
+    doc_metadata: dict,
+    signature_valid: bool
+) -> dict:
+    """Build the verification verdict for a registered document"""
+    stored_hash = doc_metadata.get("sha256")
+    signature_data = doc_metadata.get("signature")
+    uploaded_by = doc_metadata.get("uploaded_by", "Unknown")
+
+    # Check hash integrity
+    hash_match = uploaded_hash == stored_hash
+
+    # Determine overall result
+    if hash_match and signature_valid:
+        result = "AUTHENTIC"
+        status_message = "Document is authentic and signature is valid"
+    elif hash_match and not signature_data:
+        result = "AUTHENTIC_NO_SIGNATURE"
+        status_message = "Document is authentic but has no digital signature"
+    elif not hash_match:
+        result = "TAMPERED"
+        status_message = "Document has been tampered with!"
+    else:
+        result = "SIGNATURE_INVALID"
+        status_message = "Document hash matches but signature is invalid"
+
+    response = {
+        "filename": filename,
+        "stored_hash": stored_hash,
+        "uploaded_hash": uploaded_hash,
+        "result": result,
+        "status_message": status_message,
+        "hash_match": hash_match,
+        "uploaded_by": uploaded_by
+    }
+    
+    # Add signature verification details if available
+    if signature_data:
+        response["signature_verification"] = {
+            "valid": signature_valid,
+            "signer": signature_data.get("signer"),
+            "algorithm": signature_data.get("algorithm"),
+            "info": get_signature_info(signature_data)
+        }
+
+    return response
+
+
+def _send_verification_alert(verdict: dict, doc_metadata: dict):
+    """Notify the document owner of a failed verification (and admins and auditors of tampering)"""
+    signature_data = doc_metadata.get("signature")
+
+    if verdict["result"] == "TAMPERED":
+        # 🚨 CRITICAL ALERT: Send tampering notification to document owner
+        alert_document_tampered(
+            username=verdict["uploaded_by"],
+            filename=verdict["filename"],
+            stored_hash=verdict["stored_hash"],
+            uploaded_hash=verdict["uploaded_hash"]
+        )
+        alert_security_document_tampered(
+            owner=verdict["uploaded_by"],
+            filename=verdict["filename"],
+            stored_hash=verdict["stored_hash"],
+            uploaded_hash=verdict["uploaded_hash"]
+        )
+    elif verdict["result"] == "SIGNATURE_INVALID" and signature_data:
+        # 🚨 CRITICAL ALERT: Invalid signature
+        alert_signature_invalid(
+            username=verdict["uploaded_by"],
+            filename=verdict["filename"],
+            signer=signature_data.get("signer", "Unknown")
+        )
+
+
+# Verdict preference when one content hash matches several registrations
+_VERDICT_RANK = {"AUTHENTIC": 0, "AUTHENTIC_NO_SIGNATURE": 1, "SIGNATURE_INVALID": 2, "TAMPERED": 3}
+
+
+async def _verify_by_hash(filename: str, uploaded_hash: str) -> dict:
+    """Resolve an upload by content hash to every matching registered document"""
+    matches = await find_documents_by_hash(uploaded_hash)
+
+    if not matches:
+        await log_audit_event(filename, "VERIFY_BY_HASH", "NOT_FOUND")
+        raise HTTPException(status_code=404, detail="No registered document has this content")
+
+    verdicts = []
+    for doc_metadata in matches:
+        signature_valid = False
+        if doc_metadata.get("signature"):
+            signature_valid = await run_in_threadpool(
+                verify_signature, doc_metadata["sha256"], doc_metadata["signature"]
+            )
+        verdict = _evaluate_verification(
+            doc_metadata["filename"], uploaded_hash, doc_metadata, signature_valid
+        )
+        _send_verification_alert(verdict, doc_metadata)
+        verdicts.append(verdict)
+
+    verdicts.sort(key=lambda v: _VERDICT_RANK.get(v["result"], len(_VERDICT_RANK)))
+    result = verdicts[0]["result"]
+
+    await log_audit_event(filename, "VERIFY_BY_HASH", result)
+
+    return {
+        "filename": filename,
+        "uploaded_hash": uploaded_hash,
+        "result": result,
+        "status_message": verdicts[0]["status_message"],
+        "match_count": len(verdicts),
+        "matches": verdicts
+    }
+
+
 @app.post("/verify")
-async def verify_document(file: UploadFile = File(...)):
+async def verify_document(file: UploadFile = File(...), by_hash: bool = False):
+    """
+    Verify a document against its registration.
+
+    By default the upload is matched by filename. With ``by_hash=true`` it is
+    matched by content instead, so renamed copies still verify; every
+    registered document with the same SHA-256 is returned.
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
     try:
-        # Save uploaded file temporarily
-        temp_path = os.path.join(UPLOAD_DIR, f"verify_{file.filename}")
-
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Hash the uploaded file straight from the request upload
+        uploaded_hash = await run_in_threadpool(generate_sha256_stream, file.file)
 
-        # Generate hash of uploaded file
-        uploaded_hash = generate_sha256(temp_path)
+        if by_hash:
+            return await _verify_by_hash(file.filename, uploaded_hash)
 
         # Get stored document metadata including signature
-        doc_metadata = get_document_metadata(file.filename)
+        doc_metadata = await get_document_metadata(file.filename)
 
         if not doc_metadata:
-            log_audit_event(file.filename, "VERIFY", "NOT_FOUND")
+            await log_audit_event(file.filename, "VERIFY", "NOT_FOUND")
             raise HTTPException(status_code=404, detail="Document not registered")
 
         stored_hash = doc_metadata.get("sha256")
         signature_data = doc_metadata.get("signature")
-        uploaded_by = doc_metadata.get("uploaded_by", "Unknown")
 
-        # Check hash integrity
-        hash_match = uploaded_hash == stored_hash
-        
         # Verify digital signature
         signature_valid = False
         if signature_data:
-            signature_valid = verify_signature(stored_hash, signature_data)
-        
-        # Determine overall result
-        if hash_match and signature_valid:
-            result = "AUTHENTIC"
-            status_message = "Document is authentic and signature is valid"
-        elif hash_match and not signature_data:
-            result = "AUTHENTIC_NO_SIGNATURE"
-            status_message = "Document is authentic but has no digital signature"
-        elif not hash_match:
-            result = "TAMPERED"
-            status_message = "Document has been tampered with!"
-            # 🚨 CRITICAL ALERT: Send tampering notification to document owner
-            alert_document_tampered(
-                username=uploaded_by,
-                filename=file.filename,
-                stored_hash=stored_hash,
-                uploaded_hash=uploaded_hash
+            signature_valid = await run_in_threadpool(
+                verify_signature, stored_hash, signature_data
             )
-        else:
-            result = "SIGNATURE_INVALID"
-            status_message = "Document hash matches but signature is invalid"
-            # 🚨 CRITICAL ALERT: Invalid signature
-            if signature_data:
-                alert_signature_invalid(
-                    username=uploaded_by,
-                    filename=file.filename,
-                    signer=signature_data.get("signer", "Unknown")
-                )
-
-        log_audit_event(file.filename, "VERIFY", result)
-
-        response = {
-            "filename": file.filename,
-            "stored_hash": stored_hash,
-            "uploaded_hash": uploaded_hash,
-            "result": result,
-            "status_message": status_message,
-            "hash_match": hash_match,
-            "uploaded_by": uploaded_by
-        }
-        
-        # Add signature verification details if available
-        if signature_data:
-            response["signature_verification"] = {
-                "valid": signature_valid,
-                "signer": signature_data.get("signer"),
-                "algorithm": signature_data.get("algorithm"),
-                "info": get_signature_info(signature_data)
-            }
-        
+
+        response = _evaluate_verification(
+            file.filename, uploaded_hash, doc_metadata, signature_valid
+        )
+        _send_verification_alert(response, doc_metadata)
+
+        await log_audit_event(file.filename, "VERIFY", response["result"])
+
         return response
 
     except HTTPException:
         raise
 
     except Exception as e:
-        log_audit_event(file.filename, "VERIFY", "FAILED")
+        await log_audit_event(file.filename, "VERIFY", "FAILED")
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
         file.file.close()
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+
+
+@app.post("/verify/batch")
+async def verify_documents_batch(
+    files: List[UploadFile] = File(None),
+    archive: UploadFile = File(None)
+):
+    """
+    Verify many documents in one request.
+
+    Accepts several ``files`` parts or one tar ``archive``, like
+    /register/batch. Files are hashed in parallel, their metadata is fetched
+    with one multi-document read, and each file gets the same verdict
+    /verify would return (or NOT_FOUND / FAILED), plus summary counts.
+    """
+    if archive is not None:
+        sources = iter_tar_members(archive.file)
+    elif files:
+        sources = [(f.filename, f.file) for f in files if f.filename]
+    else:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    archive_error = None
+    try:
+        hashed = await run_in_threadpool(hash_files, sources)
+    except BatchInputError as e:
+        if not e.results:
+            raise HTTPException(status_code=400, detail=f"Invalid tar archive: {e}")
+        hashed, archive_error = e.results, f"Invalid tar archive: {e}"
+    finally:
+        if archive is not None:
+            archive.file.close()
+
+    try:
+        metadata = await get_documents_metadata(
+            [h["filename"] for h in hashed if h["status"] == "HASHED"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Check every stored signature in parallel
+    to_check = [
+        h["filename"] for h in hashed
+        if h["filename"] in metadata and metadata[h["filename"]].get("signature")
+    ]
+    checks = await run_in_threadpool(
+        verify_signatures,
+        [(metadata[f]["sha256"], metadata[f]["signature"]) for f in to_check]
+    )
+    signature_results = dict(zip(to_check, checks))
+
+    verdicts = []
+    for h in hashed:
+        filename = h["filename"]
+        if h["status"] == "FAILED":
+            verdicts.append({"filename": filename, "result": "FAILED", "error": h["error"]})
+        elif filename not in metadata:
+            verdicts.append({
+                "filename": filename,
+                "uploaded_hash": h["sha256"],
+                "result": "NOT_FOUND",
+                "status_message": "Document not registered"
+            })
+        else:
+            verdict = _evaluate_verification(
+                filename, h["sha256"], metadata[filename],
+                signature_results.get(filename, False)
+            )
+            _send_verification_alert(verdict, metadata[filename])
+            verdicts.append(verdict)
+
+    summary = {}
+    for verdict in verdicts:
+        summary[verdict["result"]] = summary.get(verdict["result"], 0) + 1
+
+    try:
+        await log_audit_events_batch([
+            (verdict["filename"], "VERIFY", verdict["result"]) for verdict in verdicts
+        ])
+    except Exception as e:
+        logger.warning(f"Batch audit logging incomplete: {e}")
+
+    response = {
+        "total": len(verdicts),
+        "summary": summary,
+        "results": verdicts
+    }
+    if archive_error:
+        response["archive_error"] = archive_error
+    return response
 
 
 @app.get("/audit-logs")
 async def read_audit_logs(
+    limit: int = AUDIT_PAGE_SIZE,
+    continuation: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    result: Optional[str] = None,
+    filename: Optional[str] = None,
+    search: Optional[str] = None,
     current_user=Depends(get_current_user)
 ):
+    """
+    Page through audit logs, newest first.
+
+    Pass the returned ``continuation_token`` back as ``continuation`` to get
+    the next page; it is null on the last page. ``limit`` is capped at
+    AUDIT_PAGE_SIZE_MAX. ``start``/``end`` bound the timestamp (UTC);
+    ``search`` matches part of the filename, ignoring case.
+    """
     logger.info(
         "Audit logs accessed",
         extra={
@@ -295,14 +636,156 @@ async def read_audit_logs(
         )
 
     try:
-        logs = get_audit_logs()
+        page = await get_audit_logs(
+            page_size=limit,
+            continuation_token=continuation,
+            start=_as_utc(start),
+            end=_as_utc(end),
+            action=action,
+            result=result,
+            filename=filename,
+            search=search
+        )
         return {
-            "count": len(logs),
-            "audit_logs": logs
+            "count": len(page["items"]),
+            "audit_logs": page["items"],
+            "continuation_token": page["continuation_token"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize a query datetime to naive UTC, matching stored timestamps"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+# Columns in CSV exports (NDJSON exports carry the full item)
+AUDIT_EXPORT_FIELDS = ["id", "timestamp", "action", "filename", "result"]
+# Bytes buffered before a chunk is sent to the client
+AUDIT_EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+async def _export_audit_rows(items, export_format: str):
+    """Encode audit items as NDJSON or CSV text chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if export_format == "csv":
+        writer.writerow(AUDIT_EXPORT_FIELDS)
+
+    async for item in items:
+        if export_format == "csv":
+            writer.writerow([item.get(field, "") for field in AUDIT_EXPORT_FIELDS])
+        else:
+            item = {k: v for k, v in item.items() if not k.startswith("_")}
+            buffer.write(json.dumps(item) + "\n")
+
+        if buffer.tell() >= AUDIT_EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _audited_export(chunks, username: str):
+    """
+    Pass export chunks through, recording the outcome once the stream ends:
+    headers go out before the first page is read, so success is only known here.
+    """
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception as e:
+        logger.error(
+            "Audit logs export failed",
+            extra={"event": "audit_export_failed", "username": username, "error": str(e)}
+        )
+        await log_audit_event("audit-logs", "EXPORT", "FAILED")
+        raise
+
+    logger.info("Audit logs export completed", extra={"event": "audit_export_completed", "username": username})
+    await log_audit_event("audit-logs", "EXPORT", "SUCCESS")
+
+
+@app.get("/audit-logs/export")
+async def export_audit_logs(
+    format: str = "ndjson",
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    result: Optional[str] = None,
+    filename: Optional[str] = None,
+    search: Optional[str] = None,
+    current_user=Depends(get_current_user)
+):
+    """
+    Stream audit logs as NDJSON or CSV (optionally gzip-compressed).
+
+    Takes the same filters as /audit-logs. Events are read from Cosmos page
+    by page and written out as they arrive, so memory use stays flat no
+    matter how large the export is.
+    """
+    if not has_permission(current_user, PERM_EXPORT_AUDIT_LOGS):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Required role: Admin or Auditor"
+        )
+
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    logger.info(
+        "Audit logs export started",
+        extra={
+            "event": "audit_export",
+            "username": current_user["username"],
+            "format": format,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "action": action,
+            "result": result,
+            "filename": filename,
+            "search": search
+        }
+    )
+    items = iter_audit_logs(
+        start=_as_utc(start),
+        end=_as_utc(end),
+        action=action,
+        result=result,
+        filename=filename,
+        search=search
+    )
+    body = _export_audit_rows(items, format)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    download_name = f"audit_logs.{format}"
+
+    if gzip:
+        body = _gzip_chunks(body)
+        download_name += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        _audited_export(body, current_user["username"]),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'}
+    )
+
+
 # ============ USER MANAGEMENT MODELS ============
 
 class UserCreateRequest(BaseModel):
@@ -318,10 +801,10 @@ class RoleUpdateRequest(BaseModel):
 # ============ PUBLIC AUTHENTICATION ENDPOINTS ============
 
 @app.post("/signup")
-def signup(request: UserCreateRequest):
+async def signup(request: UserCreateRequest):
     """Public user registration endpoint"""
     # Check if username already exists
-    existing = get_user_by_username(request.username)
+    existing = await get_user_by_username(request.username)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -330,7 +813,7 @@ def signup(request: UserCreateRequest):
     
     # Create user with document_owner role (default for self-registration)
     try:
-        user = create_user(
+        user = await create_user(
             username=request.username,
             password=request.password,
             email=request.email,
@@ -350,6 +833,14 @@ def signup(request: UserCreateRequest):
             "username": user["username"],
             "role": user["role"]
         }
+    except PasswordHashBusy:
+        raise
+    except ValueError:
+        # Username taken since the check above
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already taken. Please choose a different username."
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -358,8 +849,8 @@ def signup(request: UserCreateRequest):
 
 
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = get_user_by_username(form_data.username)
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await get_user_by_username(form_data.username)
 
     if not user:
         raise HTTPException(
@@ -374,14 +865,19 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Account has been deactivated",
         )
 
-    if not verify_password(form_data.password, user["password_hash"]):
+    valid, new_hash = await verify_password(form_data.password, user["password_hash"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
         )
+
+    # Stored hash uses outdated cost settings: replace it while we have the password
+    if new_hash:
+        await update_password_hash(user["username"], new_hash)
     
-    # Update last login timestamp
-    update_last_login(user["username"])
+    # Recorded write-behind: the response doesn't wait for the write
+    await record_login(user["username"])
 
     access_token = create_access_token(
         data={"sub": user["username"], "role": user["role"]}
@@ -408,42 +904,64 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 # ============ ADMIN ENDPOINTS ============
 
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated ``fields=`` query parameter"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
 @app.get("/admin/users")
-def list_users(current_user=Depends(get_current_user)):
-    """List all users (Admin only)"""
-    if not has_permission(current_user, PERM_CREATE_USERS):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
+async def list_users(
+    limit: int = LIST_PAGE_SIZE,
+    continuation: Optional[str] = None,
+    sort: str = "username",
+    order: str = "asc",
+    fields: Optional[str] = None,
+    current_user=Depends(require_admin)
+):
+    """
+    Page through users (Admin only).
+
+    Pass the returned ``continuation_token`` back as ``continuation`` for the
+    next page. ``fields`` is a comma-separated projection.
+    """
+    try:
+        page = await get_all_users(
+            page_size=limit,
+            continuation_token=continuation,
+            sort=sort,
+            order=order,
+            fields=_parse_fields(fields)
         )
-    
-    users = get_all_users()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     return {
-        "count": len(users),
-        "users": users
+        "count": len(page["items"]),
+        "users": page["items"],
+        "continuation_token": page["continuation_token"]
     }
 
 
 @app.post("/admin/create-user")
-def admin_create_user(
+async def admin_create_user(
     request: UserCreateRequest,
-    current_user=Depends(get_current_user)
+    current_user=Depends(require_admin)
 ):
     """Create new user (Admin only)"""
-    if not has_permission(current_user, PERM_CREATE_USERS):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-
-    existing = get_user_by_username(request.username)
+    existing = await get_user_by_username(request.username)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already exists"
         )
 
-    user = create_user(request.username, request.password, request.role, request.email)
+    try:
+        user = await create_user(request.username, request.password, request.role, request.email)
+    except ValueError as e:
+        # Invalid role, or the username was taken since the check above
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
     logger.info(
         "User created",
@@ -465,20 +983,16 @@ def admin_create_user(
 
 
 @app.put("/admin/users/{username}/role")
-def update_role(
+async def update_role(
     username: str,
     request: RoleUpdateRequest,
-    current_user=Depends(get_current_user)
+    current_user=Depends(require_admin)
 ):
     """Update user role (Admin only)"""
-    if not has_permission(current_user, PERM_CREATE_USERS):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-    
     try:
-        user = update_user_role(username, request.new_role)
+        user = await update_user_role(username, request.new_role)
+        # Cached principals still carry the old role
+        invalidate_principals(username)
         logger.info(
             "User role updated",
             extra={
@@ -498,17 +1012,11 @@ def update_role(
 
 
 @app.post("/admin/users/{username}/deactivate")
-def deactivate_user_account(
+async def deactivate_user_account(
     username: str,
-    current_user=Depends(get_current_user)
+    current_user=Depends(require_admin)
 ):
     """Deactivate user account (Admin only)"""
-    if not has_permission(current_user, PERM_CREATE_USERS):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-    
     if username == current_user["username"]:
         raise HTTPException(
             status_code=400,
@@ -516,7 +1024,8 @@ def deactivate_user_account(
         )
     
     try:
-        user = deactivate_user(username)
+        user = await deactivate_user(username)
+        invalidate_principals(username)
         logger.info(
             "User deactivated",
             extra={
@@ -549,12 +1058,12 @@ def get_available_roles():
 
 
 @app.get("/me")
-def get_current_user_info(current_user=Depends(get_current_user)):
+async def get_current_user_info(current_user=Depends(get_current_user)):
     """Get current user information and permissions"""
-    unread_alerts = len([a for a in get_user_alerts(current_user["username"], unread_only=True)])
+    unread_alerts = await count_unread_alerts(current_user["username"])
     
     # Get full user details
-    full_user = get_user_by_username(current_user["username"])
+    full_user = await get_user_by_username(current_user["username"])
     
     return {
         "username": current_user["username"],
@@ -572,34 +1081,80 @@ def get_current_user_info(current_user=Depends(get_current_user)):
 # ============ ALERT ENDPOINTS ============
 
 @app.get("/alerts")
-def get_alerts(
+async def get_alerts(
     unread_only: bool = False,
     current_user=Depends(get_current_user)
 ):
     """Get user's alerts"""
-    alerts = get_user_alerts(current_user["username"], unread_only)
+    alerts = await get_user_alerts(current_user["username"], unread_only)
     return {
         "count": len(alerts),
         "alerts": alerts
     }
 
 
+@app.post("/alerts/stream-session")
+async def open_alert_stream_session(response: Response, current_user=Depends(get_current_user)):
+    """
+    Set the HttpOnly cookie GET /alerts/stream authenticates with (call it
+    again when the stream is refused with 401 after the session expires).
+    """
+    response.set_cookie(
+        ALERT_STREAM_COOKIE,
+        create_stream_token(current_user["username"]),
+        max_age=ALERT_STREAM_SESSION_SECONDS,
+        httponly=True,
+        secure=ALERT_STREAM_COOKIE_SECURE,
+        samesite="strict"
+    )
+    return {"expires_in": ALERT_STREAM_SESSION_SECONDS}
+
+
+@app.get("/alerts/stream")
+async def stream_alert_events(
+    last_event_id: Optional[str] = Header(None),
+    after: Optional[str] = None,
+    current_user=Depends(get_stream_user)
+):
+    """
+    Server-sent events: each new alert as an "alert" event whose id is the
+    alert id. On reconnect the browser sends Last-Event-ID (or the client
+    passes ``after`` when it opens a new stream) and the alerts missed
+    meanwhile are sent first.
+    """
+    try:
+        alert_hub.check_capacity()
+    except AlertStreamFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(ALERT_STREAM_RETRY_MS // 1000)}
+        )
+
+    return StreamingResponse(
+        stream_alerts(current_user["username"], last_event_id or after),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: stop nginx holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/alerts/{alert_id}/read")
-def mark_read(
+async def mark_read(
     alert_id: str,
     current_user=Depends(get_current_user)
 ):
     """Mark an alert as read"""
-    success = mark_alert_read(current_user["username"], alert_id)
+    success = await mark_alert_read(current_user["username"], alert_id)
     if not success:
         raise HTTPException(status_code=404, detail="Alert not found")
     return {"message": "Alert marked as read"}
 
 
 @app.post("/alerts/read-all")
-def mark_all_read(current_user=Depends(get_current_user)):
+async def mark_all_read(current_user=Depends(get_current_user)):
     """Mark all alerts as read"""
-    count = mark_all_alerts_read(current_user["username"])
+    count = await mark_all_alerts_read(current_user["username"])
     return {
         "message": f"Marked {count} alerts as read",
         "count": count
@@ -607,9 +1162,9 @@ def mark_all_read(current_user=Depends(get_current_user)):
 
 
 @app.delete("/alerts")
-def clear_all_alerts(current_user=Depends(get_current_user)):
+async def clear_all_alerts(current_user=Depends(get_current_user)):
     """Clear all alerts"""
-    count = clear_alerts(current_user["username"])
+    count = await clear_alerts(current_user["username"])
     return {
         "message": f"Cleared {count} alerts",
         "count": count
@@ -619,23 +1174,50 @@ def clear_all_alerts(current_user=Depends(get_current_user)):
 # ============ ADMIN STATISTICS ============
 
 @app.get("/admin/stats")
-def get_admin_statistics(current_user=Depends(get_current_user)):
+async def get_admin_statistics(current_user=Depends(require_admin)):
     """Get system statistics (Admin only)"""
-    if not has_permission(current_user, PERM_CREATE_USERS):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-    
     from cosmos_service import get_system_stats
     
     try:
-        stats = get_system_stats()
+        stats = await get_system_stats()
+        stats["blob_uploads"] = get_upload_stats()
+        stats["signature_cache"] = get_signature_cache_stats()
+        stats["audit_writer"] = get_audit_writer_stats()
+        stats["user_cache"] = get_user_cache_stats()
+        stats["password_hashing"] = get_password_hash_stats()
+        stats["activity_writer"] = get_activity_writer_stats()
+        stats["principal_cache"] = get_principal_cache_stats()
+        stats["alert_store"] = get_alert_store_stats()
+        stats["alert_stream"] = get_alert_stream_stats()
+        stats["role_index"] = get_role_index_stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/admin/stats/rebuild")
+async def rebuild_admin_statistics(current_user=Depends(require_admin)):
+    """Recount the pre-aggregated statistics from scratch (Admin only)"""
+    from cosmos_service import rebuild_system_stats
+
+    try:
+        stats = await rebuild_system_stats()
+        logger.info(
+            "System stats rebuilt",
+            extra={
+                "event": "stats_rebuild",
+                "admin": current_user["username"]
+            }
+        )
+        return {
+            "message": "Statistics rebuilt",
+            "counts": stats["counts"],
+            "rebuilt_at": stats["rebuilt_at"]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============ PASSWORD MANAGEMENT ============
 
 class PasswordChangeRequest(BaseModel):
@@ -643,7 +1225,7 @@ class PasswordChangeRequest(BaseModel):
     new_password: str
 
 @app.post("/users/change-password")
-def change_password(
+async def change_password(
     request: PasswordChangeRequest,
     current_user=Depends(get_current_user)
 ):
@@ -651,7 +1233,7 @@ def change_password(
     from user_service import change_user_password
     
     try:
-        result = change_user_password(
+        result = await change_user_password(
             username=current_user["username"],
             current_password=request.current_password,
             new_password=request.new_password
@@ -668,6 +1250,8 @@ def change_password(
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PasswordHashBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -675,32 +1259,98 @@ def change_password(
 # ============ DOCUMENT SEARCH ============
 
 @app.get("/documents/search")
-def search_documents(
+async def search_documents(
     query: str = "",
+    limit: int = LIST_PAGE_SIZE,
+    continuation: Optional[str] = None,
+    sort: str = "relevance",
+    order: str = "desc",
+    fields: Optional[str] = None,
     current_user=Depends(get_current_user)
 ):
-    """Search documents by filename"""
+    """
+    Search documents by filename.
+
+    Results are ranked by relevance unless ``sort`` is uploaded_at or
+    filename. Paging and ``fields`` work as for /documents.
+    """
     from cosmos_service import search_documents_by_name
     
     try:
-        documents = search_documents_by_name(query)
-        return {"count": len(documents), "documents": documents}
+        page = await search_documents_by_name(
+            query,
+            page_size=limit,
+            continuation_token=continuation,
+            sort=sort,
+            order=order,
+            fields=_parse_fields(fields)
+        )
+        return {
+            "count": len(page["items"]),
+            "documents": page["items"],
+            "continuation_token": page["continuation_token"]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/documents")
-def list_all_documents(
+async def list_all_documents(
+    limit: int = LIST_PAGE_SIZE,
+    continuation: Optional[str] = None,
+    sort: str = "uploaded_at",
+    order: str = "desc",
+    fields: Optional[str] = None,
     current_user=Depends(get_current_user)
 ):
-    """List all documents (with ownership filtering)"""
+    """
+    Page through documents (with ownership filtering).
+
+    Pass the returned ``continuation_token`` back as ``continuation`` for the
+    next page. ``fields`` is a comma-separated projection; by default the
+    signature itself is left out (``signed``/``signer``/``algorithm`` are
+    included), see GET /documents/{filename} for the full record.
+    """
     from cosmos_service import get_all_documents
     
-    # Admin and auditors can see all documents
-    if has_permission(current_user, PERM_VIEW_ALL_DOCUMENTS):
-        documents = get_all_documents()
-    else:
-        # Regular users see only their documents
-        documents = get_all_documents(uploaded_by=current_user["username"])
-    
-    return {"count": len(documents), "documents": documents}
+    # Admin and auditors can see all documents; regular users only their own
+    uploaded_by = None
+    if not has_permission(current_user, PERM_VIEW_ALL_DOCUMENTS):
+        uploaded_by = current_user["username"]
+
+    try:
+        page = await get_all_documents(
+            uploaded_by=uploaded_by,
+            page_size=limit,
+            continuation_token=continuation,
+            sort=sort,
+            order=order,
+            fields=_parse_fields(fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "count": len(page["items"]),
+        "documents": page["items"],
+        "continuation_token": page["continuation_token"]
+    }
+
+
+@app.get("/documents/{filename:path}")
+async def get_document(
+    filename: str,
+    current_user=Depends(get_current_user)
+):
+    """Full document record, including its signature"""
+    document = await get_document_metadata(filename)
+
+    if not document or not (
+        has_permission(current_user, PERM_VIEW_ALL_DOCUMENTS)
+        or check_document_ownership(current_user, document.get("uploaded_by"))
+    ):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return {key: value for key, value in document.items() if not key.startswith("_")}
@@ -0,0 +1,70 @@
+"""
+Merkle tree helpers for batched document signing
+Leaves are document SHA-256 hashes; one signature over the root covers the batch
+"""
+import hashlib
+from typing import List, Tuple
+
+# Domain-separation prefixes so a leaf can never be confused with an inner node
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+def _hash_leaf(document_hash: str) -> bytes:
+    return hashlib.sha256(_LEAF_PREFIX + bytes.fromhex(document_hash)).digest()
+
+
+def _hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def build_merkle_tree(document_hashes: List[str]) -> Tuple[str, List[List[dict]]]:
+    """
+    Build a Merkle tree over document hashes.
+
+    Args:
+        document_hashes: Hex SHA-256 hashes, one per document
+
+    Returns:
+        (root hash as hex, inclusion proof for each input in order)
+    """
+    if not document_hashes:
+        raise ValueError("Cannot build a Merkle tree with no leaves")
+
+    level = [_hash_leaf(h) for h in document_hashes]
+    # positions[i] = index of leaf i's ancestor in the current level
+    positions = list(range(len(document_hashes)))
+    proofs: List[List[dict]] = [[] for _ in document_hashes]
+
+    while len(level) > 1:
+        for leaf, pos in enumerate(positions):
+            sibling = pos ^ 1
+            # A lone last node is promoted unchanged, so it has no sibling
+            if sibling < len(level):
+                proofs[leaf].append({
+                    "side": "left" if sibling < pos else "right",
+                    "hash": level[sibling].hex()
+                })
+            positions[leaf] = pos // 2
+
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 < len(level):
+                next_level.append(_hash_node(level[i], level[i + 1]))
+            else:
+                next_level.append(level[i])
+        level = next_level
+
+    return level[0].hex(), proofs
+
+
+def compute_merkle_root(document_hash: str, proof: List[dict]) -> str:
+    """Recompute the root hash from a document hash and its inclusion proof"""
+    node = _hash_leaf(document_hash)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        if step["side"] == "left":
+            node = _hash_node(sibling, node)
+        else:
+            node = _hash_node(node, sibling)
+    return node.hex()
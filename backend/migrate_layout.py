@@ -0,0 +1,185 @@
+"""
+Move items from the legacy container (partitioned by /type) to the
+partitioned container (partition key path /pk).
+
+Run with the API in COSMOS_LAYOUT=dual so new writes already go to the
+partitioned container while this copies the old ones:
+
+    python migrate_layout.py --rate 200
+
+Each item is created in the target (an item that already exists there was
+written by the API since dual mode started, so it is newer and kept) and
+then deleted from the legacy container. Progress is checkpointed after every
+page, so an interrupted run resumes where it stopped. When it finishes, set
+COSMOS_LAYOUT=partitioned and rebuild the stats (POST /admin/stats/rebuild).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from azure.cosmos import PartitionKey, exceptions
+
+from cosmos_service import (
+    database, legacy_layout, close_client, Layout, PARTITIONED_CONTAINER_NAME
+)
+
+logger = logging.getLogger("migrate_layout")
+
+# System properties Cosmos adds to every item
+_SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+# Backoff when Cosmos still throttles (429) after the SDK's own retries
+_THROTTLE_DELAYS = [1, 2, 5, 10, 30]
+
+
+class Throttle:
+    """Caps the item rate so the migration leaves RU/s for live traffic"""
+
+    def __init__(self, items_per_second: float):
+        self.interval = 1 / items_per_second if items_per_second > 0 else 0
+        self.next_at = time.monotonic()
+
+    async def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            await asyncio.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write-then-rename so a crash never leaves a torn checkpoint
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+
+async def _with_retries(operation):
+    for attempt in range(len(_THROTTLE_DELAYS) + 1):
+        try:
+            return await operation()
+        except exceptions.CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt == len(_THROTTLE_DELAYS):
+                raise
+            await asyncio.sleep(_THROTTLE_DELAYS[attempt])
+
+
+async def move_item(item: dict, target: Layout, delete_source: bool) -> bool:
+    """Copy one item to the target layout. Returns False if it was already there."""
+    body = {key: value for key, value in item.items() if key not in _SYSTEM_PROPERTIES}
+    target.prepare(body)
+
+    try:
+        await _with_retries(lambda: target.container.create_item(body))
+        created = True
+    except exceptions.CosmosResourceExistsError:
+        created = False
+
+    if delete_source:
+        try:
+            await _with_retries(lambda: legacy_layout.container.delete_item(
+                item=item["id"],
+                partition_key=legacy_layout.item_partition_key(item)
+            ))
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+
+    return created
+
+
+async def migrate_type(
+    kind: str,
+    target: Layout,
+    checkpoint: dict,
+    checkpoint_path: str,
+    throttle: Throttle,
+    page_size: int,
+    delete_source: bool
+):
+    state = checkpoint.setdefault(kind, {"token": None, "done": False, "moved": 0, "skipped": 0})
+    if state["done"]:
+        logger.info(f"{kind}: already migrated")
+        return
+
+    pages = legacy_layout.container.query_items(
+        query="SELECT * FROM c WHERE c.type = @type",
+        parameters=[{"name": "@type", "value": kind}],
+        partition_key=kind,
+        max_item_count=page_size
+    ).by_page(state["token"])
+
+    async for page in pages:
+        async for item in page:
+            await throttle.wait()
+            if await move_item(item, target, delete_source):
+                state["moved"] += 1
+            else:
+                state["skipped"] += 1
+
+        state["token"] = pages.continuation_token
+        save_checkpoint(checkpoint_path, checkpoint)
+        logger.info(f"{kind}: {state['moved']} moved, {state['skipped']} already present")
+
+    state["done"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+
+
+async def migrate(args):
+    if not PARTITIONED_CONTAINER_NAME:
+        raise RuntimeError("COSMOS_PARTITIONED_CONTAINER not set")
+
+    target_container = await database.create_container_if_not_exists(
+        id=PARTITIONED_CONTAINER_NAME,
+        partition_key=PartitionKey(path="/pk")
+    )
+    target = Layout(target_container, partitioned=True)
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    throttle = Throttle(args.rate)
+
+    kinds = args.types or [
+        kind async for kind in legacy_layout.container.query_items(
+            query="SELECT DISTINCT VALUE c.type FROM c"
+        )
+    ]
+    for kind in kinds:
+        await migrate_type(
+            kind, target, checkpoint, args.checkpoint, throttle,
+            args.page_size, not args.keep_source
+        )
+
+    logger.info("Migration complete")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=float, default=100, help="max items moved per second (0 = unlimited)")
+    parser.add_argument("--page-size", type=int, default=100, help="items read from the source per page")
+    parser.add_argument("--checkpoint", default="migrate_layout.checkpoint.json", help="progress file for resuming")
+    parser.add_argument("--types", nargs="*", help="item types to move (default: all)")
+    parser.add_argument("--keep-source", action="store_true", help="copy without deleting from the legacy container")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        try:
+            await migrate(args)
+        finally:
+            await close_client()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
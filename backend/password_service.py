@@ -0,0 +1,150 @@
+"""
+Password hashing off the event loop
+Hashing is deliberately slow, so it runs on a dedicated, size-limited pool
+instead of the request path or FastAPI's shared threadpool. When the pool
+and its queue are full, new requests fail fast with PasswordHashBusy rather
+than piling up behind a login burst.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import auth
+
+# "process" hashes in parallel regardless of the GIL; "thread" avoids the
+# extra processes (fine when the hash backend releases the GIL)
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process").lower()
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Requests allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+# Suggested client back-off when rejected (Retry-After)
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "1"))
+
+# Recent operations kept for latency percentiles
+_LATENCY_WINDOW = 1000
+
+
+class PasswordHashBusy(RuntimeError):
+    """The hashing pool is at capacity; the caller should retry later"""
+
+
+def _run(operation: str, *args):
+    # Runs on a pool worker (possibly another process): only module-level names
+    started = time.perf_counter()
+    result = getattr(auth, operation)(*args)
+    return result, time.perf_counter() - started
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class PasswordHasher:
+    """
+    Bounded hashing pool with admission control.
+
+    At most PASSWORD_HASH_WORKERS hashes run at once and up to
+    PASSWORD_HASH_QUEUE_SIZE more wait; anything beyond that raises
+    PasswordHashBusy immediately. Counters are only touched from the
+    event loop, so they need no lock.
+    """
+
+    def __init__(self):
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._hash_seconds = deque(maxlen=_LATENCY_WINDOW)
+        self._wait_seconds = deque(maxlen=_LATENCY_WINDOW)
+        self._stats = {"completed": 0, "rejected": 0, "rehashed": 0}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if PASSWORD_HASH_EXECUTOR == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS,
+                    thread_name_prefix="password-hash"
+                )
+            else:
+                # spawn: forking a process that already runs threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._executor
+
+    async def run(self, operation: str, *args):
+        if self._pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE:
+            self._stats["rejected"] += 1
+            raise PasswordHashBusy("Too many password operations in progress, retry shortly")
+
+        self._pending += 1
+        submitted = time.perf_counter()
+        try:
+            result, hash_seconds = await asyncio.wrap_future(
+                self._get_executor().submit(_run, operation, *args)
+            )
+        finally:
+            self._pending -= 1
+
+        self._hash_seconds.append(hash_seconds)
+        self._wait_seconds.append(time.perf_counter() - submitted - hash_seconds)
+        self._stats["completed"] += 1
+        return result
+
+    def record_rehash(self):
+        self._stats["rehashed"] += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "executor": PASSWORD_HASH_EXECUTOR,
+            "workers": PASSWORD_HASH_WORKERS,
+            "in_flight": min(self._pending, PASSWORD_HASH_WORKERS),
+            "queue_depth": max(0, self._pending - PASSWORD_HASH_WORKERS),
+            "queue_limit": PASSWORD_HASH_QUEUE_SIZE,
+            "hash_ms_p50": round(_percentile(self._hash_seconds, 0.5) * 1000, 1),
+            "hash_ms_p95": round(_percentile(self._hash_seconds, 0.95) * 1000, 1),
+            "wait_ms_p50": round(_percentile(self._wait_seconds, 0.5) * 1000, 1),
+            "wait_ms_p95": round(_percentile(self._wait_seconds, 0.95) * 1000, 1)
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the hashing pool (raises PasswordHashBusy when full)"""
+    return await password_hasher.run("hash_password", password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the hashing pool (raises PasswordHashBusy when full).
+
+    Returns:
+        (valid, new_hash): new_hash is set when the stored hash uses outdated
+        cost settings and should be replaced
+    """
+    valid, new_hash = await password_hasher.run("verify_and_update_password", plain_password, hashed_password)
+    if new_hash:
+        password_hasher.record_rehash()
+    return valid, new_hash
+
+
+def shutdown_password_pool():
+    password_hasher.shutdown()
+
+
+def get_password_hash_stats() -> dict:
+    return password_hasher.get_stats()
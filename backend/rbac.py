@@ -3,7 +3,8 @@ Enhanced RBAC (Role-Based Access Control) System
 Roles: Admin, Document Owner, Auditor, Guest
 """
 from enum import Enum
-from typing import List
+from types import MappingProxyType
+from typing import List, Mapping
 from fastapi import HTTPException, status
 
 class UserRole(str, Enum):
@@ -66,19 +67,37 @@ ROLE_PERMISSIONS = {
     }
 }
 
-def get_role_permissions(role: str) -> dict:
-    """Get permissions for a specific role"""
-    try:
-        user_role = UserRole(role)
-        return ROLE_PERMISSIONS.get(user_role, ROLE_PERMISSIONS[UserRole.GUEST])
-    except ValueError:
-        return ROLE_PERMISSIONS[UserRole.GUEST]
+# Compiled once at import: one bit per permission name, one mask per role.
+# Roles are keyed by their string value (UserRole members hash the same).
+PERMISSION_BITS: Mapping[str, int] = MappingProxyType({
+    permission: 1 << bit
+    for bit, permission in enumerate(sorted({
+        permission for permissions in ROLE_PERMISSIONS.values() for permission in permissions
+    }))
+})
+ROLE_MASKS: Mapping[str, int] = MappingProxyType({
+    role.value: sum(PERMISSION_BITS[name] for name, granted in permissions.items() if granted)
+    for role, permissions in ROLE_PERMISSIONS.items()
+})
+_ROLE_PERMISSION_VIEWS: Mapping[str, Mapping[str, bool]] = MappingProxyType({
+    role.value: MappingProxyType(dict(permissions))
+    for role, permissions in ROLE_PERMISSIONS.items()
+})
+
+def role_mask(role: str) -> int:
+    """Permission bitmask for a role (unknown roles get guest permissions)"""
+    return ROLE_MASKS.get(role, ROLE_MASKS[UserRole.GUEST.value])
+
+def get_role_permissions(role: str) -> Mapping[str, bool]:
+    """Get permissions for a specific role (read-only, shared)"""
+    return _ROLE_PERMISSION_VIEWS.get(role, _ROLE_PERMISSION_VIEWS[UserRole.GUEST.value])
 
 def has_permission(user: dict, permission: str) -> bool:
     """Check if user has a specific permission"""
-    role = user.get("role", UserRole.GUEST)
-    permissions = get_role_permissions(role)
-    return permissions.get(permission, False)
+    mask = user.get("permissions_mask")
+    if mask is None:
+        mask = role_mask(user.get("role", UserRole.GUEST.value))
+    return bool(mask & PERMISSION_BITS.get(permission, 0))
 
 def require_permission(permission: str):
     """Decorator to require a specific permission"""
@@ -0,0 +1,66 @@
+"""
+Filename search index helpers
+Filenames are indexed as lowercase n-grams (length 1-3), so any substring
+query can be answered with indexed ARRAY_CONTAINS lookups instead of a scan.
+"""
+from typing import List, Tuple
+
+MAX_GRAM = 3
+# Trigrams of a long query used in the index lookup; the exact substring
+# check on the narrowed candidates covers the rest
+MAX_QUERY_GRAMS = 4
+
+# Characters that start a new word in a filename
+WORD_BOUNDARIES = " \t._-()[]"
+
+
+def filename_grams(filename: str) -> List[str]:
+    """All distinct lowercase substrings of length 1..MAX_GRAM"""
+    name = filename.lower()
+    grams = set()
+    for size in range(1, MAX_GRAM + 1):
+        for start in range(len(name) - size + 1):
+            grams.add(name[start:start + size])
+    return sorted(grams)
+
+
+def query_grams(query: str) -> List[str]:
+    """Grams to look up for a (lowercase) query"""
+    if len(query) <= MAX_GRAM:
+        return [query]
+
+    trigrams = [query[i:i + MAX_GRAM] for i in range(len(query) - MAX_GRAM + 1)]
+    # Spread the picks across the query (always including both ends)
+    if len(trigrams) > MAX_QUERY_GRAMS:
+        step = (len(trigrams) - 1) / (MAX_QUERY_GRAMS - 1)
+        trigrams = [trigrams[round(i * step)] for i in range(MAX_QUERY_GRAMS)]
+    return list(dict.fromkeys(trigrams))
+
+
+def relevance_tiers(field: str, query: str) -> Tuple[List[str], List[dict]]:
+    """
+    Query conditions splitting the matches of a (lowercase) query into
+    relevance tiers, best first: exact name, name prefix, word prefix, other
+    substring. Each tier is queried and paged on its own, so ranking needs
+    no per-query score stored on the items.
+
+    Args:
+        field: Lowercase filename expression (e.g. c.name_lower)
+
+    Returns:
+        (one condition per tier, query parameters they use)
+    """
+    parameters = [{"name": "@rq", "value": query}]
+    word_start = []
+    for i, char in enumerate(WORD_BOUNDARIES):
+        parameters.append({"name": f"@rb{i}", "value": char + query})
+        word_start.append(f"CONTAINS({field}, @rb{i})")
+    word_start = " OR ".join(word_start)
+
+    conditions = [
+        f"{field} = @rq",
+        f"STARTSWITH({field}, @rq) AND {field} != @rq",
+        f"NOT STARTSWITH({field}, @rq) AND ({word_start})",
+        f"NOT STARTSWITH({field}, @rq) AND NOT ({word_start})"
+    ]
+    return conditions, parameters
@@ -2,19 +2,130 @@
 Digital Signature Service using Azure Key Vault
 Provides cryptographic signing and verification of documents
 """
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import DefaultAzureCredential
-from azure.keyvault.keys import KeyClient
+from azure.keyvault.keys import KeyClient, KeyVaultKey, KeyVaultKeyIdentifier
 from azure.keyvault.keys.crypto import CryptographyClient, SignatureAlgorithm
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
 import hashlib
+import json
 import base64
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
+from merkle import build_merkle_tree, compute_merkle_root
+
 load_dotenv()
 
 KEY_VAULT_URL = os.getenv("AZURE_KEY_VAULT_URL")
 KEY_NAME = "docvault-signing-key"
 
+# Key Vault handles are created once per process. Keys are cached by their
+# versioned key id, so signatures made before a key rotation still verify
+# against the version that produced them. The current signing key is
+# re-read every SIGNING_KEY_REFRESH_SECONDS to pick up rotations.
+SIGNING_KEY_REFRESH_SECONDS = int(os.getenv("SIGNING_KEY_REFRESH_SECONDS", "3600"))
+
+_credential = None
+_key_client = None
+_signing_key = None
+_signing_client = None
+_signing_key_loaded_at = 0.0
+_key_cache: Dict[str, KeyVaultKey] = {}
+_verifier_cache: Dict[str, CryptographyClient] = {}
+_lock = threading.Lock()
+
+# Optional micro-batching: hashes arriving within the window (or until the
+# batch is full) are combined into a Merkle tree and only the root is signed.
+SIGNATURE_BATCHING = os.getenv("SIGNATURE_BATCHING", "false").lower() == "true"
+SIGNATURE_BATCH_WINDOW_MS = int(os.getenv("SIGNATURE_BATCH_WINDOW_MS", "50"))
+SIGNATURE_BATCH_MAX = int(os.getenv("SIGNATURE_BATCH_MAX", "256"))
+
+MERKLE_ALGORITHM = "RS256-MERKLE"
+
+# Bounded LRU/TTL cache of signature verdicts. The key covers every input
+# the check reads, so a re-registered document simply misses the cache;
+# the TTL bounds how long a verdict outlives a key revocation.
+SIGNATURE_CACHE_SIZE = int(os.getenv("SIGNATURE_CACHE_SIZE", "10000"))
+SIGNATURE_CACHE_TTL_SECONDS = int(os.getenv("SIGNATURE_CACHE_TTL_SECONDS", "3600"))
+
+_verdicts: "OrderedDict[tuple, Tuple[bool, float]]" = OrderedDict()
+_verdict_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_verdict_lock = threading.Lock()
+
+
+def _get_key_client() -> KeyClient:
+    global _credential, _key_client
+
+    if _key_client is None:
+        with _lock:
+            if _key_client is None:
+                _credential = DefaultAzureCredential()
+                _key_client = KeyClient(vault_url=KEY_VAULT_URL, credential=_credential)
+
+    return _key_client
+
+
+def _cache_key(key: KeyVaultKey):
+    with _lock:
+        _key_cache[key.id] = key
+
+
+def get_signing_key(refresh: bool = False) -> KeyVaultKey:
+    """
+    Get the current version of the signing key, creating it if needed.
+    Pass refresh=True after a rotation to pick up the new version at once.
+    """
+    global _signing_key, _signing_client, _signing_key_loaded_at
+
+    stale = time.monotonic() - _signing_key_loaded_at > SIGNING_KEY_REFRESH_SECONDS
+    if _signing_key is not None and not (refresh or stale):
+        return _signing_key
+
+    key_client = _get_key_client()
+
+    try:
+        key = key_client.get_key(KEY_NAME)
+    except ResourceNotFoundError:
+        # Create RSA key if it doesn't exist
+        key = key_client.create_rsa_key(KEY_NAME, size=2048)
+
+    _cache_key(key)
+    with _lock:
+        _signing_client = CryptographyClient(key, credential=_credential)
+        _signing_key = key
+        _signing_key_loaded_at = time.monotonic()
+    return key
+
+
+def get_verification_key(key_id: str) -> KeyVaultKey:
+    """Get a (possibly older) key version by its versioned key id, cached"""
+    key = _key_cache.get(key_id)
+    if key is not None:
+        return key
+
+    identifier = KeyVaultKeyIdentifier(key_id)
+    key = _get_key_client().get_key(identifier.name, identifier.version)
+    _cache_key(key)
+    return key
+
+
+def _get_verifier(key_id: str) -> CryptographyClient:
+    """Local-only crypto client for a key version's public key"""
+    verifier = _verifier_cache.get(key_id)
+    if verifier is None:
+        key = get_verification_key(key_id)
+        verifier = CryptographyClient.from_jwk(key.key)
+        with _lock:
+            _verifier_cache[key_id] = verifier
+    return verifier
+
+
 def get_crypto_client(username: str):
     """
     Get a CryptographyClient for signing operations.
@@ -22,23 +133,86 @@ def get_crypto_client(username: str):
     For now, we'll use a shared key and include username in metadata.
     """
     try:
-        credential = DefaultAzureCredential()
-        key_client = KeyClient(vault_url=KEY_VAULT_URL, credential=credential)
-        
-        # Get or create the signing key
-        try:
-            key = key_client.get_key(KEY_NAME)
-        except:
-            # Create RSA key if it doesn't exist
-            key = key_client.create_rsa_key(KEY_NAME, size=2048)
-        
-        crypto_client = CryptographyClient(key, credential=credential)
-        return crypto_client
+        get_signing_key()
+        return _signing_client
     except Exception as e:
         print(f"Warning: Azure Key Vault not available: {e}")
         return None
 
 
+class BatchSigner:
+    """
+    Collects document hashes from concurrent callers and signs them as one
+    Merkle batch. Each caller gets back the shared root signature plus its
+    own inclusion proof.
+    """
+
+    def __init__(self, window_seconds: float, max_batch: int):
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, document_hash: str) -> Future:
+        """Queue a hash for the next batch; the future resolves to its signature fields"""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="batch-signer", daemon=True
+                    )
+                    self._thread.start()
+
+        future = Future()
+        self._queue.put((document_hash, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_seconds
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._sign_batch(batch)
+
+    def _sign_batch(self, batch: List[Tuple[str, Future]]):
+        try:
+            crypto_client = get_crypto_client("")
+            if not crypto_client:
+                raise RuntimeError("Azure Key Vault not available")
+
+            root, proofs = build_merkle_tree([h for h, _ in batch])
+            result = crypto_client.sign(SignatureAlgorithm.rs256, bytes.fromhex(root))
+            signature_b64 = base64.b64encode(result.signature).decode()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), proof in zip(batch, proofs):
+            future.set_result({
+                "signature": signature_b64,
+                "algorithm": MERKLE_ALGORITHM,
+                "key_id": result.key_id,
+                "key_vault_used": True,
+                "merkle_root": root,
+                "merkle_proof": proof,
+                "batch_size": len(batch)
+            })
+
+
+_batch_signer = BatchSigner(SIGNATURE_BATCH_WINDOW_MS / 1000, SIGNATURE_BATCH_MAX)
+
+
 def sign_document(document_hash: str, username: str) -> dict:
     """
     Sign a document hash using Azure Key Vault.
@@ -62,6 +236,12 @@ def sign_document(document_hash: str, username: str) -> dict:
         }
     
     try:
+        if SIGNATURE_BATCHING:
+            # Blocks this (worker) thread until the batch it joined is signed
+            signature_data = _batch_signer.submit(document_hash).result()
+            signature_data["signer"] = username
+            return signature_data
+
         # Convert hash to bytes
         hash_bytes = bytes.fromhex(document_hash)
         
@@ -82,6 +262,73 @@ def sign_document(document_hash: str, username: str) -> dict:
         raise Exception(f"Failed to sign document: {e}")
 
 
+def _verdict_key(document_hash: str, signature_data: dict) -> tuple:
+    proof = signature_data.get("merkle_proof")
+    return (
+        document_hash,
+        signature_data.get("algorithm"),
+        signature_data.get("signature"),
+        signature_data.get("key_id"),
+        signature_data.get("merkle_root"),
+        json.dumps(proof, sort_keys=True) if proof is not None else None
+    )
+
+
+def _get_cached_verdict(key: tuple):
+    with _verdict_lock:
+        entry = _verdicts.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            _verdict_stats["misses"] += 1
+            return None
+        _verdicts.move_to_end(key)
+        _verdict_stats["hits"] += 1
+        return entry[0]
+
+
+def _cache_verdict(key: tuple, verdict: bool):
+    with _verdict_lock:
+        _verdicts[key] = (verdict, time.monotonic() + SIGNATURE_CACHE_TTL_SECONDS)
+        _verdicts.move_to_end(key)
+
+        while len(_verdicts) > SIGNATURE_CACHE_SIZE:
+            _verdicts.popitem(last=False)
+            _verdict_stats["evictions"] += 1
+
+
+def get_signature_cache_stats() -> dict:
+    """Hit/miss counters and size of the signature verdict cache"""
+    with _verdict_lock:
+        return {**_verdict_stats, "size": len(_verdicts)}
+
+
+def _check_signature(document_hash: str, signature_data: dict) -> bool:
+    if signature_data.get("algorithm") == MERKLE_ALGORITHM:
+        # Batched signature: the proof must lead from this document's
+        # hash to the signed root
+        root = compute_merkle_root(document_hash, signature_data["merkle_proof"])
+        if root != signature_data.get("merkle_root"):
+            return False
+        signed_digest = bytes.fromhex(root)
+    else:
+        signed_digest = bytes.fromhex(document_hash)
+
+    # Verify locally against the cached public key of the key version
+    # that produced the signature (no Key Vault round trip once cached)
+    verifier = _get_verifier(signature_data["key_id"])
+
+    # Decode signature from base64
+    signature_bytes = base64.b64decode(signature_data["signature"])
+    
+    # Verify signature
+    result = verifier.verify(
+        SignatureAlgorithm.rs256,
+        signed_digest,
+        signature_bytes
+    )
+    
+    return result.is_valid
+
+
 def verify_signature(document_hash: str, signature_data: dict) -> bool:
     """
     Verify a document signature.
@@ -97,36 +344,32 @@ def verify_signature(document_hash: str, signature_data: dict) -> bool:
     if not signature_data.get("key_vault_used", False):
         expected = base64.b64encode(document_hash.encode()).decode()
         return signature_data.get("signature") == expected
-    
-    crypto_client = get_crypto_client(signature_data.get("signer", ""))
-    
-    if not crypto_client:
-        return False
+
+    key = _verdict_key(document_hash, signature_data)
+    cached = _get_cached_verdict(key)
+    if cached is not None:
+        return cached
     
     try:
-        # Decode signature from base64
-        signature_bytes = base64.b64decode(signature_data["signature"])
-        
-        # Convert hash to bytes
-        hash_bytes = bytes.fromhex(document_hash)
-        
-        # Verify signature
-        result = crypto_client.verify(
-            SignatureAlgorithm.rs256,
-            hash_bytes,
-            signature_bytes
-        )
-        
-        return result.is_valid
+        verdict = _check_signature(document_hash, signature_data)
     except Exception as e:
+        # Not cached: errors (e.g. Key Vault unreachable) may be transient
         print(f"Signature verification error: {e}")
         return False
 
+    _cache_verdict(key, verdict)
+    return verdict
+
 
 def get_signature_info(signature_data: dict) -> str:
     """
     Get human-readable signature information.
     """
+    if signature_data.get("algorithm") == MERKLE_ALGORITHM:
+        return (
+            f"Signed by {signature_data['signer']} using Azure Key Vault "
+            f"(RS256 Merkle batch of {signature_data.get('batch_size', 1)})"
+        )
     if signature_data.get("key_vault_used"):
         return f"Signed by {signature_data['signer']} using Azure Key Vault (RS256)"
     else:
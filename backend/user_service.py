@@ -1,16 +1,56 @@
-import uuid
+import asyncio
+import os
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Dict, FrozenSet, Optional, List, Set, Tuple
 
-from cosmos_service import database
-from auth import hash_password
+from azure.cosmos import exceptions
+
+from cosmos_service import (
+    database, increment_stat, query_page, select_fields, order_clause,
+    LIST_PAGE_SIZE, LIST_PAGE_SIZE_MAX
+)
+from password_service import hash_password, verify_password
 from rbac import UserRole, validate_role
 
 users_container = database.get_container_client("users")
 
+# Per-worker cache of user records by username. Writes made through this
+# module invalidate it; changes made by another worker are seen within the TTL.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+_users: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+_user_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+_user_cache_lock = threading.Lock()
+
+# Active usernames per role (used to fan alerts out to admins and auditors).
+# Role changes, creations and deactivations on this worker update it in
+# place; it is rebuilt from the users container after ROLE_INDEX_REFRESH_SECONDS
+# to pick up changes made by other workers. Broadcast recipients are also
+# re-read before delivery (confirm_role_members), so a demotion or
+# deactivation made elsewhere takes effect on the next broadcast.
+ROLE_INDEX_REFRESH_SECONDS = int(os.getenv("ROLE_INDEX_REFRESH_SECONDS", "300"))
+# Users re-read at once when confirming broadcast recipients
+ROLE_CONFIRM_CONCURRENCY = 20
+
+_role_members: Dict[str, Set[str]] = {}
+_role_index_built_at: Optional[float] = None
+_role_index_lock = asyncio.Lock()
+_role_index_stats = {"builds": 0, "updates": 0, "confirmed": 0, "revoked": 0, "confirm_failures": 0}
+
+# Fields a user listing may project (never the password hash or reset tokens)
+USER_FIELDS = {
+    field: f"c.{field}"
+    for field in ["id", "username", "email", "role", "created_at", "is_active", "last_login"]
+}
+USER_SORTS = {field: f"c.{field}" for field in ["username", "created_at", "last_login", "role"]}
 
-def create_user(username: str, password: str, role: str = "document_owner", email: str = None):
+
+async def create_user(username: str, password: str, role: str = "document_owner", email: str = None):
     """
     Create a new user with specified role.
     Default role is 'document_owner' for security.
@@ -20,86 +60,307 @@ def create_user(username: str, password: str, role: str = "document_owner", emai
         raise ValueError(f"Invalid role: {role}. Valid roles: {[r.value for r in UserRole]}")
     
     user = {
-        "id": str(uuid.uuid4()),
+        "id": user_id(username),
         "username": username,
         "email": email or f"{username}@docvault.local",
-        "password_hash": hash_password(password),
+        "password_hash": await hash_password(password),
         "role": role,
         "created_at": datetime.utcnow().isoformat(),
         "is_active": True,
         "last_login": None
     }
-    users_container.create_item(user)
+    try:
+        await users_container.create_item(user)
+    except exceptions.CosmosResourceExistsError:
+        raise ValueError(f"User already exists: {username}")
+    _index_user_role(user)
+    await increment_stat("user")
+    return user
+
+
+def user_id(username: str) -> str:
+    """Item id of a user record (the partition key is the username)"""
+    return f"user:{username}"
+
+
+def _get_cached_user(username: str) -> Optional[dict]:
+    with _user_cache_lock:
+        entry = _users.get(username)
+        if entry is None or entry[1] < time.monotonic():
+            _user_cache_stats["misses"] += 1
+            return None
+        _users.move_to_end(username)
+        _user_cache_stats["hits"] += 1
+        # Callers modify the record before saving it; never hand out the cached dict
+        return dict(entry[0])
+
+
+def _cache_user(user: dict):
+    with _user_cache_lock:
+        _users[user["username"]] = (dict(user), time.monotonic() + USER_CACHE_TTL_SECONDS)
+        _users.move_to_end(user["username"])
+
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+            _user_cache_stats["evictions"] += 1
+
+
+def invalidate_user(username: str):
+    """Drop a user's cached record (called whenever the record is written)"""
+    with _user_cache_lock:
+        if _users.pop(username, None) is not None:
+            _user_cache_stats["invalidations"] += 1
+
+
+def get_user_cache_stats() -> dict:
+    """Hit/miss counters and size of the user cache"""
+    with _user_cache_lock:
+        return {**_user_cache_stats, "size": len(_users)}
+
+
+async def _patch_user(
+    username: str,
+    changes: dict,
+    remove: List[str] = (),
+    filter_predicate: str = None
+) -> dict:
+    """
+    Partially update a user record: only the given fields are written, so
+    concurrent changes to other fields (role, is_active, last_login, ...)
+    are never overwritten. Returns the updated record.
+
+    Raises:
+        CosmosResourceNotFoundError: If the user does not exist
+        CosmosAccessConditionFailedError: If filter_predicate does not match
+    """
+    operations = [{"op": "set", "path": f"/{field}", "value": value} for field, value in changes.items()]
+    operations += [{"op": "remove", "path": f"/{field}"} for field in remove]
+    kwargs = {"filter_predicate": filter_predicate} if filter_predicate else {}
+
+    try:
+        user = await users_container.patch_item(
+            item=user_id(username),
+            partition_key=username,
+            patch_operations=operations,
+            **kwargs
+        )
+    finally:
+        invalidate_user(username)
     return user
 
 
-def get_user_by_username(username: str) -> Optional[dict]:
-    query = "SELECT * FROM c WHERE c.username=@username"
-    params = [{"name": "@username", "value": username}]
+async def _build_role_index():
+    global _role_members, _role_index_built_at
+    members: Dict[str, Set[str]] = {}
+    async for user in users_container.query_items(
+        query="SELECT c.username, c.role FROM c WHERE NOT IS_DEFINED(c.is_active) OR c.is_active = true"
+    ):
+        members.setdefault(user["role"], set()).add(user["username"])
+    _role_members = members
+    _role_index_built_at = time.monotonic()
+    _role_index_stats["builds"] += 1
+
+
+def _index_user_role(user: dict):
+    """Move a user to their current role in the index (or out, if inactive)"""
+    if _role_index_built_at is None:
+        return
+    for usernames in _role_members.values():
+        usernames.discard(user["username"])
+    if user.get("is_active", True):
+        _role_members.setdefault(user["role"], set()).add(user["username"])
+    _role_index_stats["updates"] += 1
+
+
+def _unindex_user(username: str):
+    for usernames in _role_members.values():
+        usernames.discard(username)
+    _role_index_stats["updates"] += 1
 
-    items = list(
-        users_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True,
+
+async def get_role_members(role: str) -> FrozenSet[str]:
+    """Usernames of the active users with a role"""
+    def stale() -> bool:
+        return (
+            _role_index_built_at is None
+            or time.monotonic() - _role_index_built_at > ROLE_INDEX_REFRESH_SECONDS
         )
-    )
-    return items[0] if items else None
 
+    if stale():
+        # One rebuild at a time; callers queued behind it reuse its result
+        async with _role_index_lock:
+            if stale():
+                await _build_role_index()
+    return frozenset(_role_members.get(role, ()))
 
-def get_all_users() -> List[dict]:
-    """Get all users (admin only)"""
-    query = "SELECT c.id, c.username, c.email, c.role, c.created_at, c.is_active, c.last_login FROM c"
-    items = list(users_container.query_items(
-        query=query,
-        enable_cross_partition_query=True
-    ))
-    return items
 
+async def confirm_role_members(usernames: Set[str], roles: List[str]) -> Set[str]:
+    """
+    The usernames that, read fresh from the users container, are still
+    active and hold one of the roles. Users found demoted, deactivated or
+    deleted are corrected in the index. A user whose read fails is left out
+    of this delivery rather than trusted on the index alone.
+    """
+    usernames = sorted(usernames)
+    confirmed = set()
 
-def update_user_role(username: str, new_role: str) -> dict:
+    for start in range(0, len(usernames), ROLE_CONFIRM_CONCURRENCY):
+        chunk = usernames[start:start + ROLE_CONFIRM_CONCURRENCY]
+        users = await asyncio.gather(
+            *(get_user_by_username(username, use_cache=False) for username in chunk),
+            return_exceptions=True
+        )
+        for username, user in zip(chunk, users):
+            if isinstance(user, Exception):
+                _role_index_stats["confirm_failures"] += 1
+                continue
+            if user is not None and user.get("is_active", True) and user["role"] in roles:
+                confirmed.add(username)
+                continue
+            if user is None:
+                _unindex_user(username)
+            else:
+                _index_user_role(user)
+            _role_index_stats["revoked"] += 1
+
+    _role_index_stats["confirmed"] += len(confirmed)
+    return confirmed
+
+
+def get_role_index_stats() -> dict:
+    return {
+        **_role_index_stats,
+        "roles": {role: len(usernames) for role, usernames in _role_members.items()},
+        "age_seconds": None if _role_index_built_at is None else round(time.monotonic() - _role_index_built_at)
+    }
+
+
+async def _migrate_legacy_user(user: dict) -> dict:
+    """Re-key a user created with a random id to user_id(username)"""
+    legacy_id = user["id"]
+    user = {key: value for key, value in user.items() if not key.startswith("_")}
+    user["id"] = user_id(user["username"])
+
+    try:
+        await users_container.create_item(user)
+    except exceptions.CosmosResourceExistsError:
+        pass
+    try:
+        await users_container.delete_item(item=legacy_id, partition_key=user["username"])
+    except exceptions.CosmosResourceNotFoundError:
+        pass
+    return user
+
+
+async def get_user_by_username(username: str, use_cache: bool = True) -> Optional[dict]:
+    """
+    Get a user record: cache, then a point read by id and partition key.
+    Pass use_cache=False where a stale record must not be trusted
+    (password and reset token checks).
+    """
+    user = _get_cached_user(username) if use_cache else None
+    if user is not None:
+        return user
+
+    try:
+        user = await users_container.read_item(item=user_id(username), partition_key=username)
+    except exceptions.CosmosResourceNotFoundError:
+        # Users created before ids were derived from the username
+        items = [
+            item async for item in users_container.query_items(
+                query="SELECT * FROM c WHERE c.username=@username",
+                parameters=[{"name": "@username", "value": username}],
+                partition_key=username
+            )
+        ]
+        if not items:
+            return None
+        user = await _migrate_legacy_user(items[0])
+
+    _cache_user(user)
+    return dict(user)
+
+
+async def get_all_users(
+    page_size: int = LIST_PAGE_SIZE,
+    continuation_token: str = None,
+    sort: str = "username",
+    order: str = "asc",
+    fields: List[str] = None
+) -> dict:
+    """
+    Get one page of users (admin only).
+
+    Returns:
+        {"items": [...], "continuation_token": str or None when no more pages}
+    """
+    page_size = max(1, min(page_size, LIST_PAGE_SIZE_MAX))
+    projection = select_fields(fields, USER_FIELDS, list(USER_FIELDS))
+    ordering = order_clause(sort, order, USER_SORTS)
+
+    return await query_page(
+        f"SELECT {projection} FROM c {ordering}",
+        page_size=page_size,
+        continuation_token=continuation_token,
+        target=users_container
+    )
+
+
+async def update_user_role(username: str, new_role: str) -> dict:
     """Update user role (admin only)"""
     if not validate_role(new_role):
         raise ValueError(f"Invalid role: {new_role}")
     
-    user = get_user_by_username(username)
-    if not user:
+    # Also re-keys a legacy record, so the patch below finds it
+    if not await get_user_by_username(username):
         raise ValueError(f"User not found: {username}")
-    
-    user["role"] = new_role
-    users_container.upsert_item(user)
+
+    try:
+        user = await _patch_user(username, {"role": new_role})
+    except exceptions.CosmosResourceNotFoundError:
+        raise ValueError(f"User not found: {username}")
+    _index_user_role(user)
     return user
 
 
-def deactivate_user(username: str) -> dict:
+async def deactivate_user(username: str) -> dict:
     """Deactivate user account (admin only)"""
-    user = get_user_by_username(username)
-    if not user:
+    if not await get_user_by_username(username):
         raise ValueError(f"User not found: {username}")
-    
-    user["is_active"] = False
-    users_container.upsert_item(user)
+
+    try:
+        user = await _patch_user(username, {"is_active": False})
+    except exceptions.CosmosResourceNotFoundError:
+        raise ValueError(f"User not found: {username}")
+    _index_user_role(user)
     return user
 
 
-def update_last_login(username: str):
-    """Update user's last login timestamp"""
-    user = get_user_by_username(username)
-    if user:
-        user["last_login"] = datetime.utcnow().isoformat()
-        users_container.upsert_item(user)
+async def patch_user_fields(username: str, fields: dict):
+    """
+    Set top-level fields on a user record with a partial patch
+    (no read-modify-write). Raises CosmosResourceNotFoundError for unknown users.
+    """
+    await _patch_user(username, fields)
+
+
+async def update_password_hash(username: str, password_hash: str):
+    """Store a rehashed password (same password, current hash settings)"""
+    try:
+        await _patch_user(username, {"password_hash": password_hash})
+    except exceptions.CosmosResourceNotFoundError:
+        pass
 
 
-def change_user_password(username: str, current_password: str, new_password: str) -> dict:
+async def change_user_password(username: str, current_password: str, new_password: str) -> dict:
     """Change user password after verifying current password"""
-    from auth import verify_password
-    
-    user = get_user_by_username(username)
+    user = await get_user_by_username(username, use_cache=False)
     if not user:
         raise ValueError("User not found")
     
     # Verify current password
-    if not verify_password(current_password, user["password_hash"]):
+    valid, _ = await verify_password(current_password, user["password_hash"])
+    if not valid:
         raise ValueError("Current password is incorrect")
     
     # Validate new password
@@ -107,33 +368,28 @@ def change_user_password(username: str, current_password: str, new_password: str
         raise ValueError("New password must be at least 6 characters")
     
     # Update password
-    user["password_hash"] = hash_password(new_password)
-    users_container.upsert_item(user)
+    await _patch_user(username, {"password_hash": await hash_password(new_password)})
     
     return {"message": "Password changed successfully"}
 
 
-def initiate_password_reset(username: str) -> str:
+async def initiate_password_reset(username: str) -> str:
     """Generate a reset token and save it to the user record."""
-    user = get_user_by_username(username)
-    if not user:
+    if not await get_user_by_username(username):
         raise ValueError("User not found")
     
     # Generate a secure random token
     token = secrets.token_urlsafe(32)
     expiry = (datetime.utcnow() + timedelta(minutes=15)).isoformat()
     
-    user["reset_token"] = token
-    user["reset_token_expiry"] = expiry
-    
-    users_container.upsert_item(user)
+    await _patch_user(username, {"reset_token": token, "reset_token_expiry": expiry})
     
     return token
 
 
-def complete_password_reset(username: str, token: str, new_password: str):
+async def complete_password_reset(username: str, token: str, new_password: str):
     """Verify token and update password."""
-    user = get_user_by_username(username)
+    user = await get_user_by_username(username, use_cache=False)
     if not user:
         raise ValueError("User not found")
         
@@ -153,11 +409,16 @@ def complete_password_reset(username: str, token: str, new_password: str):
     if len(new_password) < 6:
         raise ValueError("Password must be at least 6 characters")
         
-    # Update password and clear token
-    user["password_hash"] = hash_password(new_password)
-    user.pop("reset_token", None)
-    user.pop("reset_token_expiry", None)
-    
-    users_container.upsert_item(user)
+    # Update password and clear token; the predicate makes the token
+    # single-use even if two resets race (token_urlsafe output needs no escaping)
+    try:
+        await _patch_user(
+            username,
+            {"password_hash": await hash_password(new_password)},
+            remove=["reset_token", "reset_token_expiry"],
+            filter_predicate=f"FROM c WHERE c.reset_token = '{stored_token}'"
+        )
+    except exceptions.CosmosAccessConditionFailedError:
+        raise ValueError("Invalid reset token")
     
     return True
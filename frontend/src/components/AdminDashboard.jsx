@@ -4,6 +4,7 @@ import api from "../api/client";
 export default function AdminDashboard({ onNotify }) {
   const [stats, setStats] = useState(null);
   const [users, setUsers] = useState([]);
+  const [usersToken, setUsersToken] = useState(null);
   const [loading, setLoading] = useState(true);
   const [selectedUser, setSelectedUser] = useState(null);
   const [editingRole, setEditingRole] = useState(null);
@@ -22,6 +23,7 @@ export default function AdminDashboard({ onNotify }) {
       ]);
       setStats(statsRes.data);
       setUsers(usersRes.data.users || []);
+      setUsersToken(usersRes.data.continuation_token || null);
     } catch (err) {
       onNotify({
         title: "Error",
@@ -33,6 +35,20 @@ export default function AdminDashboard({ onNotify }) {
     }
   };
 
+  const fetchMoreUsers = async () => {
+    try {
+      const res = await api.get("/admin/users", { params: { continuation: usersToken } });
+      setUsers((prev) => [...prev, ...(res.data.users || [])]);
+      setUsersToken(res.data.continuation_token || null);
+    } catch (err) {
+      onNotify({
+        title: "Error",
+        message: err.response?.data?.detail || "Failed to load users",
+        variant: "error"
+      });
+    }
+  };
+
   const handleChangeRole = async (username) => {
     if (!newRole) {
       onNotify({ title: "Error", message: "Please select a role", variant: "error" });
@@ -244,6 +260,14 @@ export default function AdminDashboard({ onNotify }) {
             </tbody>
           </table>
         </div>
+
+        {usersToken && (
+          <div style={{ marginTop: "10px" }}>
+            <button className="btn btnSmall" type="button" onClick={fetchMoreUsers}>
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -12,15 +12,72 @@ function AlertPanel({ isOpen, onClose, onNotify }) {
     }
   }, [isOpen]);
 
-  // Poll for new alerts every 30 seconds when panel is open
+  // Stream new alerts while the panel is open; fall back to polling every
+  // 30 seconds if the stream is unavailable
   useEffect(() => {
     if (!isOpen) return;
-    
-    const interval = setInterval(() => {
-      fetchAlerts();
-    }, 30000);
 
-    return () => clearInterval(interval);
+    let interval = null;
+    let source = null;
+    let reopenTimer = null;
+    let lastEventId = null;
+    let failures = 0;
+    let closed = false;
+
+    const startPolling = () => {
+      if (!interval) interval = setInterval(fetchAlerts, 30000);
+    };
+
+    // EventSource cannot send headers: an authenticated POST sets a
+    // short-lived HttpOnly cookie that the stream request carries instead.
+    // The browser reconnects by itself, resuming after the last event id;
+    // once it gives up (session expired, server full) a new session is
+    // opened, and after repeated failures the panel falls back to polling.
+    const openStream = async () => {
+      try {
+        await api.post("/alerts/stream-session");
+      } catch (err) {
+        startPolling();
+        return;
+      }
+      if (closed) return;
+
+      const query = lastEventId ? `?after=${encodeURIComponent(lastEventId)}` : "";
+      source = new EventSource(`/api/alerts/stream${query}`);
+      source.onopen = () => {
+        failures = 0;
+      };
+      source.addEventListener("alert", (event) => {
+        lastEventId = event.lastEventId || lastEventId;
+        const alert = JSON.parse(event.data);
+        setAlerts((prev) =>
+          prev.some((a) => a.id === alert.id) ? prev : [...prev, alert]
+        );
+      });
+      source.onerror = () => {
+        // CLOSED means the browser gave up (e.g. 401/503); otherwise it retries
+        if (source.readyState !== EventSource.CLOSED || closed) return;
+        failures += 1;
+        if (failures >= 3) {
+          startPolling();
+        } else {
+          reopenTimer = setTimeout(openStream, 3000);
+        }
+      };
+    };
+
+    if (!window.EventSource) {
+      startPolling();
+    } else {
+      openStream();
+    }
+
+    return () => {
+      closed = true;
+      source?.close();
+      clearTimeout(reopenTimer);
+      clearInterval(interval);
+    };
   }, [isOpen]);
 
   const fetchAlerts = async () => {
@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useState } from "react";
 import api from "../api/client";
 
 function AuditLogs({ onNotify }) {
@@ -7,14 +7,29 @@ function AuditLogs({ onNotify }) {
   const [loading, setLoading] = useState(false);
   const [query, setQuery] = useState("");
   const [resultFilter, setResultFilter] = useState("all");
+  const [nextToken, setNextToken] = useState(null);
+  const [exporting, setExporting] = useState(false);
+
+  // Filters are applied by the server, so every page (and the export) honours them
+  const filterParams = () => {
+    const params = {};
+    const q = query.trim();
+    if (q) params.search = q;
+    if (resultFilter !== "all") params.result = resultFilter;
+    return params;
+  };
 
-  const fetchLogs = async () => {
+  const fetchLogs = async (continuation = null) => {
     setLoading(true);
     setError(null);
 
     try {
-      const response = await api.get("/audit-logs");
-      setLogs(response.data.audit_logs || []);
+      const response = await api.get("/audit-logs", {
+        params: continuation ? { ...filterParams(), continuation } : filterParams(),
+      });
+      const page = response.data.audit_logs || [];
+      setLogs((prev) => (continuation ? [...prev, ...page] : page));
+      setNextToken(response.data.continuation_token || null);
     } catch {
       setError("Failed to load audit logs");
       onNotify?.({
@@ -28,9 +43,11 @@ function AuditLogs({ onNotify }) {
   };
 
   useEffect(() => {
-    fetchLogs();
+    // Debounced so typing in the search box doesn't send a query per keystroke
+    const timer = setTimeout(() => fetchLogs(), 300);
+    return () => clearTimeout(timer);
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, []);
+  }, [query, resultFilter]);
 
   const formatTimestamp = (value) => {
     if (!value) return "—";
@@ -46,37 +63,16 @@ function AuditLogs({ onNotify }) {
     }).format(d);
   };
 
-  const filteredLogs = useMemo(() => {
-    const q = query.trim().toLowerCase();
-    return (logs ?? []).filter((row) => {
-      const haystack =
-        `${row?.timestamp ?? ""} ${row?.action ?? ""} ${row?.filename ?? ""} ${row?.result ?? ""} ${row?.stored_hash ?? ""}`.toLowerCase();
-      const matchesQuery = q ? haystack.includes(q) : true;
-      const matchesResult =
-        resultFilter === "all" ? true : String(row?.result ?? "").toLowerCase() === resultFilter;
-      return matchesQuery && matchesResult;
-    });
-  }, [logs, query, resultFilter]);
-
-  const exportCsv = () => {
+  const exportCsv = async () => {
+    setExporting(true);
     try {
-      const rows = filteredLogs ?? [];
-      const headers = ["timestamp", "action", "filename", "result", "stored_hash"];
-      const escape = (value) => {
-        const s = String(value ?? "");
-        const needsQuotes = /[",\n\r]/.test(s);
-        const safe = s.replaceAll('"', '""');
-        return needsQuotes ? `"${safe}"` : safe;
-      };
-
-      const lines = [headers.join(",")];
-      for (const r of rows) {
-        lines.push(headers.map((h) => escape(r?.[h])).join(","));
-      }
-      const csv = `${lines.join("\n")}\n`;
-
-      const blob = new Blob([csv], { type: "text/csv;charset=utf-8" });
-      const url = URL.createObjectURL(blob);
+      // Streamed by the server over the full filtered history, not just loaded pages
+      const response = await api.get("/audit-logs/export", {
+        params: { ...filterParams(), format: "csv" },
+        responseType: "blob",
+      });
+
+      const url = URL.createObjectURL(response.data);
       const a = document.createElement("a");
       a.href = url;
       a.download = `audit_logs_${new Date().toISOString().slice(0, 19).replaceAll(":", "-")}.csv`;
@@ -94,9 +90,11 @@ function AuditLogs({ onNotify }) {
       console.error(e);
       onNotify?.({
         title: "Export",
-        message: "Could not generate CSV.",
+        message: "Could not export audit logs.",
         variant: "error",
       });
+    } finally {
+      setExporting(false);
     }
   };
 
@@ -112,11 +110,11 @@ function AuditLogs({ onNotify }) {
             className="btn btnSmall"
             type="button"
             onClick={exportCsv}
-            disabled={loading || filteredLogs.length === 0}
+            disabled={loading || exporting || logs.length === 0}
           >
-            Export CSV
+            {exporting ? "Exporting…" : "Export CSV"}
           </button>
-          <button className="btn" type="button" onClick={fetchLogs} disabled={loading}>
+          <button className="btn" type="button" onClick={() => fetchLogs()} disabled={loading}>
             {loading ? "Refreshing…" : "Refresh"}
           </button>
         </div>
@@ -129,7 +127,7 @@ function AuditLogs({ onNotify }) {
             className="input"
             value={query}
             onChange={(e) => setQuery(e.target.value)}
-            placeholder="Filter by filename, action, result, hash…"
+            placeholder="Filter by filename…"
             aria-label="Search audit logs"
           />
         </label>
@@ -143,10 +141,13 @@ function AuditLogs({ onNotify }) {
             aria-label="Filter audit logs by result"
           >
             <option value="all">All</option>
-            <option value="authentic">AUTHENTIC</option>
-            <option value="not_authentic">NOT_AUTHENTIC</option>
-            <option value="success">SUCCESS</option>
-            <option value="failed">FAILED</option>
+            <option value="AUTHENTIC">AUTHENTIC</option>
+            <option value="AUTHENTIC_NO_SIGNATURE">AUTHENTIC_NO_SIGNATURE</option>
+            <option value="TAMPERED">TAMPERED</option>
+            <option value="SIGNATURE_INVALID">SIGNATURE_INVALID</option>
+            <option value="NOT_FOUND">NOT_FOUND</option>
+            <option value="SUCCESS">SUCCESS</option>
+            <option value="FAILED">FAILED</option>
           </select>
         </label>
       </div>
@@ -158,21 +159,21 @@ function AuditLogs({ onNotify }) {
         </div>
       )}
 
-      {!loading && !error && logs.length === 0 && (
+      {!loading && !error && logs.length === 0 && !query.trim() && resultFilter === "all" && (
         <div className="notice">
           <p className="noticeTitle">No logs yet</p>
           <div>Run a register/verify action to generate audit entries.</div>
         </div>
       )}
 
-      {!loading && !error && logs.length > 0 && filteredLogs.length === 0 && (
+      {!loading && !error && logs.length === 0 && (query.trim() || resultFilter !== "all") && (
         <div className="notice" aria-live="polite">
           <p className="noticeTitle">No matches</p>
           <div>Try clearing filters to see audit entries.</div>
         </div>
       )}
 
-      {filteredLogs.length > 0 && (
+      {logs.length > 0 && (
         <div className="tableWrap">
           <table className="table">
             <thead>
@@ -184,7 +185,7 @@ function AuditLogs({ onNotify }) {
               </tr>
             </thead>
             <tbody>
-              {filteredLogs.map((log, idx) => (
+              {logs.map((log, idx) => (
                 <tr key={log.id ?? `${log.filename}-${log.timestamp}`} className="staggerItem"
                   >
                   <td>{formatTimestamp(log.timestamp)}</td>
@@ -207,6 +208,19 @@ function AuditLogs({ onNotify }) {
           </table>
         </div>
       )}
+
+      {nextToken && (
+        <div style={{ marginTop: "10px" }}>
+          <button
+            className="btn btnSmall"
+            type="button"
+            onClick={() => fetchLogs(nextToken)}
+            disabled={loading}
+          >
+            {loading ? "Loading…" : "Load more"}
+          </button>
+        </div>
+      )}
     </section>
   );
 }
@@ -8,6 +8,8 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
   const [searchQuery, setSearchQuery] = useState("");
   const [selectedDoc, setSelectedDoc] = useState(null);
   const [viewMode, setViewMode] = useState("grid");
+  // Next page: the endpoint it came from, its params and continuation token
+  const [nextPage, setNextPage] = useState(null);
 
   useEffect(() => {
     fetchDocuments();
@@ -18,6 +20,9 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
     try {
       const res = await api.get("/documents");
       setDocuments(res.data.documents || []);
+      setNextPage(res.data.continuation_token
+        ? { url: "/documents", params: {}, continuation: res.data.continuation_token }
+        : null);
     } catch (err) {
       onNotify({
         title: "Error",
@@ -37,8 +42,12 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
 
     setLoading(true);
     try {
-      const res = await api.get(`/documents/search?query=${encodeURIComponent(searchQuery)}`);
+      const params = { query: searchQuery };
+      const res = await api.get("/documents/search", { params });
       setDocuments(res.data.documents || []);
+      setNextPage(res.data.continuation_token
+        ? { url: "/documents/search", params, continuation: res.data.continuation_token }
+        : null);
       onNotify({
         title: "Search",
         message: `Found ${res.data.count} document(s)`,
@@ -55,6 +64,39 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
     }
   };
 
+  const fetchMore = async () => {
+    try {
+      const res = await api.get(nextPage.url, {
+        params: { ...nextPage.params, continuation: nextPage.continuation }
+      });
+      setDocuments((prev) => [...prev, ...(res.data.documents || [])]);
+      setNextPage(res.data.continuation_token
+        ? { ...nextPage, continuation: res.data.continuation_token }
+        : null);
+    } catch (err) {
+      onNotify({
+        title: "Error",
+        message: "Failed to load documents",
+        variant: "error"
+      });
+    }
+  };
+
+  // Listings leave out the signature itself; load the full record on open
+  const openDocument = async (doc) => {
+    setSelectedDoc(doc);
+    try {
+      const res = await api.get(`/documents/${encodeURIComponent(doc.filename)}`);
+      setSelectedDoc(res.data);
+    } catch (err) {
+      onNotify({
+        title: "Error",
+        message: "Failed to load document details",
+        variant: "error"
+      });
+    }
+  };
+
   const formatDate = (dateString) => {
     if (!dateString) return "Unknown";
     return new Date(dateString).toLocaleString();
@@ -138,7 +180,7 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
 
       {/* Document Count */}
       <div className="documentCount">
-        <p>Total: <strong>{documents.length}</strong> document(s)</p>
+        <p>Showing: <strong>{documents.length}</strong> document(s)</p>
       </div>
 
       {/* Document Grid */}
@@ -154,7 +196,7 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
                 <div 
                   key={doc.id} 
                   className="documentCard"
-                  onClick={() => setSelectedDoc(doc)}
+                  onClick={() => openDocument(doc)}
                 >
                   <div className="docCardHeader">
                     <span className="docIcon">📄</span>
@@ -189,7 +231,7 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
                       <span className="docDate">{formatTimestamp(doc.uploaded_at)}</span>
                     </div>
 
-                    {doc.signature && (
+                    {doc.signed && (
                       <div className="docSignature">
                         <span className="signatureBadge">🔒 Signed</span>
                       </div>
@@ -204,7 +246,7 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
                 <div 
                   key={doc.id} 
                   className="documentRow"
-                  onClick={() => setSelectedDoc(doc)}
+                  onClick={() => openDocument(doc)}
                 >
                   <div className="docRowIcon">📄</div>
                   <div className="docRowName" title={doc.filename}>{doc.filename}</div>
@@ -215,7 +257,7 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
                     {formatTimestamp(doc.uploaded_at)}
                   </div>
                   <div className="docRowStatus">
-                    {doc.signature && (
+                    {doc.signed && (
                       <span className="signatureBadge" style={{ fontSize: '0.75rem', padding: '2px 8px' }}>🔒 Signed</span>
                     )}
                   </div>
@@ -238,6 +280,14 @@ export default function DocumentBrowser({ onNotify, currentUser }) {
         </>
       )}
 
+      {nextPage && (
+        <div style={{ marginTop: "10px" }}>
+          <button className="btn btnSmall" type="button" onClick={fetchMore}>
+            Load more
+          </button>
+        </div>
+      )}
+
       {/* Document Detail Modal */}
       {selectedDoc && (
         <div className="modal" onClick={() => setSelectedDoc(null)}>